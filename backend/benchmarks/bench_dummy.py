@@ -0,0 +1,53 @@
+"""
+Benchmark of PrepareDummyCols.transform against the previous implementation.
+
+Run from the backend directory:
+    python -m benchmarks.bench_dummy
+"""
+import time
+
+import joblib
+import pandas as pd
+
+from dummy import PrepareDummyCols
+from benchmarks.synthetic import make_users
+
+# The shipped transformer was pickled from __main__, see main.py
+import __main__
+if not hasattr(__main__, 'PrepareDummyCols'):
+    __main__.PrepareDummyCols = PrepareDummyCols
+
+DUMMY_PATH = "./model/credit_score_mul_lable_coldummy.jlb"
+SIZES = [1, 1_000, 1_000_000]
+
+
+def legacy_transform(dummy, X):
+    """PrepareDummyCols.transform as it was before the column plan."""
+    for col, pre in zip(dummy.dummy_cols, dummy.dummy_prefix):
+        X_transformed = X.join(X[col].str.get_dummies(sep=dummy.data_sep).add_prefix(pre+dummy.col_name_sep))
+    return X_transformed.reindex(columns=dummy.columns, fill_value=0)
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    dummy = joblib.load(DUMMY_PATH)
+    print(f"{'rows':>10} {'legacy (s)':>12} {'plan (s)':>12} {'speedup':>8}")
+    for n in SIZES:
+        X = make_users(n).drop(columns=["ID", "Customer_ID", "Name", "SSN", "Credit_Score"])
+        pd.testing.assert_frame_equal(dummy.transform(X), legacy_transform(dummy, X), check_dtype=False)
+        repeat = 3 if n >= 1_000_000 else 20
+        legacy = best_of(lambda: legacy_transform(dummy, X), repeat)
+        plan = best_of(lambda: dummy.transform(X), repeat)
+        print(f"{n:>10} {legacy:>12.5f} {plan:>12.5f} {legacy / plan:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
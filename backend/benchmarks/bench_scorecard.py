@@ -0,0 +1,58 @@
+"""
+Benchmark of the vectorized scorecard against the previous per-profile
+implementation, checking that both give the same scores.
+
+Run from the backend directory:
+    python -m benchmarks.bench_scorecard
+"""
+import time
+
+import numpy as np
+import scipy.stats as stats
+
+from scorecard import score_profiles
+from benchmarks.synthetic import make_users
+
+SIZES = [1, 1_000, 1_000_000]
+# The per-profile implementation is too slow for the largest sizes
+LEGACY_MAX_ROWS = 10_000
+
+
+def legacy_percentile(value, mean, std):
+    return stats.norm.cdf((value - mean) / std)
+
+
+def legacy_score(p):
+    """Scorecard as computed per request before the scorecard module."""
+    ip = {
+        "Repayment History": (p["Credit_History_Age"] - p["Num_of_Delayed_Payment"]) / p["Credit_History_Age"],
+        "Credit Utilization": 1 - (1 if (p["Credit_Utilization_Ratio"] / 100) > 0.4 else (p["Credit_Utilization_Ratio"] / 100)),
+        "Credit History": legacy_percentile(p["Credit_History_Age"], 221.220, 99.681),
+        "Outstanding": 1 - legacy_percentile(p['Outstanding_Debt'], 1426.220, 1155.129),
+        "Num Credit Inquiries": 0 if legacy_percentile(p['Num_Credit_Inquiries'], 5.798, 3.868) > 0.8 else 1 - legacy_percentile(p['Num_Credit_Inquiries'], 5.798, 3.868)
+    }
+    overall = (ip["Repayment History"] * 0.05 + ip["Credit Utilization"] * 0.5 + ip["Credit History"] * 0.025
+               + ip["Num Credit Inquiries"] * 0.4 + ip["Outstanding"] * 0.025)
+    return int(overall * 550 + 300)
+
+
+def main():
+    print(f"{'rows':>10} {'legacy (s)':>12} {'vectorized (s)':>15} {'rows/s':>12}")
+    for n in SIZES:
+        users = make_users(n)
+        start = time.perf_counter()
+        _, scores = score_profiles(users)
+        vectorized = time.perf_counter() - start
+        legacy = float("nan")
+        if n <= LEGACY_MAX_ROWS:
+            records = users.to_dict(orient="records")
+            start = time.perf_counter()
+            expected = [legacy_score(p) for p in records]
+            legacy = time.perf_counter() - start
+            mismatches = np.flatnonzero(scores != np.asarray(expected))
+            assert not len(mismatches), f"{len(mismatches)} scores differ, first at row {mismatches[0]}"
+        print(f"{n:>10} {legacy:>12.5f} {vectorized:>15.5f} {n / vectorized:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
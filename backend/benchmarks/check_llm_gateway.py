@@ -0,0 +1,148 @@
+"""
+Exercise llm_gateway.LLMGateway against a fake provider injecting latency
+and errors, and check its behavior in each scenario. Exits with status 1
+when an expectation fails. Run from the backend directory:
+    python -m benchmarks.check_llm_gateway
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.stubs import FakeLLM
+from llm_gateway import CircuitBreaker, LLMGateway, LLMUnavailable
+
+
+async def run_calls(gateway, n, concurrency):
+    """
+    Returns:
+        tuple: (latencies of the successful calls in seconds, number of LLMUnavailable)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, unavailable = [], 0
+
+    async def one():
+        nonlocal unavailable
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await gateway.invoke("prompt")
+                latencies.append(time.perf_counter() - start)
+            except LLMUnavailable:
+                unavailable += 1
+
+    await asyncio.gather(*(one() for _ in range(n)))
+    return np.asarray(latencies), unavailable
+
+
+async def check_concurrency(failures):
+    llm = FakeLLM(latency=0.05)
+    gateway = LLMGateway(llm, max_concurrency=4, requests_per_minute=0)
+    peak = 0
+
+    async def watch():
+        nonlocal peak
+        while True:
+            peak = max(peak, gateway.in_flight)
+            await asyncio.sleep(0.005)
+
+    watcher = asyncio.create_task(watch())
+    await run_calls(gateway, 40, 40)
+    watcher.cancel()
+    print(f"concurrency: peak {peak} in flight with a limit of 4")
+    if peak > 4:
+        failures.append(f"{peak} calls in flight with max_concurrency=4")
+
+
+async def check_rate_limit(failures):
+    gateway = LLMGateway(FakeLLM(latency=0), requests_per_minute=1200)  # 20/s, bursts of 20
+    start = time.perf_counter()
+    await run_calls(gateway, 60, 60)
+    elapsed = time.perf_counter() - start
+    print(f"rate limit: 60 calls at 20/s in {elapsed:.2f}s")
+    if elapsed < 1.8:
+        failures.append(f"60 calls at 20/s took only {elapsed:.2f}s")
+
+
+async def check_retries(failures):
+    llm = FakeLLM(latency=0.01, error_rate=0.3, seed=1)
+    gateway = LLMGateway(llm, requests_per_minute=0, max_retries=3, retry_base_delay=0.01,
+                         breaker=CircuitBreaker(failure_threshold=1000))
+    latencies, unavailable = await run_calls(gateway, 200, 20)
+    print(f"retries: 30% provider errors, {unavailable}/200 calls failed after {gateway.counts['retries']} retries")
+    if unavailable > 4:
+        failures.append(f"{unavailable} of 200 calls failed with 3 retries and 30% errors")
+
+
+async def check_timeouts(failures):
+    llm = FakeLLM(latency=0.01, slow_rate=0.2, slow_latency=5, seed=2)
+    gateway = LLMGateway(llm, requests_per_minute=0, timeout=0.2, deadline=1, retry_base_delay=0.01,
+                         breaker=CircuitBreaker(failure_threshold=1000))
+    latencies, unavailable = await run_calls(gateway, 100, 100)
+    worst = latencies.max() if len(latencies) else 0
+    print(f"timeouts: 20% stalled calls, {gateway.counts['timeouts']} attempts timed out, "
+          f"{unavailable}/100 failed, slowest success {worst:.2f}s")
+    if worst > 1:
+        failures.append(f"a call took {worst:.2f}s with a 1s deadline")
+
+
+async def check_circuit_breaker(failures):
+    llm = FakeLLM(latency=0.01, error_rate=1.0)
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=0.5)
+    gateway = LLMGateway(llm, requests_per_minute=0, max_retries=1, retry_base_delay=0.01, breaker=breaker)
+    await run_calls(gateway, 50, 1)
+    calls_when_open = llm.calls
+    print(f"circuit breaker: provider down, {llm.calls} provider calls for 50 requests, "
+          f"{gateway.counts['rejected']} rejected without calling it")
+    if calls_when_open > 10:
+        failures.append(f"{calls_when_open} provider calls made with the provider down")
+    llm.error_rate = 0.0
+    await asyncio.sleep(0.6)
+    latencies, unavailable = await run_calls(gateway, 10, 1)
+    print(f"circuit breaker: provider back, {len(latencies)}/10 calls succeeded after the reset delay")
+    if unavailable:
+        failures.append(f"{unavailable} calls failed after the provider recovered")
+
+
+async def check_hedging(failures):
+    results = {}
+    for hedge in (False, True):
+        llm = FakeLLM(latency=0.02, slow_rate=0.05, slow_latency=0.5, seed=3)
+        gateway = LLMGateway(llm, requests_per_minute=0, max_concurrency=64, hedge=hedge, hedge_quantile=0.9)
+        await run_calls(gateway, 40, 1)  # latency window warm-up
+        latencies, _ = await run_calls(gateway, 400, 16)
+        results[hedge] = np.percentile(latencies, 99)
+        print(f"hedging {'on ' if hedge else 'off'}: p99 {results[hedge] * 1000:.0f}ms, "
+              f"{gateway.counts['hedges']} hedged requests")
+    if results[True] > results[False] / 2:
+        failures.append(f"hedging only brought p99 from {results[False]:.3f}s to {results[True]:.3f}s")
+
+
+SCENARIOS = {
+    "concurrency": check_concurrency,
+    "rate_limit": check_rate_limit,
+    "retries": check_retries,
+    "timeouts": check_timeouts,
+    "circuit_breaker": check_circuit_breaker,
+    "hedging": check_hedging,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenario", choices=list(SCENARIOS), help="Only run this scenario")
+    args = parser.parse_args()
+
+    failures = []
+    for name, check in SCENARIOS.items():
+        if args.scenario in (None, name):
+            asyncio.run(check(failures))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+End-to-end check of the score materializer against a real deployment with
+change streams (Atlas or a local replica set, see the README).
+
+Updates a field of a customer in user_data, waits for the backend to write
+the new score to credit_scores, then restores the original value. The backend
+must run with MATERIALIZE_SCORES=true. Run from the backend directory:
+    python -m benchmarks.check_materializer --user-id 8625
+"""
+import argparse
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+
+def wait_for_score(scores, user_id, after, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        doc = scores.find_one({"_id": user_id, "scoredAt": {"$gt": after}})
+        if doc is not None:
+            return doc
+        time.sleep(0.1)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--user-id", type=int, default=8625)
+    parser.add_argument("--field", default="Outstanding_Debt")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = MongoClient(os.environ.get("MONGO_CONNECTION_STRING"))[os.environ.get("MONGODB_DB")]
+    user_data, scores = db["user_data"], db["credit_scores"]
+    original = user_data.find_one({"Customer_ID": args.user_id}, {args.field: 1})
+    if original is None:
+        sys.exit(f"Customer {args.user_id} not found")
+
+    ok = True
+    try:
+        for value in (original[args.field] * 2 + 1, original[args.field]):
+            # Mongo timestamps have millisecond precision
+            before = db.command("hello")["localTime"]
+            start = time.perf_counter()
+            user_data.update_one({"_id": original["_id"]}, {"$set": {args.field: value}})
+            doc = wait_for_score(scores, args.user_id, before, args.timeout)
+            if doc is None:
+                print(f"{args.field}={value}: no new score after {args.timeout}s")
+                ok = False
+                break
+            print(f"{args.field}={value}: score {doc['scoreCardCreditScore']} ({doc['userCreditProfile']}, "
+                  f"model {doc['modelVersion']}) after {time.perf_counter() - start:.3f}s")
+    finally:
+        user_data.update_one({"_id": original["_id"]}, {"$set": {args.field: original[args.field]}})
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Recall parity of LocalVectorIndex against brute-force search.
+
+Loads the card catalog embeddings (data/cc_products_voyage.json by default)
+and compares the top-k of the index with an exact float64 search for
+random queries and for queries near catalog entries. With --atlas it also
+compares against Atlas Vector Search for the per-tier search terms (needs
+the .env credentials). Run from the backend directory:
+    python -m benchmarks.check_vector_index
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+import numpy as np
+
+from vector_index import LocalVectorIndex
+
+CATALOG_PATH = "../data/cc_products_voyage.json"
+
+
+def brute_force(matrix, query, k, similarity):
+    matrix = matrix.astype(np.float64)
+    query = query.astype(np.float64)
+    if similarity == "euclidean":
+        keys = np.linalg.norm(matrix - query, axis=1)
+    elif similarity == "cosine":
+        keys = -(matrix @ query) / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+    else:
+        keys = -(matrix @ query)
+    return list(np.argsort(keys, kind="stable")[:k])
+
+
+def recall(index, embeddings, queries, k, similarity):
+    hits = 0
+    for q in queries:
+        expected = {int(i) for i in brute_force(embeddings, q, k, similarity)}
+        found = {int(d["position"]) for d in index.search(q, k)}
+        hits += len(expected & found)
+    return hits / (k * len(queries))
+
+
+async def atlas_parity(k):
+    import llm_utils
+    from langchain_mongodb.pipelines import vector_search_stage
+    await llm_utils.card_index.load(llm_utils.vcol)
+    for tier, term in llm_utils.search_term_suggestions.items():
+        query_vector = await llm_utils.get_embedding_model().aembed_query(term)
+        local = [d["title"] for d in llm_utils.card_index.search(query_vector, k)]
+        pipeline = [vector_search_stage(query_vector, "embedding", "default", k, None, 10),
+                    {"$project": {"title": 1}}]
+        atlas = [d["title"] for d in await (await llm_utils.vcol.aggregate(pipeline)).to_list(length=None)]
+        print(f"{tier}: {len(set(local) & set(atlas))}/{k} cards in common with Atlas")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--catalog", default=CATALOG_PATH)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--atlas", action="store_true", help="Also compare with Atlas Vector Search")
+    args = parser.parse_args()
+
+    with open(args.catalog) as f:
+        catalog = json.load(f)
+    embeddings = np.asarray([d["embedding"] for d in catalog], dtype=np.float32)
+    rng = np.random.default_rng(0)
+    random_queries = rng.standard_normal((args.queries, embeddings.shape[1])).astype(np.float32)
+    near_queries = embeddings[rng.integers(0, len(embeddings), args.queries)] \
+        + 0.01 * rng.standard_normal((args.queries, embeddings.shape[1])).astype(np.float32)
+
+    ok = True
+    for similarity in ("euclidean", "cosine", "dotProduct"):
+        index = LocalVectorIndex(similarity=similarity)
+        index.build([{"position": i, "embedding": e} for i, e in enumerate(embeddings)])
+        for name, queries in (("random", random_queries), ("near catalog", near_queries)):
+            r = recall(index, embeddings, queries, args.k, similarity)
+            ok &= r == 1.0
+            print(f"{similarity:>10} {name:>12} queries: recall@{args.k} = {r:.4f}")
+
+    if args.atlas:
+        asyncio.run(atlas_parity(args.k))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
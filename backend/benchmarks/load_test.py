@@ -0,0 +1,82 @@
+"""
+Load test of /credit_score/{user_id} against a mocked LLM and a local mongod.
+
+Measures how many concurrent requests one worker sustains while every
+request waits on a slow LLM. Point MONGO_CONNECTION_STRING at a local
+mongod (never at a shared cluster, --seed writes synthetic users) and run
+from the backend directory:
+    python -m benchmarks.load_test --seed 1000 --concurrency 50 --requests 500
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+import main
+import llm_utils
+from db import get_sync_db
+from benchmarks.stubs import FakeLLM
+from benchmarks.synthetic import make_user_records
+from model_registry import registry
+
+
+def seed_users(n):
+    col = get_sync_db()["user_data"]
+    col.delete_many({})
+    col.insert_many(make_user_records(n, first_customer_id=1))
+    # get_model_feature_imps reads this customer
+    col.insert_many(make_user_records(1, seed=0, first_customer_id=8625))
+
+
+async def run(concurrency, n_requests, n_users):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(n_requests):
+        queue.put_nowait(1 + i % n_users)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=None) as client:
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                user_id = queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.get(f"/credit_score/{user_id}")
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return np.asarray(latencies), errors, elapsed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seed", type=int, default=0, help="Replace user_data with N synthetic users")
+    parser.add_argument("--users", type=int, default=1000, help="Number of distinct Customer_IDs to request")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Seconds the fake LLM takes per call")
+    args = parser.parse_args()
+
+    if args.seed:
+        seed_users(args.seed)
+    n_users = args.seed or args.users
+    registry.load()
+    llm_utils.llm_gateway.llm = FakeLLM(latency=args.llm_latency)
+    # Measure the backend, not the provider quota
+    llm_utils.llm_gateway.bucket = None
+
+    latencies, errors, elapsed = asyncio.run(run(args.concurrency, args.requests, n_users))
+    print(f"{len(latencies)} requests, concurrency {args.concurrency}, {errors} errors")
+    print(f"throughput: {len(latencies) / elapsed:.1f} req/s per worker")
+    print(f"latency p50: {np.percentile(latencies, 50):.3f}s p99: {np.percentile(latencies, 99):.3f}s")
+    print(f"ideal with a {args.llm_latency}s LLM: {args.concurrency / args.llm_latency:.1f} req/s")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,64 @@
+"""
+Parity check of FastScorer against the pandas pipeline in main.predict_batch.
+
+Scores every user of the user_data collection both ways and fails if any
+probability differs. Run from the backend directory:
+    python -m benchmarks.parity_fast_scorer            # stored user population
+    python -m benchmarks.parity_fast_scorer --synthetic 100000
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import main
+from db import get_sync_db
+from model_registry import registry
+from benchmarks.synthetic import make_user_records
+
+
+def check_parity(records):
+    """
+    Returns:
+        tuple: (number of mismatching labels, max absolute probability difference)
+    """
+    scorer = registry.ensure_loaded().fast_scorer
+
+    start = time.perf_counter()
+    ref_preds, ref_probas = main.predict_batch(pd.DataFrame.from_records(records))
+    pandas_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single = [scorer.predict_one(r) for r in records]
+    fast_time = time.perf_counter() - start
+
+    fast_preds = np.asarray([p for p, _ in single])
+    fast_probas = np.vstack([v for _, v in single])
+    print(f"pandas batch: {pandas_time:.3f}s, fast scorer row by row: {fast_time:.3f}s "
+          f"({1e6 * fast_time / len(records):.1f}us per row)")
+    return int((fast_preds != ref_preds).sum()), float(np.abs(fast_probas - ref_probas).max())
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Check on N synthetic users instead of the user_data collection")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        records = make_user_records(args.synthetic)
+    else:
+        records = list(get_sync_db()["user_data"].find({}, {"_id": 0}))
+    if not records:
+        print("No users to check")
+        return 1
+
+    label_mismatches, max_diff = check_parity(records)
+    print(f"{len(records)} users, {label_mismatches} label mismatches, max probability difference {max_diff}")
+    return 0 if label_mismatches == 0 and max_diff == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
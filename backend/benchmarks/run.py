@@ -0,0 +1,250 @@
+"""
+Benchmark suite of the /credit_score stages, with latency budgets.
+
+Times every stage on synthetic users (see synthetic.py) and stubbed
+external services (see stubs.py), prints p50/p99 latencies and exits with
+status 1 when a stage is over its budget in budgets.json, or slower than a
+saved baseline by more than --max-regression. Run from the backend directory:
+    python -m benchmarks.run                               # every stage without MongoDB
+    python -m benchmarks.run --stage scorecard             # stages whose name contains "scorecard"
+    python -m benchmarks.run --save before.json            # keep the results...
+    python -m benchmarks.run --baseline before.json        # ...and compare a change against them
+    python -m benchmarks.run --e2e --llm-latency 0.05      # also end-to-end requests, see load_test.py
+
+The --e2e stage replaces user_data with synthetic users: point
+MONGO_CONNECTION_STRING at a local mongod, never at a shared cluster.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.stubs import FakeEmbeddings
+from benchmarks.synthetic import make_users
+from model_bundle import export_bundle
+from model_registry import LoadedModel, ModelRegistry, registry
+from scorecard import DEFAULT_CONFIG, score_profile, score_profiles
+from shadow_scoring import ShadowScorer, compare_batch
+from simulation import expand_scenarios, simulate
+from vector_index import LocalVectorIndex
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), "budgets.json")
+CATALOG_PATH = "../data/cc_products_voyage.json"
+
+# name -> (setup function returning the callable to time, number of timed runs)
+STAGES = {}
+
+
+def stage(name, runs):
+    def register(setup):
+        STAGES[name] = (setup, runs)
+        return setup
+    return register
+
+
+def user_frame(n):
+    return make_users(n, seed=7)
+
+
+@stage("predict.single", runs=300)
+def predict_single():
+    df = user_frame(1)
+    return lambda: registry.predict_batch(df)
+
+
+@stage("predict.batch_1000", runs=30)
+def predict_batch_1000():
+    df = user_frame(1000)
+    return lambda: registry.predict_batch(df)
+
+
+@stage("fast_scorer.single", runs=2000)
+def fast_scorer_single():
+    record = user_frame(1).to_dict(orient="records")[0]
+    return lambda: registry.fast_scorer.predict_one(record)
+
+
+@stage("dummy.transform_1000", runs=50)
+def dummy_transform_1000():
+    X = user_frame(1000).drop(columns=["ID", "Customer_ID", "Name", "SSN", "Credit_Score"])
+    # The pandas path only exists with the pickled artifacts
+    dummy = registry.dummy or registry.load_pickles().dummy
+    return lambda: dummy.transform(X)
+
+
+@stage("model.load_pickles", runs=20)
+def model_load_pickles():
+    return ModelRegistry().load_pickles
+
+
+@stage("model.load_bundle", runs=20)
+def model_load_bundle():
+    bundle_dir = tempfile.mkdtemp()
+    export_bundle(registry.fast_scorer, "benchmark", bundle_dir)
+    return lambda: ModelRegistry(bundle_dir=bundle_dir).load_bundle("benchmark")
+
+
+def shadow_registry():
+    """A registry serving the loaded model, with a copy of it as shadow model."""
+    model_registry = ModelRegistry()
+    model_registry.active = registry.active
+    model_registry.shadows = [LoadedModel("shadow", registry.fast_scorer)]
+    model_registry.ready = True
+    return model_registry
+
+
+@stage("shadow.submit", runs=5000)
+def shadow_submit():
+    # What /credit_score pays for shadow scoring: queueing the profile
+    record = user_frame(1).to_dict(orient="records")[0]
+    scorer = ShadowScorer(None, shadow_registry(), queue_size=10 ** 9)
+    scorer._wakeup = asyncio.Event()
+    return lambda: scorer.submit(8625, record)
+
+
+@stage("shadow.compare_500", runs=30)
+def shadow_compare_500():
+    # Background comparison of a full batch, off the request path
+    model_registry = shadow_registry()
+    items = [(user_id, record, model_registry.active, None)
+             for user_id, record in enumerate(user_frame(500).to_dict(orient="records"))]
+    return lambda: compare_batch(items, model_registry.compared_models)
+
+
+@stage("simulate.grid_500", runs=50)
+def simulate_grid_500():
+    # 500 what-if scenarios of one user, scored in one pass (vs ~500 x fast_scorer.single)
+    record = user_frame(1).to_dict(orient="records")[0]
+    request = {"grid": {"Credit_Utilization_Ratio": list(range(0, 50, 2)), "Num_of_Delayed_Payment": list(range(20))}}
+    scenarios = expand_scenarios(request, record, registry.fast_scorer)
+    return lambda: simulate(record, scenarios, registry.fast_scorer, DEFAULT_CONFIG)
+
+
+@stage("scorecard.single", runs=2000)
+def scorecard_single():
+    record = user_frame(1).to_dict(orient="records")[0]
+    return lambda: score_profile(record)
+
+
+@stage("scorecard.batch_100k", runs=20)
+def scorecard_batch_100k():
+    df = user_frame(100_000)
+    return lambda: score_profiles(df)
+
+
+@stage("suggestions.retrieval", runs=2000)
+def suggestions_retrieval():
+    with open(CATALOG_PATH) as f:
+        catalog = json.load(f)
+    index = LocalVectorIndex()
+    index.build(catalog)
+    query = np.asarray(FakeEmbeddings(latency=0)._vector("Good credit health"), dtype=np.float32)
+    return lambda: index.search(query, 10)
+
+
+def time_stage(fn, runs, warmup=3):
+    """
+    Returns:
+        numpy.ndarray: Latency of each run, in milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+    latencies = np.empty(runs)
+    for i in range(runs):
+        start = time.perf_counter_ns()
+        fn()
+        latencies[i] = (time.perf_counter_ns() - start) / 1e6
+    return latencies
+
+
+def summarize(latencies):
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "runs": len(latencies),
+    }
+
+
+def run_e2e(n_users, llm_latency):
+    """End-to-end /credit_score latencies, one request per user so that every explanation is a cache miss."""
+    import llm_utils
+    from benchmarks import load_test
+    from benchmarks.stubs import FakeLLM
+    load_test.seed_users(n_users)
+    llm_utils.llm_gateway.llm = FakeLLM(latency=llm_latency)
+    # Measure the backend, not the provider quota
+    llm_utils.llm_gateway.bucket = None
+    llm_utils._embedding_model = FakeEmbeddings(latency=0)
+    latencies, errors, _ = asyncio.run(load_test.run(1, n_users, n_users))
+    if errors:
+        raise RuntimeError(f"{errors} end-to-end requests failed")
+    return latencies * 1000
+
+
+def check(results, budgets, baseline, max_regression):
+    """
+    Returns:
+        list[str]: One message per stage over its budget or regressed against the baseline.
+    """
+    failures = []
+    for name, result in results.items():
+        for metric, limit in budgets.get(name, {}).items():
+            if result[metric] > limit:
+                failures.append(f"{name} {metric} {result[metric]:.3f} over budget {limit:.3f}")
+        if baseline and name in baseline:
+            for metric in ("p50_ms", "p99_ms"):
+                limit = baseline[name][metric] * (1 + max_regression)
+                if result[metric] > limit:
+                    failures.append(f"{name} {metric} {result[metric]:.3f} regressed more than "
+                                    f"{max_regression:.0%} from {baseline[name][metric]:.3f}")
+    return failures
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--stage", help="Only run the stages whose name contains this string")
+    parser.add_argument("--budgets", default=BUDGETS_PATH, help="JSON of per-stage p50_ms/p99_ms budgets")
+    parser.add_argument("--baseline", help="Results saved with --save to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--e2e", action="store_true", help="Also time end-to-end requests (needs a local mongod)")
+    parser.add_argument("--e2e-users", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds the fake LLM takes per call")
+    args = parser.parse_args()
+
+    registry.load()
+    results = {}
+    print(f"{'stage':<24} {'p50 (ms)':>10} {'p99 (ms)':>10} {'runs':>6}")
+    for name, (setup, runs) in STAGES.items():
+        if args.stage and args.stage not in name:
+            continue
+        results[name] = summarize(time_stage(setup(), runs))
+    if args.e2e:
+        results["e2e.credit_score"] = summarize(run_e2e(args.e2e_users, args.llm_latency))
+    for name, result in results.items():
+        print(f"{name:<24} {result['p50_ms']:>10.3f} {result['p99_ms']:>10.3f} {result['runs']:>6}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    with open(args.budgets) as f:
+        budgets = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failures = check(results, budgets, baseline, args.max_regression)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,82 @@
+"""
+Startup benchmark: time `import main` with `python -X importtime`.
+
+Imports the app in fresh interpreters, prints the p50/p99 import time and
+the slowest top-level imports, and exits with status 1 when the import is
+over its "startup.import_main" budget in budgets.json or pulls in a module
+that must only be imported after startup (the LLM and vector search
+clients, XGBoost, pandas). Nothing connects to MongoDB. Run from the
+backend directory:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --top 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from benchmarks.run import BUDGETS_PATH, check, summarize
+
+# Imported on first use or by the lifespan, never by `import main`
+DEFERRED_MODULES = ["langchain_core", "langchain_fireworks", "langchain_voyageai", "langchain_mongodb",
+                    "fireworks", "voyageai", "xgboost", "sklearn", "pandas", "certifi"]
+
+
+def import_profile():
+    """
+    Import main in a fresh interpreter.
+
+    Returns:
+        list[tuple]: (module, depth, cumulative microseconds) per imported module, in import order.
+    """
+    env = dict(os.environ)
+    # Placeholders, the clients do not connect at import
+    env.setdefault("MONGO_CONNECTION_STRING", "mongodb://localhost:27017")
+    env.setdefault("MONGODB_DB", "credit_score_startup_benchmark")
+    env.setdefault("MONGODB_COLLECTION", "cc_products")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"import main failed:\n{result.stderr[-2000:]}")
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), (len(name) - len(name.lstrip())) // 2, int(cumulative)))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to list")
+    parser.add_argument("--budgets", default=BUDGETS_PATH, help="JSON of per-stage p50_ms/p99_ms budgets")
+    args = parser.parse_args()
+
+    profiles = [import_profile() for _ in range(args.runs)]
+    totals = np.asarray([next(us for name, _, us in profile if name == "main") / 1000 for profile in profiles])
+    result = summarize(totals)
+    print(f"import main: p50 {result['p50_ms']:.0f}ms, p99 {result['p99_ms']:.0f}ms over {args.runs} runs")
+
+    # Direct imports of main, from the last run
+    top_level = sorted(((us, name) for name, depth, us in profiles[-1] if depth == 1), reverse=True)
+    for us, name in top_level[:args.top]:
+        print(f"  {name:<32} {us / 1000:>8.1f}ms")
+
+    with open(args.budgets) as f:
+        budgets = json.load(f)
+    failures = check({"startup.import_main": result}, budgets, None, 0)
+    imported = {name for name, _, _ in profiles[-1]}
+    failures += [f"{module} is imported by main, it must be deferred"
+                 for module in DEFERRED_MODULES if module in imported]
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
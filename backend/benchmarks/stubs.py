@@ -0,0 +1,88 @@
+"""
+Stand-ins for the external services (Fireworks LLM, VoyageAI embeddings)
+with configurable latency, for benchmarks and load tests.
+"""
+import asyncio
+import hashlib
+import random
+import time
+
+import numpy as np
+
+
+class FakeLLMError(RuntimeError):
+    pass
+
+
+class FakeLLM:
+    """
+    Mimics the invoke/ainvoke interface of the langchain Fireworks LLM.
+    Can inject failures and a slow tail, e.g. to exercise llm_gateway.
+    """
+
+    def __init__(self, latency=1.0, response="The suggestion to approve the application can be attributed to several factors.",
+                 error_rate=0.0, slow_rate=0.0, slow_latency=10.0, seed=None):
+        """
+        Args:
+            latency (float): Seconds per call.
+            response (str): Completion returned by every call.
+            error_rate (float): Share of the ainvoke calls failing with FakeLLMError after ``latency``.
+            slow_rate (float): Share of the ainvoke calls taking ``slow_latency`` instead.
+            slow_latency (float): Seconds of the slow calls.
+            seed (int): Seed of the failure and slow call draws.
+        """
+        self.latency = latency
+        self.response = response
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.response
+
+    async def ainvoke(self, prompt, **kwargs):
+        self.calls += 1
+        slow = self.random.random() < self.slow_rate
+        failed = self.random.random() < self.error_rate
+        await asyncio.sleep(self.slow_latency if slow else self.latency)
+        if failed:
+            raise FakeLLMError("injected failure")
+        return self.response
+
+    async def astream(self, prompt, **kwargs):
+        """Yields the response word by word, spread over ``latency`` seconds."""
+        self.calls += 1
+        words = self.response.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            yield word if i == 0 else " " + word
+
+
+class FakeEmbeddings:
+    """Mimics VoyageAIEmbeddings with deterministic pseudo-random vectors."""
+
+    def __init__(self, latency=0.1, dimensions=1024):
+        self.latency = latency
+        self.dimensions = dimensions
+        self.calls = 0
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dimensions).tolist()
+
+    def embed_query(self, text):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    async def aembed_query(self, text):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
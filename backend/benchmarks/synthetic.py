@@ -0,0 +1,75 @@
+"""
+Synthetic users following the schema of the user_data collection.
+"""
+import numpy as np
+import pandas as pd
+
+OCCUPATIONS = ["Accountant", "Architect", "Developer", "Doctor", "Engineer", "Entrepreneur",
+               "Journalist", "Lawyer", "Manager", "Mechanic", "Media_Manager", "Musician",
+               "Scientist", "Teacher", "Writer", "_______"]
+LOAN_TYPES = ["auto loan", "credit-builder loan", "debt consolidation loan", "home equity loan",
+              "mortgage loan", "not specified", "payday loan", "personal loan", "student loan"]
+PAYMENT_BEHAVIOURS = ["High_spent_Large_value_payments", "High_spent_Medium_value_payments",
+                      "High_spent_Small_value_payments", "Low_spent_Large_value_payments",
+                      "Low_spent_Medium_value_payments", "Low_spent_Small_value_payments", "!@9#%8"]
+
+
+def make_users(n, seed=42, first_customer_id=1):
+    """
+    Generate ``n`` synthetic user_data records.
+
+    Args:
+        n (int): Number of users.
+        seed (int): Seed of the random generator.
+        first_customer_id (int): Customer_ID of the first generated user.
+
+    Returns:
+        pandas.DataFrame: One row per user with the user_data columns.
+    """
+    rng = np.random.default_rng(seed)
+    customer_ids = np.arange(first_customer_id, first_customer_id + n)
+    annual_income = rng.uniform(8_000, 150_000, n).round(2)
+
+    # Type_of_Loan is a comma separated list of 1 to 3 loans, or "No Data"
+    loans = np.asarray(LOAN_TYPES, dtype=object)
+    picks = rng.integers(0, len(LOAN_TYPES), (n, 3))
+    n_loans = rng.integers(1, 4, n)
+    type_of_loan = np.asarray([",".join(loans[p[:k]]) for p, k in zip(picks, n_loans)], dtype=object)
+    type_of_loan[rng.random(n) < 0.1] = "No Data"
+
+    return pd.DataFrame({
+        "ID": [f"0x{i:x}" for i in customer_ids],
+        "Customer_ID": customer_ids,
+        "Month": rng.integers(1, 9, n),
+        "Name": [f"User {i}" for i in customer_ids],
+        "Age": rng.integers(18, 60, n),
+        "SSN": "000-00-0000",
+        "Occupation": rng.choice(OCCUPATIONS, n),
+        "Annual_Income": annual_income,
+        "Monthly_Inhand_Salary": (annual_income / 12).round(2),
+        "Num_Bank_Accounts": rng.integers(0, 11, n),
+        "Num_Credit_Card": rng.integers(0, 11, n),
+        "Interest_Rate": rng.integers(1, 34, n),
+        "Num_of_Loan": n_loans,
+        "Type_of_Loan": type_of_loan,
+        "Delay_from_due_date": rng.integers(0, 62, n),
+        "Num_of_Delayed_Payment": rng.integers(0, 28, n),
+        "Changed_Credit_Limit": rng.uniform(-6, 30, n).round(2),
+        "Num_Credit_Inquiries": rng.integers(0, 17, n),
+        "Credit_Mix": rng.choice(["Good", "Standard", "Bad"], n),
+        "Outstanding_Debt": rng.uniform(0, 5_000, n).round(2),
+        "Credit_Utilization_Ratio": rng.uniform(20, 50, n),
+        "Credit_History_Age": rng.integers(12, 404, n),
+        "Payment_of_Min_Amount": rng.choice(["Yes", "No", "NM"], n),
+        "Total_EMI_per_month": rng.uniform(0, 500, n),
+        "Amount_invested_monthly": rng.uniform(0, 500, n),
+        "Payment_Behaviour": rng.choice(PAYMENT_BEHAVIOURS, n),
+        "Monthly_Balance": rng.uniform(0, 1_000, n),
+        "Monthly_Rental_Commitment": rng.uniform(0, 2_000, n).round(2),
+        "Credit_Score": rng.choice(["Good", "Poor", "Standard"], n),
+    })
+
+
+def make_user_records(n, seed=42, first_customer_id=1):
+    """Same as make_users, as a list of MongoDB-style documents."""
+    return make_users(n, seed, first_customer_id).to_dict(orient="records")
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Error of a resume token older than the oplog window
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# Seconds between reconnection attempts, doubled up to the max after each failure
+WATCH_RETRY_DELAY = 1
+WATCH_MAX_RETRY_DELAY = 60
+
+
+async def watch_collection(collection, on_change, pipeline=None, resume_after=None, **watch_kwargs):
+    """
+    Follow the change stream of a collection forever, resuming after the
+    last seen event when the stream is interrupted.
+
+    Args:
+        collection: Async pymongo collection to watch.
+        on_change (callable): Coroutine function awaited with each change event.
+        pipeline (list): Optional aggregation pipeline filtering the events.
+        resume_after (dict): Resume token to start after, e.g. the _id of the
+            last change handled by a previous watcher, None to start now.
+        **watch_kwargs: Extra options of collection.watch (e.g. full_document).
+    """
+    resume_token = resume_after
+    retry_delay = WATCH_RETRY_DELAY
+    while True:
+        try:
+            async with await collection.watch(pipeline, resume_after=resume_token, **watch_kwargs) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    retry_delay = WATCH_RETRY_DELAY
+                    await on_change(change)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if isinstance(e, OperationFailure) and e.code == CHANGE_STREAM_HISTORY_LOST and resume_token is not None:
+                logger.warning("Change stream on %s cannot resume, its position left the oplog: restarting from now",
+                               collection.name)
+                resume_token = None
+                continue
+            logger.warning("Change stream on %s interrupted: %s, retrying in %ss", collection.name, e, retry_delay)
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, WATCH_MAX_RETRY_DELAY)
+
+
+def start_watch(collection, on_change, pipeline=None, resume_after=None, **watch_kwargs):
+    """
+    Start watch_collection as a background task.
+
+    Returns:
+        asyncio.Task: The task, to be cancelled on shutdown.
+    """
+    return asyncio.create_task(watch_collection(collection, on_change, pipeline, resume_after, **watch_kwargs),
+                               name=f"watch-{collection.name}")
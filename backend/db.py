@@ -0,0 +1,87 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+from pymongo import AsyncMongoClient, MongoClient
+
+load_dotenv()
+
+MONGO_CONN = os.environ.get("MONGO_CONNECTION_STRING")
+MONGO_DB_NAME = os.environ.get("MONGODB_DB")
+
+# Connection pool of each client: connections per server at most and kept open at least,
+# and seconds an idle connection is kept (0 keeps them)
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_SECONDS = float(os.environ.get("MONGO_MAX_IDLE_SECONDS", 300))
+# Fail fast instead of the driver defaults (20s to connect, 30s to find a server)
+MONGO_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("MONGO_CONNECT_TIMEOUT_SECONDS", 5))
+MONGO_SERVER_SELECTION_TIMEOUT_SECONDS = float(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_SECONDS", 10))
+# Wire compression, e.g. "zstd,zlib" (zstd needs the zstandard package), empty to disable
+MONGO_COMPRESSORS = os.environ.get("MONGO_COMPRESSORS", "")
+
+_async_client = None
+_sync_client = None
+# get_sync_client is called from thread pools: one pool per process, whichever thread comes first
+_sync_client_lock = threading.Lock()
+
+
+def client_options():
+    """Keyword arguments shared by the MongoDB clients of the process."""
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "connectTimeoutMS": int(MONGO_CONNECT_TIMEOUT_SECONDS * 1000),
+        "serverSelectionTimeoutMS": int(MONGO_SERVER_SELECTION_TIMEOUT_SECONDS * 1000),
+        "appname": "credit-score-backend",
+    }
+    if MONGO_MAX_IDLE_SECONDS > 0:
+        options["maxIdleTimeMS"] = int(MONGO_MAX_IDLE_SECONDS * 1000)
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return options
+
+
+def get_async_client():
+    """
+    The async client shared by every module of the process (request handlers,
+    caches, change streams), created on first use.
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncMongoClient(MONGO_CONN, **client_options())
+    return _async_client
+
+
+def get_sync_client():
+    """
+    Sync client for the blocking functions run in thread pools, like
+    scoring.score_users. Created on first use, so processes that never need
+    it do not open a second pool.
+    """
+    global _sync_client
+    if _sync_client is None:
+        with _sync_client_lock:
+            if _sync_client is None:
+                _sync_client = MongoClient(MONGO_CONN, **client_options())
+    return _sync_client
+
+
+def get_async_db():
+    return get_async_client()[MONGO_DB_NAME]
+
+
+def get_sync_db():
+    return get_sync_client()[MONGO_DB_NAME]
+
+
+async def close():
+    """Close the clients opened by this process."""
+    global _async_client, _sync_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+    with _sync_client_lock:
+        if _sync_client is not None:
+            _sync_client.close()
+            _sync_client = None
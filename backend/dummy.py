@@ -1,6 +1,8 @@
+import numpy as np
+import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
 
-class PrepareDummyCols(BaseEstimator, TransformerMixin): 
+class PrepareDummyCols(BaseEstimator, TransformerMixin):
     def __init__(self, data_sep=',', col_name_sep='_'):
         """
         Transformer that creates dummy variables from categorical columns with a separator.
@@ -10,9 +12,9 @@ class PrepareDummyCols(BaseEstimator, TransformerMixin):
         """
         self.data_sep     = data_sep
         self.col_name_sep = col_name_sep
-        
+
     # Return self nothing else to do here
-    def fit(self, X, y  = None): 
+    def fit(self, X, y  = None):
         """
         Fit the transformer to the data.
         Parameters:
@@ -24,14 +26,36 @@ class PrepareDummyCols(BaseEstimator, TransformerMixin):
         object_cols       = X.select_dtypes(include="object").columns
         self.dummy_cols   = [col for col in object_cols if X[col].str.contains(self.data_sep, regex=True).any()]
         self.dummy_prefix = [''.join(map(lambda x: x[0], col.split(self.col_name_sep)))  if self.col_name_sep in col else col[:2]   for col in self.dummy_cols]
-        
+
+        dummy_X = X
         for col, pre in zip(self.dummy_cols, self.dummy_prefix):
-            dummy_X = X.join(X[col].str.get_dummies(sep=self.data_sep).add_prefix(pre+self.col_name_sep))            
-            
-        dummy_X.drop(columns = self.dummy_cols, inplace=True)
+            dummy_X = dummy_X.join(X[col].str.get_dummies(sep=self.data_sep).add_prefix(pre+self.col_name_sep))
+
+        dummy_X = dummy_X.drop(columns = self.dummy_cols)
         self.columns = dummy_X.columns
+        self.column_plan = self._build_column_plan()
         return self
-    
+
+    def _build_column_plan(self):
+        """
+        Build the column plan: for every dummy column, a map from each token
+        seen at fit time to the index of its output column in self.columns.
+        """
+        plan = {}
+        for col, pre in zip(self.dummy_cols, self.dummy_prefix):
+            prefix = pre + self.col_name_sep
+            plan[col] = {name[len(prefix):]: idx for idx, name in enumerate(self.columns)
+                         if name.startswith(prefix)}
+        return plan
+
+    def _get_column_plan(self):
+        # Transformers pickled before the column plan existed (like the shipped
+        # credit_score_mul_lable_coldummy.jlb) only carry self.columns, so the
+        # plan is derived from it on first use.
+        if getattr(self, "column_plan", None) is None:
+            self.column_plan = self._build_column_plan()
+        return self.column_plan
+
     # Transformer method we wrote for this transformer
     def transform(self, X, y = None):
         """
@@ -42,13 +66,39 @@ class PrepareDummyCols(BaseEstimator, TransformerMixin):
         Returns:
             - X_transformed (pandas.DataFrame): Transformed data with dummy variables.
         """
-        for col, pre in zip(self.dummy_cols, self.dummy_prefix):
-            X_transformed = X.join(X[col].str.get_dummies(sep=self.data_sep).add_prefix(pre+self.col_name_sep))   
+        plan = self._get_column_plan()
+        dummy_idx = sorted(idx for token_idx in plan.values() for idx in token_idx.values())
+        block_pos = {idx: pos for pos, idx in enumerate(dummy_idx)}
+
+        # Single preallocated block holding every dummy column for all rows
+        block = np.zeros((len(X), len(dummy_idx)), dtype=np.int64)
+        for col, token_idx in plan.items():
+            if col not in X.columns or not token_idx:
+                continue
+            # Split each distinct value once, then scatter its dummies to every row holding it
+            codes, uniques = pd.factorize(X[col].to_numpy(dtype=object))
+            unique_block = np.zeros((len(uniques) + 1, len(dummy_idx)), dtype=np.int64)
+            for u, value in enumerate(uniques):
+                if isinstance(value, str):
+                    for token in value.split(self.data_sep):
+                        if token in token_idx:
+                            unique_block[u, block_pos[token_idx[token]]] = 1
+            # Missing values are coded -1 and pick the all-zero last row
+            block |= unique_block[codes]
 
-        X_transformed = X_transformed.reindex(columns=self.columns, fill_value=0)          
+        # Assemble the output directly in self.columns order, missing columns are filled with 0
+        data = {}
+        for idx, name in enumerate(self.columns):
+            if idx in block_pos:
+                data[name] = block[:, block_pos[idx]]
+            elif name in X.columns:
+                data[name] = X[name].to_numpy()
+            else:
+                data[name] = 0
+        X_transformed = pd.DataFrame(data, index=X.index, columns=self.columns)
         return X_transformed
-        
-    # to get feature names    
+
+    # to get feature names
     def get_feature_names_out(self, input_features=None):
         """
         Get the names of the transformed features.
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EXPLANATION_CACHE_TTL_SECONDS = int(os.environ.get("EXPLANATION_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+EXPLANATION_CACHE_MAX_BYTES = int(os.environ.get("EXPLANATION_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+# Significant digits kept for float profile features in the fingerprint
+EXPLANATION_CACHE_DIGITS = int(os.environ.get("EXPLANATION_CACHE_DIGITS", 4))
+
+
+def quantize(value, digits=EXPLANATION_CACHE_DIGITS):
+    """
+    Normalize a profile value so that equivalent profiles hash the same:
+    numpy scalars become Python values and floats keep ``digits``
+    significant digits.
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return None
+        if value.is_integer():
+            return int(value)
+        return float(f"{value:.{digits}g}")
+    return value
+
+
+def profile_fingerprint(user_profile_ip, pred, allowed_credit_limit, feature_importance, template_version):
+    """
+    Stable hash of everything that determines a credit score explanation.
+
+    Args:
+        user_profile_ip (dict): The user profile given to the LLM.
+        pred (str): The predicted credit health.
+        allowed_credit_limit (int): The allowed credit limit.
+        feature_importance (str): The feature importance text given to the LLM.
+        template_version (str): Version of the prompt template.
+
+    Returns:
+        str: Hex sha256 digest.
+    """
+    payload = {
+        "profile": {k: quantize(v) for k, v in user_profile_ip.items()},
+        "pred": str(pred),
+        "limit": quantize(allowed_credit_limit),
+        "features": hashlib.sha256(str(feature_importance).encode()).hexdigest(),
+        "template": template_version,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ExplanationCache:
+    """
+    Two tier cache of LLM explanations: an in-memory LRU capped in bytes in
+    front of a MongoDB collection whose entries expire through a TTL index.
+    A failing MongoDB only turns lookups into misses.
+    """
+
+    def __init__(self, collection, ttl_seconds=EXPLANATION_CACHE_TTL_SECONDS,
+                 max_bytes=EXPLANATION_CACHE_MAX_BYTES):
+        """
+        Args:
+            collection: Async pymongo collection holding the explanations.
+            ttl_seconds (int): Lifetime of the stored explanations.
+            max_bytes (int): Size cap of the in-memory tier.
+        """
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("createdAt", expireAfterSeconds=self.ttl_seconds)
+
+    def _remember(self, key, text):
+        size = len(key) + len(text.encode())
+        if size > self.max_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[1]
+        self._memory[key] = (text, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    async def get(self, key):
+        """
+        Returns:
+            str: The cached explanation, or None.
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return self._memory[key][0]
+        try:
+            doc = await self.collection.find_one({"_id": key}, {"explanation": 1})
+        except Exception as e:
+            logger.warning("Error reading explanation cache: %s", e)
+            doc = None
+        if doc is None:
+            self.misses += 1
+            return None
+        self.db_hits += 1
+        self._remember(key, doc["explanation"])
+        return doc["explanation"]
+
+    async def set(self, key, text):
+        self._remember(key, text)
+        try:
+            await self.collection.update_one(
+                {"_id": key},
+                {"$set": {"explanation": text, "createdAt": datetime.now(timezone.utc)}},
+                upsert=True)
+        except Exception as e:
+            logger.warning("Error writing explanation cache: %s", e)
+
+    def stats(self):
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memoryHits": self.memory_hits,
+            "dbHits": self.db_hits,
+            "misses": self.misses,
+            "hitRatio": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            "memoryEntries": len(self._memory),
+            "memoryBytes": self._memory_bytes,
+        }
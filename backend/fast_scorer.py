@@ -0,0 +1,213 @@
+import numpy as np
+
+
+class FastScorer:
+    """
+    Single-row scorer that maps a raw user_data document straight to the
+    feature vector expected by the XGBoost model, without going through
+    pandas, and calls the booster's inplace predict.
+
+    It is built once from the same four artifacts as the pandas path in
+    main.predict (see from_artifacts) and must return the same
+    probabilities. Its whole state is the booster and a JSON-serializable
+    plan, which is what a model bundle stores (see model_bundle).
+    """
+
+    def __init__(self, booster, plan):
+        """
+        Args:
+            booster (xgboost.Booster): Trained booster.
+            plan (dict): Feature plan, as returned by to_plan.
+        """
+        self.booster = booster
+        self.plan = plan
+        self.feature_names = list(plan["featureNames"])
+        self.classes = np.asarray(plan["classes"])
+        self.missing = np.nan if plan["missing"] is None else plan["missing"]
+        self.iteration_range = tuple(plan["iterationRange"])
+        self._unknown_value = np.nan if plan["unknownValue"] is None else float(plan["unknownValue"])
+        self._data_sep = plan["dataSep"]
+
+        # Ordinal encoded features: category -> code
+        ordinal = {name: {cat: float(code) for code, cat in enumerate(categories)}
+                   for name, categories in plan["ordinal"].items()}
+        # Dummy features: output column -> (source column, token)
+        dummies = {name: tuple(source) for name, source in plan["dummies"].items()}
+
+        # One (kind, argument) step per model feature, in feature_names_in_ order
+        self._plan = []
+        for name in self.feature_names:
+            if name in ordinal:
+                self._plan.append(("ordinal", ordinal[name]))
+            elif name in dummies:
+                self._plan.append(("dummy", dummies[name]))
+            else:
+                self._plan.append(("numeric", None))
+        # user_data field each model feature is computed from
+        self.source_fields = [dummies[name][0] if kind == "dummy" else name
+                              for name, (kind, _) in zip(self.feature_names, self._plan)]
+
+    @classmethod
+    def from_artifacts(cls, dummy, ordinal_encoder, model, label_encoder):
+        """
+        Args:
+            dummy (PrepareDummyCols): Fitted dummy columns transformer.
+            ordinal_encoder (OrdinalEncoder): Fitted ordinal encoder.
+            model (XGBClassifier): Fitted classifier.
+            label_encoder (LabelEncoder): Fitted label encoder of the classes.
+        """
+        try:
+            iteration_range = [0, int(model.best_iteration) + 1]
+        except AttributeError:
+            iteration_range = [0, 0]
+        unknown_value = ordinal_encoder.unknown_value \
+            if ordinal_encoder.handle_unknown == "use_encoded_value" else None
+        dummies = {}
+        for col, token_idx in dummy._get_column_plan().items():
+            for token, idx in token_idx.items():
+                dummies[str(dummy.columns[idx])] = [str(col), str(token)]
+        plan = {
+            "featureNames": [str(name) for name in model.feature_names_in_],
+            "classes": [c.item() if isinstance(c, np.generic) else c for c in label_encoder.classes_],
+            "missing": None if model.missing is None or np.isnan(model.missing) else float(model.missing),
+            "iterationRange": iteration_range,
+            "unknownValue": None if unknown_value is None or np.isnan(unknown_value) else float(unknown_value),
+            "dataSep": dummy.data_sep,
+            "ordinal": {str(name): [c.item() if isinstance(c, np.generic) else c for c in categories]
+                        for name, categories in zip(ordinal_encoder.feature_names_in_, ordinal_encoder.categories_)},
+            "dummies": dummies,
+        }
+        return cls(model.get_booster(), plan)
+
+    def to_plan(self):
+        """
+        Returns:
+            dict: JSON-serializable feature plan, FastScorer(booster, plan) rebuilds this scorer.
+        """
+        return self.plan
+
+    def sample_record(self):
+        """A valid user_data-like record, used for warmup."""
+        record = {}
+        for name, (kind, arg) in zip(self.feature_names, self._plan):
+            if kind == "numeric":
+                record[name] = 0
+            elif kind == "ordinal":
+                record[name] = next(iter(arg))
+            else:
+                record.setdefault(arg[0], arg[1])
+        return record
+
+    def _feature(self, name, kind, arg, doc):
+        if kind == "numeric":
+            # Same as the reindex in PrepareDummyCols: absent columns are 0
+            value = doc.get(name, 0)
+            return np.nan if value is None else value
+        if kind == "ordinal":
+            return arg.get(doc.get(name), self._unknown_value)
+        col, token = arg
+        value = doc.get(col)
+        return 1.0 if isinstance(value, str) and token in value.split(self._data_sep) else 0.0
+
+    def _fill(self, doc, row):
+        for j, (name, (kind, arg)) in enumerate(zip(self.feature_names, self._plan)):
+            row[j] = self._feature(name, kind, arg, doc)
+
+    def field_kind(self, field):
+        """
+        Returns:
+            str: "numeric" when the model reads the user_data field as a number,
+            "categorical" when it is encoded (ordinal or dummy columns), None
+            when the model does not read it.
+        """
+        kinds = {kind for source, (kind, _) in zip(self.source_fields, self._plan) if source == field}
+        if not kinds:
+            return None
+        return "numeric" if kinds == {"numeric"} else "categorical"
+
+    def transform(self, docs):
+        """
+        Map user_data documents to the float32 model feature matrix.
+
+        Args:
+            docs (list[dict]): Raw user_data documents.
+
+        Returns:
+            numpy.ndarray: (n_docs, n_features) float32 matrix.
+        """
+        X = np.empty((len(docs), len(self.feature_names)), dtype=np.float32)
+        for i, doc in enumerate(docs):
+            self._fill(doc, X[i])
+        return X
+
+    def transform_variants(self, doc, variants):
+        """
+        Feature matrix of variants of one document, e.g. what-if scenarios.
+        The document is mapped once, then only the features computed from the
+        fields changed by a variant are mapped again.
+
+        Args:
+            doc (dict): Raw user_data document.
+            variants (list[dict]): Fields replaced in ``doc`` by each variant.
+
+        Returns:
+            numpy.ndarray: (n_variants, n_features) float32 matrix.
+        """
+        X = np.repeat(self.transform([doc]), len(variants), axis=0)
+        features = {}
+        for j, (source, name, (kind, arg)) in enumerate(zip(self.source_fields, self.feature_names, self._plan)):
+            features.setdefault(source, []).append((j, name, kind, arg))
+        for i, changes in enumerate(variants):
+            for field, value in changes.items():
+                for j, name, kind, arg in features.get(field, ()):
+                    X[i, j] = self._feature(name, kind, arg, {field: value})
+        return X
+
+    def predict_proba(self, X):
+        probas = self.booster.inplace_predict(X, iteration_range=self.iteration_range,
+                                              missing=self.missing)
+        if probas.ndim == 1:
+            # Binary objectives return the positive class probability only
+            probas = np.column_stack([1 - probas, probas])
+        return probas
+
+    def contributions(self, X):
+        """
+        Per-row feature contributions (TreeSHAP, XGBoost pred_contribs) to the
+        margin of each class.
+
+        Args:
+            X (numpy.ndarray): Feature matrix returned by transform.
+
+        Returns:
+            numpy.ndarray: (n_rows, n_classes, n_features + 1) contributions,
+            the last column being the bias. (n_rows, n_features + 1) for
+            binary objectives, towards the positive class.
+        """
+        import xgboost as xgb
+
+        dmatrix = xgb.DMatrix(X, missing=self.missing, feature_names=self.feature_names)
+        return self.booster.predict(dmatrix, pred_contribs=True, iteration_range=self.iteration_range)
+
+    def predict_many(self, docs):
+        """
+        Args:
+            docs (list[dict]): Raw user_data documents.
+
+        Returns:
+            tuple: (labels, probabilities) as returned by main.predict_batch.
+        """
+        probas = self.predict_proba(self.transform(docs))
+        return self.classes[np.argmax(probas, axis=1)], probas
+
+    def predict_one(self, doc):
+        """
+        Args:
+            doc (dict): Raw user_data document.
+
+        Returns:
+            tuple: (label, probabilities) as returned by main.predict.
+        """
+        preds, probas = self.predict_many([doc])
+        return preds[0], probas[0]
+
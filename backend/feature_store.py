@@ -0,0 +1,211 @@
+import logging
+import os
+from collections import OrderedDict
+
+import numpy as np
+from pymongo import ASCENDING, IndexModel
+
+from change_streams import start_watch
+
+logger = logging.getLogger(__name__)
+
+# Number of customers kept in the local feature cache, 0 disables it
+FEATURE_CACHE_SIZE = int(os.environ.get("FEATURE_CACHE_SIZE", 0))
+
+# Fields never needed to build a user profile (identifiers and the training label)
+PROFILE_EXCLUDED_FIELDS = ("ID", "SSN", "Credit_Score")
+PROFILE_PROJECTION = {name: 0 for name in PROFILE_EXCLUDED_FIELDS}
+
+# Customer_ID is the only field the frontend filters user_data on
+USER_DATA_INDEXES = [
+    IndexModel([("Customer_ID", ASCENDING)], name="Customer_ID_1"),
+]
+
+
+async def ensure_user_data_indexes(collection):
+    """Create the user_data indexes if they do not exist yet."""
+    names = await collection.create_indexes(USER_DATA_INDEXES)
+    logger.info("user_data indexes: %s", names)
+
+
+def scoring_projection(fields):
+    """
+    Projection of user_data down to the given fields plus Customer_ID.
+
+    Args:
+        fields (list[str]): Fields read by scoring, e.g. ModelRegistry.input_fields
+            and the scorecard inputs.
+    """
+    return {"_id": 0, "Customer_ID": 1} | {name: 1 for name in fields}
+
+
+class FeatureCache:
+    """
+    User profiles of the most recently used customers, held column by column
+    in typed NumPy arrays (int64, float64 or object) with one row per
+    customer. Rows are overwritten in place when the customer document
+    changes, so a profile lookup is a dict access plus one read per column.
+    """
+
+    def __init__(self, capacity=FEATURE_CACHE_SIZE):
+        """
+        Args:
+            capacity (int): Maximum number of customers, 0 disables the cache.
+        """
+        self.capacity = capacity
+        self.columns = {}
+        # Whether each row has the field, so that missing fields stay missing
+        self.present = {}
+        self.slots = OrderedDict()
+        self.doc_ids = [None] * capacity
+        self.customer_ids = [None] * capacity
+        self.slot_by_doc_id = {}
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    @staticmethod
+    def _dtype(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return object
+        return np.int64 if isinstance(value, int) else np.float64
+
+    def _column(self, name, value):
+        column = self.columns.get(name)
+        dtype = self._dtype(value)
+        if column is None:
+            column = np.zeros(self.capacity, dtype=dtype) if dtype is not object \
+                else np.full(self.capacity, None, dtype=object)
+            self.present[name] = np.zeros(self.capacity, dtype=bool)
+        elif column.dtype != object and dtype is not column.dtype.type:
+            # int column receiving a float, or a numeric column receiving anything else
+            column = column.astype(np.float64 if {column.dtype.type, dtype} == {np.int64, np.float64} else object)
+        else:
+            return column
+        self.columns[name] = column
+        return column
+
+    def _write(self, slot, doc):
+        for present in self.present.values():
+            present[slot] = False
+        for name, value in doc.items():
+            if name == "_id":
+                continue
+            self._column(name, value)[slot] = value
+            self.present[name][slot] = True
+
+    def get(self, customer_id):
+        """
+        Returns:
+            dict: The cached profile document (without _id), or None.
+        """
+        slot = self.slots.get(customer_id)
+        if slot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.slots.move_to_end(customer_id)
+        return {name: column[slot].item() if column.dtype != object else column[slot]
+                for name, column in self.columns.items() if self.present[name][slot]}
+
+    def put(self, customer_id, doc):
+        """
+        Cache the profile document of a customer, evicting the least recently used one if full.
+
+        Args:
+            customer_id (int): The Customer_ID.
+            doc (dict): The user_data document, with its _id.
+        """
+        if not self.enabled:
+            return
+        slot = self.slots.get(customer_id)
+        if slot is None:
+            if self.free_slots:
+                slot = self.free_slots.pop()
+            else:
+                _, slot = self.slots.popitem(last=False)
+                self.slot_by_doc_id.pop(self.doc_ids[slot], None)
+            self.slots[customer_id] = slot
+        else:
+            self.slots.move_to_end(customer_id)
+            self.slot_by_doc_id.pop(self.doc_ids[slot], None)
+        self._write(slot, doc)
+        self.doc_ids[slot] = doc["_id"]
+        self.customer_ids[slot] = customer_id
+        self.slot_by_doc_id[doc["_id"]] = slot
+
+    def evict_doc(self, doc_id):
+        slot = self.slot_by_doc_id.pop(doc_id, None)
+        if slot is None:
+            return
+        del self.slots[self.customer_ids[slot]]
+        self.doc_ids[slot] = self.customer_ids[slot] = None
+        self.free_slots.append(slot)
+
+    def evict_customer(self, customer_id):
+        slot = self.slots.get(customer_id)
+        if slot is not None:
+            self.evict_doc(self.doc_ids[slot])
+
+    async def on_change(self, change):
+        """Apply a user_data change event to the cached customers."""
+        doc_id = change.get("documentKey", {}).get("_id")
+        if doc_id not in self.slot_by_doc_id:
+            return
+        doc = change.get("fullDocument")
+        if change["operationType"] == "delete" or doc is None:
+            self.evict_doc(doc_id)
+            return
+        doc = {name: value for name, value in doc.items() if name not in PROFILE_EXCLUDED_FIELDS}
+        if doc.get("Customer_ID") in self.slots and self.slot_by_doc_id[doc_id] == self.slots[doc["Customer_ID"]]:
+            self.put(doc["Customer_ID"], doc)
+        else:
+            # The Customer_ID itself changed
+            self.evict_doc(doc_id)
+
+    def start(self, collection):
+        """
+        Follow the user_data change stream to keep the cached rows current.
+
+        Returns:
+            asyncio.Task: The task, to be cancelled on shutdown.
+        """
+        pipeline = [{"$match": {"operationType": {"$in": ["update", "replace", "delete"]}}}]
+        return start_watch(collection, self.on_change, pipeline, full_document="updateLookup")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.slots),
+            "capacity": self.capacity,
+        }
+
+
+feature_cache = FeatureCache()
+
+
+async def fetch_profile_doc(collection, customer_id):
+    """
+    The user_data document of a customer (first one if several), without
+    the fields excluded from profiles, from the feature cache when possible.
+
+    Returns:
+        dict: The document without _id, or None if the customer does not exist.
+    """
+    if feature_cache.enabled:
+        doc = feature_cache.get(customer_id)
+        if doc is not None:
+            return doc
+    doc = await collection.find_one({"Customer_ID": customer_id}, PROFILE_PROJECTION)
+    if doc is None:
+        return None
+    feature_cache.put(customer_id, doc)
+    doc.pop("_id", None)
+    return doc
@@ -0,0 +1,341 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+
+# In-flight LLM calls at most, further calls queue
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+# Provider quota, 0 disables the rate limiter
+LLM_REQUESTS_PER_MINUTE = float(os.environ.get("LLM_REQUESTS_PER_MINUTE", 600))
+# Timeout of one provider request, and of the whole call with queueing and retries
+LLM_TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", 30))
+LLM_DEADLINE_SECONDS = float(os.environ.get("LLM_DEADLINE_SECONDS", 60))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+LLM_RETRY_BASE_DELAY = float(os.environ.get("LLM_RETRY_BASE_DELAY", 0.5))
+# Consecutive failures opening the circuit, and seconds before a trial call
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_RESET_SECONDS = float(os.environ.get("LLM_BREAKER_RESET_SECONDS", 30))
+# Send a second, identical request when the first is slower than this quantile of the recent latencies
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_QUANTILE = float(os.environ.get("LLM_HEDGE_QUANTILE", 0.95))
+
+
+class LLMUnavailable(Exception):
+    """The LLM could not answer in time: circuit open, deadline exceeded or retries exhausted."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` calls per second on average, bursts of up to ``capacity``."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters are served in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    Fails fast once ``failure_threshold`` consecutive calls failed. After
+    ``reset_seconds`` one trial call is let through: its success closes the
+    circuit, its failure opens it again. A trial that ends without either
+    (cancelled, or a stream closed by its client) is released, and one that
+    never ends expires after ``reset_seconds``.
+    """
+
+    def __init__(self, failure_threshold=LLM_BREAKER_FAILURES, reset_seconds=LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def allow(self):
+        """
+        Returns:
+            bool: Whether a call may go through. In the half-open state, the call
+            allowed is the trial, and must end with record_success,
+            record_failure or release.
+        """
+        state = self.state
+        if state == "closed":
+            return True
+        now = time.monotonic()
+        if state == "half_open" and (self._trial_at is None or now - self._trial_at >= self.reset_seconds):
+            self._trial_at = now
+            return True
+        return False
+
+    def release(self):
+        """End the trial call without a result, so that the next call is the trial."""
+        self._trial_at = None
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_at = None
+
+
+class LatencyWindow:
+    """Latencies of the last ``size`` successful calls, for the hedging delay."""
+
+    def __init__(self, size=200, min_samples=20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def quantile(self, q):
+        """
+        Returns:
+            float: The q-quantile of the recent latencies, or None with too few samples.
+        """
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LLMGateway:
+    """
+    Every LLM call of the backend goes through here: a bounded number of
+    concurrent calls, a rate limit sized to the provider quota, per-attempt
+    timeouts within an overall deadline, retries with jittered exponential
+    backoff, a circuit breaker and optional hedged requests.
+    """
+
+    def __init__(self, llm=None, max_concurrency=LLM_MAX_CONCURRENCY, requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                 timeout=LLM_TIMEOUT_SECONDS, deadline=LLM_DEADLINE_SECONDS, max_retries=LLM_MAX_RETRIES,
+                 retry_base_delay=LLM_RETRY_BASE_DELAY, breaker=None, hedge=LLM_HEDGE,
+                 hedge_quantile=LLM_HEDGE_QUANTILE, llm_factory=None):
+        """
+        Args:
+            llm: LangChain LLM, or anything with the same ainvoke/astream methods.
+                Created by llm_factory on first use if None.
+            max_concurrency (int): In-flight calls at most.
+            requests_per_minute (float): Provider quota, 0 for no rate limit.
+            timeout (float): Seconds allowed to one provider request, queueing excluded.
+            deadline (float): Seconds allowed to a call, queueing and retries included.
+            max_retries (int): Attempts after the first one.
+            retry_base_delay (float): Backoff of the first retry, doubled at each retry.
+            breaker (CircuitBreaker): Circuit breaker, a default one if None.
+            hedge (bool): Send a second request when the first is slow.
+            hedge_quantile (float): Latency quantile after which the second request is sent.
+            llm_factory (callable): Creates the LLM, see llm.
+        """
+        self._llm = llm
+        self._llm_factory = llm_factory
+        self._llm_lock = threading.Lock()
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(requests_per_minute / 60) if requests_per_minute > 0 else None
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.latencies = LatencyWindow()
+        self.waiting = 0
+        self.in_flight = 0
+        self.counts = {"calls": 0, "failures": 0, "timeouts": 0, "retries": 0, "hedges": 0, "rejected": 0}
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            # Also called from a warm-up thread, the LLM must be created once
+            with self._llm_lock:
+                if self._llm is None:
+                    self._llm = self._llm_factory()
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
+
+    async def _call(self, prompt):
+        """One request to the provider, once a concurrency slot and a rate token are free."""
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            if self.bucket is not None:
+                await self.bucket.acquire()
+            start = time.perf_counter()
+            response = await asyncio.wait_for(self.llm.ainvoke(prompt), self.timeout)
+            self.latencies.add(time.perf_counter() - start)
+            return response
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+
+    async def _attempt(self, prompt):
+        """_call, hedged with a second identical request when the first is slower than usual."""
+        hedge_delay = self.latencies.quantile(self.hedge_quantile) if self.hedge else None
+        primary = asyncio.ensure_future(self._call(prompt))
+        if hedge_delay is None:
+            return await primary
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+            if done:
+                return primary.result()
+            self.counts["hedges"] += 1
+            pending.add(asyncio.ensure_future(self._call(prompt)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # Both requests failed
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def invoke(self, prompt):
+        """
+        Complete a prompt.
+
+        Raises:
+            LLMUnavailable: The circuit is open, the deadline passed or every attempt failed.
+        """
+        trial = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            self.counts["rejected"] += 1
+            raise LLMUnavailable("LLM circuit open", retry_after=self.breaker.retry_after())
+        try:
+            return await self._invoke(prompt)
+        finally:
+            # Cancelled before a result was recorded
+            if trial and self.breaker.state == "half_open":
+                self.breaker.release()
+
+    async def _invoke(self, prompt):
+        self.counts["calls"] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        error = None
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                response = await asyncio.wait_for(self._attempt(prompt), remaining)
+            except asyncio.TimeoutError as e:
+                self.counts["timeouts"] += 1
+                error = e
+            except Exception as e:
+                self.counts["failures"] += 1
+                error = e
+            else:
+                self.breaker.record_success()
+                return response
+            self.breaker.record_failure()
+            # Full jitter, so that the callers of a failed burst do not retry in lockstep
+            delay = random.uniform(0, self.retry_base_delay * 2 ** attempt)
+            if attempt == self.max_retries or loop.time() + delay >= deadline or not self.breaker.allow():
+                break
+            self.counts["retries"] += 1
+            await asyncio.sleep(delay)
+        raise LLMUnavailable(f"LLM call failed: {error!r}", retry_after=self.breaker.retry_after()) from error
+
+    async def stream(self, prompt):
+        """
+        Stream the completion of a prompt chunk by chunk. Each chunk must
+        arrive within the request timeout. Streams are not retried or hedged,
+        since the chunks already sent cannot be taken back.
+
+        Raises:
+            LLMUnavailable: The circuit is open, or the stream failed or stalled.
+        """
+        trial = self.breaker.state == "half_open"
+        if not self.breaker.allow():
+            self.counts["rejected"] += 1
+            raise LLMUnavailable("LLM circuit open", retry_after=self.breaker.retry_after())
+        self.counts["calls"] += 1
+        try:
+            self.waiting += 1
+            try:
+                await self.semaphore.acquire()
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            try:
+                if self.bucket is not None:
+                    await self.bucket.acquire()
+                chunks = self.llm.astream(prompt).__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError as e:
+                        self.counts["timeouts"] += 1
+                        self.breaker.record_failure()
+                        raise LLMUnavailable("LLM stream stalled", retry_after=self.breaker.retry_after()) from e
+                    except Exception as e:
+                        self.counts["failures"] += 1
+                        self.breaker.record_failure()
+                        raise LLMUnavailable(f"LLM stream failed: {e!r}",
+                                             retry_after=self.breaker.retry_after()) from e
+                    yield chunk
+                self.breaker.record_success()
+            finally:
+                self.in_flight -= 1
+                self.semaphore.release()
+        finally:
+            # Closed by the client or cancelled before a result was recorded
+            if trial and self.breaker.state == "half_open":
+                self.breaker.release()
+
+    def stats(self):
+        return self.counts | {
+            "inFlight": self.in_flight,
+            "waiting": self.waiting,
+            "circuitOpen": self.breaker.state == "open",
+            "hedgeDelaySeconds": self.latencies.quantile(self.hedge_quantile) or 0.0,
+        }
@@ -1,29 +1,64 @@
-from pymongo import MongoClient
 import json
+import logging
+import time
 
-from langchain_fireworks import Fireworks 
-from langchain_mongodb import MongoDBAtlasVectorSearch
-from langchain_voyageai import VoyageAIEmbeddings
-
-from prompt_utils import get_credit_score_expl_prompt
+# The LangChain, Fireworks and Voyage clients are imported on first use (or by
+# warm_up, after startup): they make up most of the import time of the app
+from db import get_async_db
+from explanation_cache import ExplanationCache, profile_fingerprint
+from vector_index import LocalVectorIndex
+from query_embeddings import QueryEmbeddingStore
+from suggestion_cache import TierSuggestionCache
+from change_streams import start_watch
+from observability import stage, record_llm_call, STAGE_SECONDS
+from singleflight import SingleFlight
+from llm_gateway import LLMGateway
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
 import os
-from functools import lru_cache
 
-MONGO_CONN=os.environ.get("MONGO_CONNECTION_STRING")
-MONGO_DB_NAME=os.environ.get("MONGODB_DB") 
+logger = logging.getLogger(__name__)
+
 MONGO_COLL_NAME=os.environ.get("MONGODB_COLLECTION")
 
-client = MongoClient(MONGO_CONN)
-vcol = client[MONGO_DB_NAME][MONGO_COLL_NAME]
+db = get_async_db()
+vcol = db[MONGO_COLL_NAME]
+
+# Mapping prediction to search term suggestion
+search_term_suggestions = {
+    "Good": "suggest card that have the usage of words like priority pass, zenith, lifetime free, super premium, ultra luxury, dining benefits, premium.",
+    "Poor": "suggest card that have usage limits, cashback, basic, 50 days repayment cycle, low annual fee, basic features, low joining fees, higher interest rate.",
+    "Standard": "suggest card that have usage of words cashback, with moderate credit limit and features, annual fee waiver on spends, redeem gifts on reward points."
+}
+
+# Card catalog search: "local" answers from an in-process index of the catalog,
+# "atlas" always uses Atlas Vector Search, "auto" uses the local index when the
+# catalog is small enough and Atlas otherwise
+VECTOR_INDEX_MODE = os.environ.get("VECTOR_INDEX_MODE", "auto")
+LOCAL_INDEX_MAX_DOCS = int(os.environ.get("LOCAL_INDEX_MAX_DOCS", 10000))
+# Must match the similarity of the Atlas index, see create_index.py
+VECTOR_INDEX_SIMILARITY = os.environ.get("VECTOR_INDEX_SIMILARITY", "euclidean")
+card_index = LocalVectorIndex(similarity=VECTOR_INDEX_SIMILARITY, max_docs=LOCAL_INDEX_MAX_DOCS)
+
+# Cards retrieved per tier, shared by the workers and invalidated on catalog changes
+CARD_RETRIEVAL_DEPTH = int(os.environ.get("CARD_RETRIEVAL_DEPTH", 10))
+suggestion_cache = TierSuggestionCache(db["card_suggestions_cache"])
+# Concurrent cache misses of a tier share one retrieval
+tier_card_flights = SingleFlight()
+
+# Explanations are cached per normalized profile, so repeat views cost no LLM call
+explanation_cache = ExplanationCache(db["llm_explanations"])
+explanation_flights = SingleFlight()
 
-# https://fireworks.ai/models/fireworks/llama-v3p3-70b-instruct
-# Llama 3.3 70B: Similar performance to 3.1 405B but ~88% cheaper and faster
-llm = Fireworks(
+def create_llm():
+    from langchain_fireworks import Fireworks
+
+    # https://fireworks.ai/models/fireworks/llama-v3p3-70b-instruct
+    # Llama 3.3 70B: Similar performance to 3.1 405B but ~88% cheaper and faster
+    return Fireworks(
         fireworks_api_key=os.environ.get("FIREWORKS_API_KEY"),
         model="accounts/fireworks/models/llama-v3p3-70b-instruct",
         temperature=0.000001,
@@ -32,9 +67,14 @@ llm = Fireworks(
         top_k=30
     )
 
+# All LLM calls go through the gateway: concurrency and rate limits, timeouts,
+# retries and circuit breaking, see llm_gateway.py. The LLM is created on first use.
+llm_gateway = LLMGateway(llm_factory=create_llm)
+
+
 # Embedding model - lazy initialization
+EMBEDDING_MODEL = "voyage-3-large"
 _embedding_model = None
-_vector_store = None
 
 def get_embedding_model():
     """Lazy initialization of embedding model."""
@@ -46,59 +86,260 @@ def get_embedding_model():
                 "VOYAGE_API_KEY environment variable is not set. "
                 "Please set it in your .env file or environment variables."
             )
+        from langchain_voyageai import VoyageAIEmbeddings
+
         _embedding_model = VoyageAIEmbeddings(
             voyage_api_key=voyage_api_key, 
-            model="voyage-3-large"
+            model=EMBEDDING_MODEL
         )
     return _embedding_model
 
-def get_vector_store():
-    """Lazy initialization of vector store."""
-    global _vector_store
-    if _vector_store is None:
-        _vector_store = MongoDBAtlasVectorSearch(
-            embedding=get_embedding_model(),
-            collection=vcol,
-            index_name="default"
-        )
-    return _vector_store
 
-@lru_cache(1000000)
-def invoke_llm(prompt):
+class LazyEmbeddingModel:
+    """Stands for the embedding model, which is only created when a query has to be embedded."""
+
+    async def aembed_query(self, text):
+        return await get_embedding_model().aembed_query(text)
+
+
+lazy_embedding_model = LazyEmbeddingModel()
+
+# Embeddings of the tier search terms, persisted next to the model artifacts
+query_store = QueryEmbeddingStore(model_name=EMBEDDING_MODEL).load()
+
+def warm_up():
+    """
+    Import the LLM stack and create the LLM and embedding clients ahead of the
+    first request. Blocking: run in a thread once the app is serving.
     """
-    Invoke the LLM with the given prompt with cache.
+    import prompt_utils  # noqa: F401
+
+    logger.info("LLM client ready: %s", type(llm_gateway.llm).__name__)
+    try:
+        get_embedding_model()
+    except ValueError as e:
+        logger.warning("Embedding model not created: %s", e)
+
+async def invoke_llm(prompt):
+    """
+    Invoke the LLM with the given prompt, through the gateway.
+    Awaits the completion without blocking the event loop.
 
     Args:
         prompt (str): The prompt to pass to the LLM.
+
+    Raises:
+        LLMUnavailable: See LLMGateway.invoke.
     """
-    response = llm.invoke(prompt)
+    with stage("llm.invoke"):
+        try:
+            response = await llm_gateway.invoke(prompt)
+        except Exception:
+            record_llm_call(prompt, None, "failure")
+            raise
+    record_llm_call(prompt, response)
     return response
 
-def get_credit_score_expl(user_profile_ip, pred, allowed_credit_limit, feature_importance):
+def get_credit_score_expl_request(user_profile_ip, pred, allowed_credit_limit, feature_importance):
     """
-    
-    Get the credit score explanation from the LLM.
-
-    Args:
-        user_profile_ip (str): The user profile information.
-        pred (float): The predicted credit score.
-        allowed_credit_limit (float): The allowed credit limit.
-        feature_importance (dict): The feature importance dictionary for the used ML model.
+    Build the explanation cache key and the LLM prompt for a scored profile.
 
+    Returns:
+        tuple: (cache_key, prompt)
     """
+    from prompt_utils import get_credit_score_expl_prompt, PROMPT_TEMPLATE_VERSION
+
+    cache_key = profile_fingerprint(user_profile_ip, pred, allowed_credit_limit,
+                                    feature_importance, PROMPT_TEMPLATE_VERSION)
     prompt = get_credit_score_expl_prompt.format(user_profile_ip=user_profile_ip, \
                                                  pred=pred, \
                                                  allowed_credit_limit=allowed_credit_limit, \
                                                  feature_importance=feature_importance)
-    return invoke_llm(prompt)
+    return cache_key, prompt
+
+async def get_credit_score_expl(user_profile_ip, pred, allowed_credit_limit, feature_importance):
+    """
+    Get the credit score explanation from the LLM.
+    Concurrent requests for the same explanation share one LLM call, which
+    goes on (and fills the cache) even when every caller stopped waiting.
+
+    Args:
+        user_profile_ip (dict): The user profile information.
+        pred (str): The predicted credit health.
+        allowed_credit_limit (float): The allowed credit limit.
+        feature_importance (str): The feature contributions of the applicant,
+            see local_explainer.contributions_prompt_text.
+
+    Raises:
+        LLMUnavailable: See LLMGateway.invoke.
+    """
+    cache_key, prompt = get_credit_score_expl_request(
+        user_profile_ip, pred, allowed_credit_limit, feature_importance)
+    return await explanation_flights.do(cache_key, generate_credit_score_expl, cache_key, prompt)
+
+async def generate_credit_score_expl(cache_key, prompt):
+    """Cached explanation, or a new one from the LLM."""
+    with stage("get_credit_score_expl"):
+        cached = await explanation_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        response = await invoke_llm(prompt)
+        await explanation_cache.set(cache_key, response)
+        return response
+
+async def stream_credit_score_expl(user_profile_ip, pred, allowed_credit_limit, feature_importance):
+    """
+    Stream the credit score explanation from the LLM chunk by chunk.
+    A cached explanation is yielded as a single chunk. The full text is
+    written to the explanation cache once the stream has completed.
+
+    Args: see get_credit_score_expl.
+    """
+    cache_key, prompt = get_credit_score_expl_request(
+        user_profile_ip, pred, allowed_credit_limit, feature_importance)
+    cached = await explanation_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    # Timed by hand, a span cannot stay open across the yields of a generator
+    start_time = time.perf_counter()
+    chunks = []
+    try:
+        async for chunk in llm_gateway.stream(prompt):
+            chunks.append(chunk)
+            yield chunk
+    except Exception:
+        record_llm_call(prompt, "".join(chunks), "failure")
+        raise
+    STAGE_SECONDS.labels("llm.stream").observe(time.perf_counter() - start_time)
+    record_llm_call(prompt, "".join(chunks))
+    await explanation_cache.set(cache_key, "".join(chunks))
 
-@lru_cache(maxsize=100)
-def get_card_suggestions(user_profile, user_profile_ip, pred, allowed_credit_limit):
+async def start_card_catalog():
+    """
+    Embed the tier search terms if needed, load the local card index (not in
+    "atlas" mode) and follow the catalog change stream to reload the index
+    and invalidate the cached suggestions whenever a card changes.
+
+    Returns:
+        asyncio.Task: The change stream task.
+    """
+    # Embed the tier search terms once, unless already persisted
+    try:
+        await query_store.build(search_term_suggestions, lazy_embedding_model)
+    except Exception:
+        logger.warning("Error building the query embeddings, they will be embedded on first use", exc_info=True)
+
+    try:
+        await suggestion_cache.ensure_indexes()
+    except Exception:
+        logger.warning("Error creating suggestion cache indexes", exc_info=True)
+
+    use_local_index = VECTOR_INDEX_MODE != "atlas"
+    if use_local_index:
+        try:
+            use_local_index = await card_index.load(vcol)
+        except Exception:
+            logger.warning("Error loading the local card index, using Atlas Vector Search", exc_info=True)
+            use_local_index = False
+        if not use_local_index and VECTOR_INDEX_MODE == "local":
+            logger.warning("Local vector index unavailable, falling back to Atlas Vector Search")
+
+    async def on_catalog_change(change):
+        if use_local_index:
+            await card_index.load(vcol)
+        await suggestion_cache.invalidate()
+
+    return start_watch(vcol, on_catalog_change)
+
+async def vector_search_by_vector(query_vector, k=5, oversampling_factor=10):
+    """
+    Similarity search over the card catalog for an embedded query.
+    Uses the local card index when it is loaded, Atlas Vector Search otherwise.
+
+    Args:
+        query_vector (list[float]): Embedding of the query.
+        k (int): Number of documents to return.
+        oversampling_factor (int): This times k is the number of candidates.
+
+    Returns:
+        list[dict]: Matching documents with their "score", without embeddings.
+    """
+    if card_index.ready:
+        return card_index.search(query_vector, k)
+
+    from langchain_mongodb.pipelines import vector_search_stage
+
+    pipeline = [
+        vector_search_stage(list(map(float, query_vector)), "embedding", "default", k, None, oversampling_factor),
+        {"$set": {"score": {"$meta": "vectorSearchScore"}}},
+        {"$project": {"embedding": 0}}
+    ]
+    cursor = await vcol.aggregate(pipeline)
+    return await cursor.to_list(length=None)
+
+async def vector_search(query, k=5, oversampling_factor=10):
+    """
+    Same as vector_search_by_vector for a text query, embedded asynchronously.
+    """
+    query_vector = await get_embedding_model().aembed_query(query)
+    return await vector_search_by_vector(query_vector, k, oversampling_factor)
+
+async def search_tier_cards(pred, k=5, oversampling_factor=10):
+    """
+    Best cards for a credit health tier. The tier search term embedding comes
+    from the query embedding store and, with the local card index, the ranked
+    card list of the tier is computed once per catalog version.
+
+    Args:
+        pred (str): The credit health tier ('Good', 'Poor', or 'Standard').
+        k (int): Number of cards to return.
+        oversampling_factor (int): Atlas Vector Search candidates multiplier.
+    """
+    if card_index.ready:
+        ranked = await query_store.ranked_cards(pred, search_term_suggestions[pred], lazy_embedding_model, card_index)
+        return ranked[:k]
+    query_vector = await query_store.get(pred, search_term_suggestions[pred], lazy_embedding_model)
+    return await vector_search_by_vector(query_vector, k, oversampling_factor)
+
+async def retrieve_tier_cards(pred):
+    """
+    Retrieval stage of the card suggestions: the CARD_RETRIEVAL_DEPTH best
+    cards of a credit health tier. Depends on the tier only, so it is served
+    from the shared suggestion cache after the first call.
+
+    Args:
+        pred (str): The credit health tier ('Good', 'Poor', or 'Standard').
+
+    Returns:
+        list[dict]: Cards with "name", "description" and "score", best first.
+    """
+    cards = await suggestion_cache.get(pred)
+    if cards is not None:
+        return cards
+
+    with stage("search_tier_cards"):
+        recs = await search_tier_cards(pred, k=CARD_RETRIEVAL_DEPTH, oversampling_factor=10)
+    logger.info("Retrieved cards for card suggestions", extra={"fields": {"pred": pred, "cards": len(recs)}})
+
+    cards = [
+        {
+            "name": r["title"].strip(),
+            "description": r["text"].strip(),
+            "score": r["score"]
+        }
+        for r in recs
+    ]
+    await suggestion_cache.set(pred, cards)
+    return cards
+
+async def get_card_suggestions(user_profile_ip, pred, allowed_credit_limit):
     """
     Retrieves card suggestions based on user profile and prediction.
 
     Args:
-        user_profile (str): The user profile information.
         user_profile_ip (str): The user profile input in JSON format.
         pred (str): The prediction for the user profile ('Good', 'Poor', or 'Standard').
         allowed_credit_limit (float): The allowed credit limit for the user.
@@ -106,58 +347,18 @@ def get_card_suggestions(user_profile, user_profile_ip, pred, allowed_credit_lim
     Returns:
         str: The card suggestions based on the user profile and prediction.
     """
-    import time
-    start_time = time.time()
-
-    # Mapping prediction to search term suggestion
-    search_term_suggestions = [
-        "suggest card that have the usage of words like priority pass, zenith, lifetime free, super premium, ultra luxury, dining benefits, premium.",
-        "suggest card that have usage limits, cashback, basic, 50 days repayment cycle, low annual fee, basic features, low joining fees, higher interest rate.",
-        "suggest card that have usage of words cashback, with moderate credit limit and features, annual fee waiver on spends, redeem gifts on reward points."
-    ]
+    if pred not in search_term_suggestions:
+        raise ValueError(f"Unknown credit health: {pred}")
 
-    if pred == 'Good':
-        search_term_suggestion = search_term_suggestions[0]
-    elif pred == 'Poor':
-        search_term_suggestion = search_term_suggestions[1]
-    elif pred == 'Standard':
-        search_term_suggestion = search_term_suggestions[2]
+    with stage("get_card_suggestions"):
+        try:
+            cards = await tier_card_flights.do(pred, retrieve_tier_cards, pred)
+        except Exception:
+            logger.exception("Error retrieving relevant documents")
+            raise ValueError("Failed to retrieve relevant documents for card suggestions.")
 
-    print(f"pred: {pred}")
-    print(f"search_term_suggestion: {search_term_suggestion}")
-
-    try:
-        vector_store = get_vector_store()
-        recs = vector_store.similarity_search(query=search_term_suggestion, k=5, oversampling_factor=10, include_scores=True)
-        print()
-        print("Retrieved relevant documents for card suggestions:")
-        print(recs)
-        
-        # Create a list to hold the card suggestion dictionaries
-        card_suggestions_list = []
-
-         # Loop over `recs` to build the suggestion data
-        for r in recs:
-            name = r.metadata["title"].strip()
-
-            suggestion = {
-                    "name": name,
-                    "description": r.page_content.strip(),
-                    "score": r.metadata["score"]
-                }
-            card_suggestions_list.append(suggestion)
-
-        print("Formatted Card Suggestions List:")
-        print(card_suggestions_list)
-        
-         # Serialize the list of dictionaries into a JSON string
-        card_suggestions_json = json.dumps({"card_suggestions": card_suggestions_list}, ensure_ascii=False)
-        # Print the final JSON string for additional debugging (optional)
-        print("Final Card Suggestions JSON:", card_suggestions_json)
-        # Return the serialized JSON string
-        return card_suggestions_json
-
-        
-    except Exception as e:
-        print(f"Error retrieving relevant documents: {e}")
-        raise ValueError("Failed to retrieve relevant documents for card suggestions.")
\ No newline at end of file
+    # The same cards for every user of a tier: the catalog has no structured
+    # attributes (limits, fees) to rank them per user on
+    card_suggestions_list = cards[:5]
+    # Serialize the list of dictionaries into a JSON string
+    return json.dumps({"card_suggestions": card_suggestions_list}, ensure_ascii=False)
@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+
+from model_registry import registry
+
+# Seconds the LLM explanation may take before the local one is served, 0 always waits for the LLM
+EXPLANATION_BUDGET_SECONDS = float(os.environ.get("EXPLANATION_BUDGET_SECONDS", 8))
+# Factors named on each side in the local explanation
+LOCAL_EXPLANATION_FACTORS = int(os.environ.get("LOCAL_EXPLANATION_FACTORS", 3))
+
+
+def feature_contributions(user_profile_ip, pred, scorer=None):
+    """
+    Contribution of each user_data field to the predicted credit health of one
+    applicant (XGBoost TreeSHAP, summed over the model features computed from
+    the field).
+
+    Args:
+        user_profile_ip (dict): Profile of the applicant, see scoring.profile_input.
+        pred (str): Predicted credit health.
+        scorer (FastScorer): Scorer of the model that made the prediction, the active one by default.
+
+    Returns:
+        list[tuple]: (field, contribution) pairs, largest absolute contribution
+        first. Positive contributions push towards ``pred``.
+    """
+    scorer = scorer or registry.ensure_loaded().fast_scorer
+    class_idx = np.flatnonzero(scorer.classes == pred)
+    if not len(class_idx):
+        raise ValueError(f"Unknown credit health: {pred}")
+    contribs = scorer.contributions(scorer.transform([user_profile_ip]))[0]
+    if contribs.ndim == 2:
+        row = contribs[class_idx[0]]
+    else:
+        row = contribs if class_idx[0] == 1 else -contribs
+    totals = {}
+    # The last column is the bias
+    for field, value in zip(scorer.source_fields, row[:-1]):
+        totals[field] = totals.get(field, 0.0) + float(value)
+    return sorted(totals.items(), key=lambda item: -abs(item[1]))
+
+
+def contributions_prompt_text(contributions, user_profile_ip):
+    """Contributions of an applicant as listed in the explanation prompt."""
+    return "\n".join(
+        f"Column:{field}  Value:{user_profile_ip.get(field)}  Contribution to the predicted Credit Health:{value:+.3f}"
+        for field, value in contributions)
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
+
+def describe_factors(factors, user_profile_ip):
+    names = [f"{field.replace('_', ' ')} ({format_value(user_profile_ip.get(field))})" for field, _ in factors]
+    return names[0] if len(names) == 1 else f"{', '.join(names[:-1])} and {names[-1]}"
+
+
+def render_local_explanation(user_profile_ip, pred, allowed_credit_limit, contributions,
+                             n_factors=LOCAL_EXPLANATION_FACTORS):
+    """
+    Templated explanation of a score, built from the feature contributions in
+    a few milliseconds. Served when the LLM explanation misses its latency
+    budget or the LLM is unavailable.
+
+    Args:
+        user_profile_ip (dict): Profile of the applicant.
+        pred (str): Predicted credit health.
+        allowed_credit_limit (int): Allowed credit limit.
+        contributions (list[tuple]): As returned by feature_contributions.
+        n_factors (int): Factors named for and against the prediction.
+
+    Returns:
+        str: The explanation.
+    """
+    name = user_profile_ip.get("Name") or "the applicant"
+    approved = pred != "Poor"
+    if approved:
+        text = (f"The suggestion to approve the application of {name} with credit health classified as "
+                f"'{pred}' and to provide a credit limit of ${allowed_credit_limit:,} can be attributed to "
+                f"several factors.")
+    else:
+        text = (f"The suggestion to reject the application of {name} with credit health classified as "
+                f"'{pred}' can be attributed to several factors.")
+    towards = [c for c in contributions if c[1] > 0][:n_factors]
+    against = [c for c in contributions if c[1] < 0][:n_factors]
+    if towards:
+        subject = "factors weighing most towards this classification are" if len(towards) > 1 \
+            else "factor weighing most towards this classification is"
+        text += f" The {subject} {describe_factors(towards, user_profile_ip)}."
+    if against:
+        text += f" On the other hand, {describe_factors(against, user_profile_ip)} weighed against it."
+    salary = user_profile_ip.get("Monthly_Inhand_Salary")
+    if approved and salary:
+        text += f" The credit limit is based on a monthly in-hand salary of ${format_value(float(salary))}."
+    return text
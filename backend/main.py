@@ -1,112 +1,186 @@
-import pandas as pd
-import joblib
-from pymongo import MongoClient
-import certifi
 import os
 import json
-import numpy as np
-import sys
-from dummy import PrepareDummyCols
+import hmac
+import math
+from model_registry import registry, MODEL_BUNDLE_POLL_SECONDS
 from dotenv import load_dotenv
-from functools import lru_cache
-from llm_utils import invoke_llm, get_credit_score_expl, get_card_suggestions
-from stat_score_util import calculate_credit_score, calculate_percentile_given_value
-from fastapi import FastAPI, HTTPException, Request
+# Before the MongoDB clients are created, see observability.MongoCommandListener
+from observability import setup_logging, stage, cache_stats_collector, runtime_stats_collector, REQUEST_SECONDS, \
+    REQUESTS_IN_FLIGHT
+from db import get_async_db, get_sync_db, close as close_db
+from llm_utils import get_credit_score_expl, stream_credit_score_expl, get_card_suggestions, explanation_cache, \
+    suggestion_cache, start_card_catalog, tier_card_flights, explanation_flights, llm_gateway, warm_up
+from llm_gateway import LLMUnavailable
+from scorecard import score_profile
+from local_explainer import EXPLANATION_BUDGET_SECONDS, feature_contributions, contributions_prompt_text, \
+    render_local_explanation
+from population_stats import population_stats, scorecard_config, SCORECARD_STATS
+from feature_store import ensure_user_data_indexes, feature_cache, fetch_profile_doc
+from scoring import calculate_allowed_credit_limit, profile_input, score_users, score_document, materialize_scores
+from score_materializer import MATERIALIZE_SCORES, LeaderLease, ScoreStore, ScoreMaterializer
+from singleflight import SingleFlight
+from scoring_session import scoring_sessions, suggestion_profile
+from shadow_scoring import MODEL_COMPARISON_COLLECTION, ShadowScorer
+from simulation import expand_scenarios, simulate
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.routing import Match
 
 import time
-from datetime import datetime, timezone
-
-import uvicorn
-
-# Fix for pickle/joblib loading when running with uvicorn
-# When uvicorn runs, __main__ refers to uvicorn's main module, not our main.py
-# The pickle file expects PrepareDummyCols to be in __main__, so we register it there
-# This ensures pickle can find the class when unpickling the model file
-import __main__
-if not hasattr(__main__, 'PrepareDummyCols'):
-    __main__.PrepareDummyCols = PrepareDummyCols
 
 # Load environment variables
 load_dotenv()
+setup_logging()
+logger = logging.getLogger(__name__)
 
-# MongoDB setup
-MONGO_CONN = os.environ.get("MONGO_CONNECTION_STRING")
-COLLECTION = os.environ.get("MONGODB_DB")
-client = MongoClient(MONGO_CONN)
-col = client[COLLECTION]["user_data"]
-
-# Model loading - lazy initialization to avoid pickle issues with uvicorn reloader
-_label_encoder_l = None
-_dummy_l = None
-_model_l = None
-_ordinal_enc_l = None
-
-def get_label_encoder():
-    """Lazy initialization of label encoder."""
-    global _label_encoder_l
-    if _label_encoder_l is None:
-        _label_encoder_l = joblib.load("./model/credit_score_mul_lable_le.jlb")
-    return _label_encoder_l
-
-def get_dummy():
-    """Lazy initialization of dummy transformer."""
-    global _dummy_l
-    if _dummy_l is None:
-        # Ensure PrepareDummyCols is available in __main__ namespace for pickle
-        # This is needed because uvicorn runs the app as __main__
-        import __main__
-        if not hasattr(__main__, 'PrepareDummyCols'):
-            __main__.PrepareDummyCols = PrepareDummyCols
-        _dummy_l = joblib.load("./model/credit_score_mul_lable_coldummy.jlb")
-    return _dummy_l
-
-def get_model():
-    """Lazy initialization of ML model."""
-    global _model_l
-    if _model_l is None:
-        _model_l = joblib.load("./model/credit_score_mul_lable_model.jlb")
-    return _model_l
-
-def get_ordinal_encoder():
-    """Lazy initialization of ordinal encoder."""
-    global _ordinal_enc_l
-    if _ordinal_enc_l is None:
-        _ordinal_enc_l = joblib.load("./model/credit_score_mul_lable_ordenc.jlb")
-    return _ordinal_enc_l
-
-
-def predict(df):
-    # Get models lazily
-    dummy_l = get_dummy()
-    ordinal_enc_l = get_ordinal_encoder()
-    model_l = get_model()
-    label_encoder_l = get_label_encoder()
-    
-    df_copy = df.copy()
-    df_copy.drop(columns=["ID", "Customer_ID", "Name",
-                 "SSN", "Credit_Score"], inplace=True)
-    df_copy = dummy_l.transform(df_copy)
-    df_copy[ordinal_enc_l.feature_names_in_] = ordinal_enc_l.transform(
-        df_copy[ordinal_enc_l.feature_names_in_])
-    v = model_l.predict_proba(df_copy[model_l.feature_names_in_])[0]
-    pred = label_encoder_l.inverse_transform(
-        model_l.predict(df_copy[model_l.feature_names_in_]))[0]
-    return pred, v
+# MongoDB setup: the request handlers share the async client of db.py with
+# llm_utils, the sync client is only created by the functions of the inference
+# thread pool that need it (see score_user_ids and materialize_user_scores)
+acol = get_async_db()["user_data"]
+
+# Bounded thread pool for CPU-bound model inference
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", 4))
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_THREADS,
+                                        thread_name_prefix="inference")
+
+# Precomputed scores, kept current by score_materializer when MATERIALIZE_SCORES is on
+def score_user_ids(user_ids):
+    return score_users(get_sync_db()["user_data"], user_ids)
+
+
+def materialize_user_scores(user_ids):
+    return materialize_scores(get_sync_db()["user_data"], user_ids)
+
+
+score_store = ScoreStore(get_async_db()["credit_scores"])
+score_materializer = ScoreMaterializer(acol, score_store, materialize_user_scores, inference_executor)
+# Only one process of the deployment follows user_data and writes credit_scores
+score_materializer_lease = LeaderLease(get_async_db()["leases"], "score_materializer")
+
+# Shadow and A/B models scored next to the served one, off the request path
+shadow_scorer = ShadowScorer(get_async_db()[MODEL_COMPARISON_COLLECTION])
 
+# Concurrent requests for the same user and model version share one computation
+score_flights = SingleFlight()
+credit_score_flights = SingleFlight()
 
-def get_user_profile(user_id):
+cache_stats_collector.add("explanations", explanation_cache.stats)
+cache_stats_collector.add("card_suggestions", suggestion_cache.stats)
+cache_stats_collector.add("features", feature_cache.stats)
+cache_stats_collector.add("scores", lambda: score_store.stats() | score_materializer.stats())
+cache_stats_collector.add("scoring_contexts", scoring_sessions.stats)
+runtime_stats_collector.add("score_flights", score_flights.stats)
+runtime_stats_collector.add("credit_score_flights", credit_score_flights.stats)
+runtime_stats_collector.add("explanation_flights", explanation_flights.stats)
+runtime_stats_collector.add("tier_card_flights", tier_card_flights.stats)
+runtime_stats_collector.add("llm_gateway", llm_gateway.stats)
+runtime_stats_collector.add("shadow_scoring", shadow_scorer.stats)
+
+# userIds of one /credit_score/batch request at most, larger portfolios are split by the caller
+# (or scored with score-all)
+BATCH_MAX_USERS = int(os.environ.get("BATCH_MAX_USERS", 1000))
+
+# Token expected in the X-Admin-Token header of the /admin routes, which are disabled without it
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# Score single users with FastScorer instead of the pandas pipeline
+USE_FAST_SCORER = os.environ.get("USE_FAST_SCORER", "false").lower() in ("1", "true", "yes")
+
+def predict_batch(df):
+    """
+    Run the ML pipeline once over every row of ``df``.
+    See ModelRegistry.predict_batch.
+    """
+    return registry.predict_batch(df)
+
+
+def predict(df, model=None):
+    """Prediction of the first row of ``df``, by ``model`` (a LoadedModel) or the active model."""
+    preds, probas = (model or registry.ensure_loaded().active).predict_batch(df.iloc[:1])
+    return preds[0], probas[0]
+
+
+async def run_inference(fn, *args):
+    """Run a CPU-bound function in the inference thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(inference_executor, fn, *args)
+
+
+async def get_user_profile(user_id):
     """
     Get user profile from MongoDB and run ML prediction.
     Raises ValueError if user not found.
     """
-    # Query MongoDB
-    user_records = list(col.find({"Customer_ID": int(user_id)}, {"_id": 0}))
-    
-    if not user_records or len(user_records) == 0:
-        raise ValueError(f"User with Customer_ID {user_id} not found in database")
+    with stage("get_user_profile"):
+        # Query MongoDB, or the local feature cache when enabled
+        user_record = await fetch_profile_doc(acol, int(user_id))
+
+        if user_record is None:
+            raise ValueError(f"User with Customer_ID {user_id} not found in database")
+
+        with stage("predict"):
+            return await run_inference(build_user_profile, user_id, [user_record])
+
+
+async def get_materialized_score(user_id):
+    """
+    Precomputed score of a user for the model version serving them.
+
+    Returns:
+        tuple: (pred, allowed_credit_limit, user_profile_ip, scorecard_features,
+        scorecard_credit_score), or None if there is none or MATERIALIZE_SCORES is off.
+    """
+    if not MATERIALIZE_SCORES:
+        return None
+    try:
+        with stage("get_materialized_score"):
+            doc = await score_store.get(user_id, registry.model_for(user_id).version)
+    except Exception:
+        logger.warning("Error reading precomputed score", exc_info=True)
+        return None
+    if doc is None:
+        return None
+    return (doc["userCreditProfile"], doc["allowedCreditLimit"], doc["userProfileInput"],
+            doc["scorecardScoreFeatures"], doc["scoreCardCreditScore"])
+
+
+async def save_materialized_score(user_id, pred, allowed_credit_limit, user_profile_ip, ip, scorecard_credit_score):
+    """Store a score computed on demand, so that the next read finds it precomputed."""
+    if not MATERIALIZE_SCORES:
+        return
+    try:
+        await score_store.put(score_document(user_id, pred, allowed_credit_limit, user_profile_ip,
+                                             ip, scorecard_credit_score,
+                                             model_version=registry.model_for(user_id).version))
+    except Exception:
+        logger.warning("Error storing precomputed score", exc_info=True)
+
+
+def build_user_profile(user_id, user_records):
+    """
+    Run the ML prediction on the user records fetched by get_user_profile,
+    with the model serving the user (see ModelRegistry.model_for).
+
+    Returns:
+        tuple: (pred, allowed_credit_limit, user_profile_ip)
+    """
+    model = registry.model_for(user_id)
+    if USE_FAST_SCORER:
+        user_record = user_records[0]
+        pred, v = model.fast_scorer.predict_one(user_record)
+        user_profile_ip = profile_input(user_record)
+        allowed_credit_limit = int(calculate_allowed_credit_limit(
+            user_record["Monthly_Inhand_Salary"], v))
+        return pred, allowed_credit_limit, user_profile_ip
     
+    import pandas as pd
+
     # Convert to DataFrame
     user_id_df = pd.DataFrame.from_records(user_records)
     
@@ -114,138 +188,257 @@ def get_user_profile(user_id):
         raise ValueError(f"User with Customer_ID {user_id} found but has no data")
     
     # Run ML prediction
-    pred, v = predict(user_id_df)
+    pred, v = predict(user_id_df, model)
     
     # Prepare user profile
     user_id_df.drop(columns=["ID", "Customer_ID",
-                    "SSN", "Credit_Score"], inplace=True)
+                    "SSN", "Credit_Score"], inplace=True, errors="ignore")
     user_profile_ip = user_id_df.to_dict(orient="records")[0]
     
     # Calculate allowed credit limit
     monthly_income = user_id_df['Monthly_Inhand_Salary'].values[0]
-    allowed_credit_limit = int(
-        np.ceil(monthly_income * 6 * ((1 * v[0] + 0.5 * v[1] + 0.25 * v[2]))))
+    allowed_credit_limit = int(calculate_allowed_credit_limit(monthly_income, v))
     
     return pred, allowed_credit_limit, user_profile_ip
 
 
-@lru_cache(1)
-def get_model_feature_imps():
-    model_l = get_model()
-    df = pd.DataFrame.from_records(
-        (col.find({"Customer_ID": 8625}, {"_id": 0})))
-    imp_idx = np.argsort(-1 * model_l.feature_importances_)
-    feature_importance = "\n".join(i for i in list(map(lambda x: f"Columns:{x[0]}  Prob score for decision making:{x[1]}",
-                                                       zip(df.columns[imp_idx], model_l.feature_importances_[imp_idx]))))
-    return feature_importance
-
-
-# Create FastAPI app
-app = FastAPI(
-    title="Credit Score API",
-    description="Credit Score API for credit score prediction and product suggestions",
-    version="0.1.0",
-    redirect_slashes=False
-)
-
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],  # Allow all HTTP methods (GET, POST, PUT, DELETE, OPTIONS, etc.)
-    allow_headers=["*"],  # Allow all headers
-    expose_headers=["*"],  # Expose all headers to the client
-    max_age=3600,  # Cache preflight requests for 1 hour
-)
-
-
-@app.get("/")
+def sse_event(event, data):
+    """Format a Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load, validate and warm up the model artifacts before serving requests, in a
+    # thread so that the MongoDB setup below runs meanwhile
+    model_task = asyncio.create_task(asyncio.to_thread(registry.load))
+    try:
+        await explanation_cache.ensure_indexes()
+    except Exception:
+        logger.warning("Error creating explanation cache indexes", exc_info=True)
+    try:
+        await ensure_user_data_indexes(acol)
+    except Exception:
+        logger.warning("Error creating user_data indexes", exc_info=True)
+    card_catalog_task = await start_card_catalog()
+    feature_cache_task = feature_cache.start(acol) if feature_cache.enabled else None
+    materializer_tasks = []
+    if MATERIALIZE_SCORES:
+        try:
+            await score_store.ensure_indexes()
+        except Exception:
+            logger.warning("Error creating credit_scores indexes", exc_info=True)
+        materializer_tasks = score_materializer.start(score_materializer_lease)
+    # Fit the scorecard distributions on user_data and keep them current
+    population_task = population_stats.start(acol) if SCORECARD_STATS != "fixed" else None
+    await model_task
+    # Compare the shadow and A/B models with the served one on live traffic
+    shadow_task = shadow_scorer.start()
+    if shadow_task is not None:
+        try:
+            await shadow_scorer.ensure_indexes()
+        except Exception:
+            logger.warning("Error creating %s indexes", MODEL_COMPARISON_COLLECTION, exc_info=True)
+    # Follow the model bundle activated by another worker or model-bundle activate
+    bundle_task = registry.start_bundle_watch() if MODEL_BUNDLE_POLL_SECONDS > 0 else None
+    # Import the LLM stack while the first requests are awaited
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    warm_up_task.add_done_callback(log_warm_up_error)
+    yield
+    if bundle_task is not None:
+        bundle_task.cancel()
+    if shadow_task is not None:
+        shadow_task.cancel()
+    card_catalog_task.cancel()
+    if population_task is not None:
+        population_task.cancel()
+    if feature_cache_task is not None:
+        feature_cache_task.cancel()
+    for task in materializer_tasks:
+        task.cancel()
+    inference_executor.shutdown(wait=False)
+    shadow_scorer.executor.shutdown(wait=False)
+    await close_db()
+
+
+def log_warm_up_error(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Error warming up the LLM clients", exc_info=task.exception())
+
+
+router = APIRouter()
+
+
+def route_template(request):
+    """Path template of the route matching the request, to keep the metric labels bounded."""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+async def track_requests(request: Request, call_next):
+    labels = (request.method, route_template(request))
+    in_flight = REQUESTS_IN_FLIGHT.labels(*labels)
+    in_flight.inc()
+    start_time = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        # Set by the scoring routes when the user is served by the A/B model
+        if registry.version:
+            response.headers.setdefault("X-Model-Version", registry.version)
+        return response
+    finally:
+        in_flight.dec()
+        REQUEST_SECONDS.labels(*labels, str(status)).observe(time.perf_counter() - start_time)
+
+
+@router.get("/")
 async def root():
     return {"status": "Server is running!"}
 
 
-@app.get("/credit_score/{user_id}")
-async def get_credit_score(user_id: int):
+@router.get("/ready")
+async def ready():
+    """Readiness probe: OK only once the models are loaded and warmed up."""
+    if not registry.ready:
+        return JSONResponse(content={"status": "loading"}, status_code=503)
+    return {"status": "ready", "modelVersion": registry.version,
+            "abModelVersion": registry.ab_model.version if registry.ab_model is not None else None,
+            "shadowModelVersions": [model.version for model in registry.shadows]}
+
+
+@router.get("/cache/stats")
+async def cache_stats():
     """
-    Get credit score explanation and calculations for a user.
+    Hit/miss counters of the LLM explanation, card suggestion, feature,
+    precomputed score and scoring context caches, and of the coalesced requests.
+    """
+    return {"explanations": explanation_cache.stats(), "cardSuggestions": suggestion_cache.stats(),
+            "features": feature_cache.stats(), "scores": score_store.stats() | score_materializer.stats(),
+            "scoringContexts": scoring_sessions.stats(),
+            "coalesced": {"scores": score_flights.stats(), "creditScores": credit_score_flights.stats(),
+                          "explanations": explanation_flights.stats(), "tierCards": tier_card_flights.stats()}}
+
+
+@router.post("/admin/model/swap")
+async def swap_model(request: Request):
+    """
+    Serve another model bundle without restarting: it is loaded, verified and
+    warmed up aside, then swapped in, and the other workers follow within
+    MODEL_BUNDLE_POLL_SECONDS. Expects a JSON body of the form
+    {"version": "<bundle version>"}, {"version": null} for the pickled artifacts.
+    """
+    token = request.headers.get("X-Admin-Token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    try:
+        data = await request.json()
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"JSON decode error: {str(e)}")
+    if not isinstance(data, dict) or "version" not in data:
+        raise HTTPException(status_code=400, detail="Missing required field: version")
+    try:
+        previous = await asyncio.to_thread(registry.swap, data["version"])
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid model bundle: {str(e)}")
+    return {"previousVersion": previous, "modelVersion": registry.version}
+
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage and request latencies, in-flight requests, cache and LLM counters."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+async def score_user(user_id):
+    """
+    Precomputed score of a user, or the score computed on demand (and stored)
+    on a miss. Concurrent calls for the same user and model version share one
+    computation, see coalesced_score_user.
+
+    Returns:
+        tuple: (pred, allowed_credit_limit, user_profile_ip, scorecard_features,
+        scorecard_credit_score)
     """
+    materialized = await get_materialized_score(user_id)
+    if materialized is not None:
+        return materialized
     try:
-        # Print the initial time when the function is called
-        start_time = time.time()
-        initial_time_utc = datetime.fromtimestamp(start_time, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
-        print(f"Function called at: {initial_time_utc} UTC")
+        pred, allowed_credit_limit, user_profile_ip = await get_user_profile(user_id)
+    except Exception as e:
+        logger.warning("Error in get_user_profile", exc_info=True, extra={"fields": {"userId": user_id}})
+        raise HTTPException(status_code=404, detail=f"User {user_id} not found or error retrieving user profile: {str(e)}")
+    try:
+        with stage("score_profile"):
+            ip, scorecard_credit_score = score_profile(user_profile_ip, scorecard_config())
+    except Exception as e:
+        logger.exception("Error calculating scorecard", extra={"fields": {"userId": user_id}})
+        raise HTTPException(status_code=500, detail=f"Error calculating scorecard: {str(e)}")
+    await save_materialized_score(user_id, pred, allowed_credit_limit, user_profile_ip,
+                                  ip, scorecard_credit_score)
+    return pred, allowed_credit_limit, user_profile_ip, ip, scorecard_credit_score
+
+
+async def coalesced_score_user(user_id):
+    return await score_flights.do((user_id, registry.version), score_user, user_id)
+
+
+async def explain_credit_score(user_id, user_profile_ip, pred, allowed_credit_limit, contributions,
+                               budget=EXPLANATION_BUDGET_SECONDS):
+    """
+    LLM explanation of a score, or the local one built from the feature
+    contributions when the LLM misses the latency budget or is unavailable.
+    Past the budget the LLM call goes on in the background and its explanation
+    is served by /credit_score/{user_id}/explanation.
+
+    Returns:
+        tuple: (explanation, source) where source is "llm" or "local".
+    """
+    try:
+        response = await asyncio.wait_for(
+            get_credit_score_expl(user_profile_ip, pred, allowed_credit_limit,
+                                  contributions_prompt_text(contributions, user_profile_ip)),
+            budget or None)
+        return response.strip(), "llm"
+    except (asyncio.TimeoutError, LLMUnavailable) as e:
+        logger.warning("Serving the local explanation: %r", e, extra={"fields": {"userId": user_id}})
+        return render_local_explanation(user_profile_ip, pred, allowed_credit_limit, contributions), "local"
+
+
+async def compute_credit_score(user_id):
+    """Response of /credit_score/{user_id}, see get_credit_score."""
+    try:
+        pred, allowed_credit_limit, user_profile_ip, ip, scorecard_credit_score = \
+            await coalesced_score_user(user_id)
+        model = registry.model_for(user_id)
+        shadow_scorer.submit(user_id, user_profile_ip)
 
-        # Measure time for get_user_profile
-        profile_start_time = time.time()
-        try:
-            pred, allowed_credit_limit, user_profile_ip = get_user_profile(user_id)
-        except Exception as e:
-            print(f"Error in get_user_profile: {str(e)}")
-            print(f"Error type: {type(e).__name__}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
-            raise HTTPException(status_code=404, detail=f"User {user_id} not found or error retrieving user profile: {str(e)}")
-        print(f"Time taken for get_user_profile: {time.time() - profile_start_time:.4f} seconds")
-        
-        # Measure time for get_credit_score_expl
-        expl_start_time = time.time()
         try:
-            response = get_credit_score_expl(
-                user_profile_ip, pred, allowed_credit_limit, get_model_feature_imps()).strip()
+            with stage("feature_contributions"):
+                contributions = await run_inference(feature_contributions, user_profile_ip, pred,
+                                                    model.fast_scorer)
+            response, explanation_source = await explain_credit_score(
+                user_id, user_profile_ip, pred, allowed_credit_limit, contributions)
         except Exception as e:
-            print(f"Error in get_credit_score_expl: {str(e)}")
-            print(f"Error type: {type(e).__name__}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
+            logger.exception("Error in get_credit_score_expl", extra={"fields": {"userId": user_id}})
             raise HTTPException(status_code=500, detail=f"Error generating credit score explanation: {str(e)}")
-        print(f"Time taken for get_credit_score_expl: {time.time() - expl_start_time:.4f} seconds")
 
-        # Measure time for calculating IP features
-        ip_start_time = time.time()
-        try:
-            ip = {
-                "Repayment History": (user_profile_ip["Credit_History_Age"] - user_profile_ip["Num_of_Delayed_Payment"]) / user_profile_ip["Credit_History_Age"],
-                "Credit Utilization": 1 - (1 if (user_profile_ip["Credit_Utilization_Ratio"] / 100) > 0.4 else (user_profile_ip["Credit_Utilization_Ratio"] / 100)),
-                "Credit History": calculate_percentile_given_value(user_profile_ip["Credit_History_Age"], 221.220, 99.681),
-                "Outstanding": 1 - calculate_percentile_given_value(user_profile_ip['Outstanding_Debt'], 1426.220, 1155.129),
-                "Num Credit Inquiries": 0 if calculate_percentile_given_value(user_profile_ip['Num_Credit_Inquiries'], 5.798, 3.868) > 0.8 else 1 - calculate_percentile_given_value(user_profile_ip['Num_Credit_Inquiries'], 5.798, 3.868)
-            }
-        except Exception as e:
-            print(f"Error calculating IP features: {str(e)}")
-            print(f"Error type: {type(e).__name__}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
-            raise HTTPException(status_code=500, detail=f"Error calculating scorecard features: {str(e)}")
-        print(f"Time taken for calculating IP features: {time.time() - ip_start_time:.4f} seconds")
-
-        # Measure time for calculating credit score
-        score_start_time = time.time()
-        try:
-            scorecard_credit_score = calculate_credit_score(ip)
-        except Exception as e:
-            print(f"Error calculating credit score: {str(e)}")
-            print(f"Error type: {type(e).__name__}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
-            raise HTTPException(status_code=500, detail=f"Error calculating credit score: {str(e)}")
-        print(f"Time taken for calculate_credit_score: {time.time() - score_start_time:.4f} seconds")
-
-        print(f"Total time taken for /credit_score/{user_id}: {time.time() - start_time:.4f} seconds")
-
-        print(f"User profile: {response}")
-        print(f"User credit profile: {pred}")
-        print(f"Allowed credit limit: {allowed_credit_limit}")
-        print(f"Scorecard credit score: {scorecard_credit_score}")
-        print(f"Scorecard score features: {ip}")
-        print(f"User ID: {user_id}")
+        logger.info("Scored user", extra={"fields": {"userId": user_id, "userCreditProfile": pred}})
 
         return {
             "userProfile": response,
+            "explanationSource": explanation_source,
             "userCreditProfile": pred,
             "allowedCreditLimit": allowed_credit_limit,
             "scoreCardCreditScore": scorecard_credit_score,
             "scorecardScoreFeatures": ip,
+            "scoringContextId": scoring_sessions.create(user_id, pred, allowed_credit_limit, user_profile_ip,
+                                                        model.version),
+            "modelVersion": model.version,
             "userId": user_id
         }
     except HTTPException:
@@ -253,65 +446,224 @@ async def get_credit_score(user_id: int):
         raise
     except Exception as e:
         # Catch any other unexpected errors
-        print(f"Unexpected error in get_credit_score: {str(e)}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        print(f"Full traceback: {traceback.format_exc()}")
+        logger.exception("Unexpected error in get_credit_score", extra={"fields": {"userId": user_id}})
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
-@app.post("/product_suggestions")
-async def product_suggestions(request: Request):
-    start_time = time.time()
-    print(f"Function called at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} UTC")
+@router.get("/credit_score/{user_id}")
+async def get_credit_score(user_id: int, response: Response):
+    """
+    Get credit score explanation and calculations for a user.
+    Concurrent requests for the same user and model version (the same
+    applicant opened in several tabs or by several reviewers) wait for one
+    computation and one LLM call. When the LLM misses its latency budget the
+    explanation is generated locally and "explanationSource" is "local".
+    "modelVersion" (and the X-Model-Version header) is the version that
+    scored the user, the A/B model for AB_TRAFFIC_SHARE of the customers.
+    """
+    result = await credit_score_flights.do((user_id, registry.version), compute_credit_score, user_id)
+    response.headers["X-Model-Version"] = result["modelVersion"]
+    return result
+
 
+@router.get("/credit_score/{user_id}/explanation")
+async def get_credit_score_explanation(user_id: int):
+    """
+    LLM explanation of a user's score, without latency budget. Called to
+    replace a local explanation once the LLM one is ready: it joins the LLM
+    call still running in the background, or reads its cached result.
+    """
+    pred, allowed_credit_limit, user_profile_ip, _, _ = await coalesced_score_user(user_id)
+    try:
+        contributions = await run_inference(feature_contributions, user_profile_ip, pred,
+                                            registry.model_for(user_id).fast_scorer)
+        response = await get_credit_score_expl(user_profile_ip, pred, allowed_credit_limit,
+                                               contributions_prompt_text(contributions, user_profile_ip))
+    except LLMUnavailable as e:
+        logger.warning("LLM unavailable: %s", e, extra={"fields": {"userId": user_id}})
+        raise HTTPException(status_code=503, detail=f"Credit score explanation temporarily unavailable: {str(e)}",
+                            headers={"Retry-After": str(math.ceil(e.retry_after or 1))})
+    except Exception as e:
+        logger.exception("Error in get_credit_score_expl", extra={"fields": {"userId": user_id}})
+        raise HTTPException(status_code=500, detail=f"Error generating credit score explanation: {str(e)}")
+    return {"userProfile": response.strip(), "explanationSource": "llm", "userId": user_id}
+
+
+@router.get("/credit_score/{user_id}/stream")
+async def stream_credit_score(user_id: int):
+    """
+    Streaming variant of /credit_score/{user_id} using Server-Sent Events.
+    A "score" event with the prediction, credit limit and scorecard is sent
+    as soon as they are computed, then the explanation arrives as "token"
+    events and the stream ends with a "done" (or "error") event. When the LLM
+    is unavailable the local explanation is sent as a single "token" event.
+    """
+    pred, allowed_credit_limit, user_profile_ip, ip, scorecard_credit_score = \
+        await coalesced_score_user(user_id)
+    model = registry.model_for(user_id)
+    shadow_scorer.submit(user_id, user_profile_ip)
+    contributions = await run_inference(feature_contributions, user_profile_ip, pred, model.fast_scorer)
+    feature_importance = contributions_prompt_text(contributions, user_profile_ip)
+
+    async def events():
+        yield sse_event("score", {
+            "userCreditProfile": pred,
+            "allowedCreditLimit": allowed_credit_limit,
+            "scoreCardCreditScore": scorecard_credit_score,
+            "scorecardScoreFeatures": ip,
+            "scoringContextId": scoring_sessions.create(user_id, pred, allowed_credit_limit, user_profile_ip,
+                                                        model.version),
+            "modelVersion": model.version,
+            "userId": user_id
+        })
+        started = False
+        try:
+            async for chunk in stream_credit_score_expl(
+                    user_profile_ip, pred, allowed_credit_limit, feature_importance):
+                started = True
+                yield sse_event("token", {"text": chunk})
+        except LLMUnavailable as e:
+            if started:
+                yield sse_event("error", {"detail": f"Error generating credit score explanation: {str(e)}"})
+                return
+            logger.warning("Serving the local explanation: %s", e, extra={"fields": {"userId": user_id}})
+            yield sse_event("token", {"text": render_local_explanation(
+                user_profile_ip, pred, allowed_credit_limit, contributions)})
+            yield sse_event("done", {"explanationSource": "local"})
+            return
+        except Exception as e:
+            logger.exception("Error streaming credit score explanation", extra={"fields": {"userId": user_id}})
+            yield sse_event("error", {"detail": f"Error generating credit score explanation: {str(e)}"})
+            return
+        yield sse_event("done", {"explanationSource": "llm"})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no",
+                                      "X-Model-Version": model.version})
+
+
+@router.post("/credit_score/{user_id}/simulate")
+async def simulate_credit_score(user_id: int, request: Request):
+    """
+    What-if simulation: credit health, credit limit and scorecard score of a
+    user under changed profile values, e.g.
+    {"grid": {"Credit_Utilization_Ratio": [20, 25, 30], "Num_of_Delayed_Payment": {"delta": [-2, -1, 0]}},
+     "scenarios": [{"Outstanding_Debt": {"scale": 0.5}}]}
+    Every combination of the grid values and every listed scenario are scored
+    together in one model and scorecard pass, by the model serving the user.
+    The stored document is not changed.
+    """
     try:
         data = await request.json()
-        user_profile, user_id, pred, allowed_credit_limit = \
-            data.get("userProfile"), data.get("userId"), data.get("userCreditProfile"), data.get("allowedCreditLimit")
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"JSON decode error: {str(e)}")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object")
 
-        print(f"User profile: {user_profile}")
-        print(f"User ID: {user_id}")
-        print(f"User credit profile: {pred}")
-        print(f"Allowed credit limit: {allowed_credit_limit}")
-        
-        if not all([user_profile, user_id, pred, allowed_credit_limit]):
-            print("Error: Missing required fields in the request or credit limit = 0")
-            raise ValueError("Missing required fields in the request")
-
-        profile_start_time = time.time()
-        _, _, user_profile_ip = get_user_profile(user_id)
-        print(f"Time taken for get_user_profile: {time.time() - profile_start_time:.4f} seconds")
-
-        suggestions_start_time = time.time()
-        # Move parsing logic here instead for isolated timing
-        user_profile_ip_final = {
-            k: user_profile_ip[k] for k in [
-                "Occupation", "Annual_Income", "Monthly_Inhand_Salary",
-                "Type_of_Loan", "Credit_Mix", "Payment_of_Min_Amount",
-                "Total_EMI_per_month", "Amount_invested_monthly", "Payment_Behaviour"
-            ] if k in user_profile_ip
-        }
+    _, _, user_profile_ip, _, _ = await coalesced_score_user(user_id)
+    model = registry.model_for(user_id)
+    try:
+        scenarios = await run_inference(expand_scenarios, data, user_profile_ip, model.fast_scorer)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        with stage("simulate"):
+            result = await run_inference(simulate, user_profile_ip, scenarios, model.fast_scorer,
+                                         scorecard_config())
+    except Exception as e:
+        logger.exception("Error in simulate", extra={"fields": {"userId": user_id}})
+        raise HTTPException(status_code=500, detail=f"Error simulating credit score: {str(e)}")
+    return {"userId": user_id, "modelVersion": model.version, **result}
 
-        print(f"Time taken for extracting relevant fields: {time.time() - profile_start_time:.4f} seconds")
-        
-        card_suggestions_json = get_card_suggestions(
-            user_profile, json.dumps(user_profile_ip_final), pred, allowed_credit_limit
-        )
-        print(f"Time taken for generating card suggestions json: {time.time() - suggestions_start_time:.4f} seconds")
 
-        print("Parsed card suggestions JSON:")
-        print(card_suggestions_json)
-        print(f"Total time taken for /product_suggestions: {time.time() - start_time:.4f} seconds")
+@router.post("/credit_score/batch")
+async def get_credit_score_batch(request: Request):
+    """
+    Score many users in one call, e.g. for nightly portfolio re-scoring.
+    Expects a JSON body of the form {"userIds": [8625, ...]}, with at most
+    BATCH_MAX_USERS IDs.
+    """
+    try:
+        data = await request.json()
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"JSON decode error: {str(e)}")
+
+    user_ids = data.get("userIds") if isinstance(data, dict) else None
+    if not user_ids or not isinstance(user_ids, list):
+        raise HTTPException(status_code=400, detail="userIds must be a non-empty list")
+    if len(user_ids) > BATCH_MAX_USERS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_USERS} userIds per request, "
+                                                    f"got {len(user_ids)}")
+
+    try:
+        with stage("score_users"):
+            results, not_found = await run_inference(score_user_ids, user_ids)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid userIds: {str(e)}")
+    except Exception as e:
+        logger.exception("Error in score_users")
+        raise HTTPException(status_code=500, detail=f"Error scoring users: {str(e)}")
+
+    logger.info("Scored users", extra={"fields": {"scored": len(results), "notFound": len(not_found)}})
+    return {"results": results, "notFound": not_found}
 
+
+async def scoring_context(data):
+    """
+    Prediction, credit limit and suggestion profile of the user a request is
+    about: the stored scoring context when the request carries its
+    "scoringContextId", otherwise the (precomputed or recomputed) score of the
+    user the ID was signed for (expired or unknown context) or of its "userId".
+    Values echoed back by the client are never trusted.
+
+    Returns:
+        tuple: (user_id, pred, allowed_credit_limit, profile)
+
+    Raises:
+        ValueError: Malformed or forged scoringContextId, or no userId.
+    """
+    context_id = data.get("scoringContextId")
+    if context_id:
+        user_id, context = scoring_sessions.get(context_id)
+        if context is not None:
+            return user_id, context["userCreditProfile"], context["allowedCreditLimit"], context["profile"]
+    else:
+        user_id = data.get("userId")
+        if not user_id:
+            raise ValueError("Missing required fields in the request: scoringContextId or userId")
+    # Expired, issued by another worker or evicted: score the user again
+    pred, allowed_credit_limit, user_profile_ip, _, _ = await coalesced_score_user(int(user_id))
+    return int(user_id), pred, allowed_credit_limit, suggestion_profile(user_profile_ip)
+
+
+@router.post("/product_suggestions")
+async def product_suggestions(request: Request):
+    """
+    Card suggestions for a scored user. Expects a JSON body of the form
+    {"scoringContextId": "..."} with the ID returned by /credit_score/{user_id},
+    or {"userId": 8625} to score the user again.
+    """
+    try:
+        data = await request.json()
+        if not isinstance(data, dict):
+            raise HTTPException(status_code=400, detail="Expected a JSON object")
+        try:
+            _, pred, allowed_credit_limit, profile = await scoring_context(data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        card_suggestions_json = await get_card_suggestions(json.dumps(profile), pred, allowed_credit_limit)
         return JSONResponse(content={"productRecommendations": json.loads(card_suggestions_json)})
     except json.JSONDecodeError as e:
         raise HTTPException(status_code=400, detail=f"JSON decode error: {str(e)}")
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error in product_suggestions")
         return JSONResponse(content={"error": "An error occurred.", "details": str(e)}, status_code=500)
 
 
-@app.post("/user_data/find_one")
+@router.post("/user_data/find_one")
 async def find_user_data(request: Request):
     """
     Find a single user document from MongoDB.
@@ -325,18 +677,18 @@ async def find_user_data(request: Request):
             raise HTTPException(status_code=400, detail="Filter is required")
         
         # Query MongoDB
-        user_data = col.find_one(filter_query, {"_id": 0})  # Exclude _id for JSON serialization
+        user_data = await acol.find_one(filter_query, {"_id": 0})  # Exclude _id for JSON serialization
         
         if not user_data:
             return JSONResponse(content={}, status_code=200)
         
         return JSONResponse(content=user_data)
     except Exception as e:
-        print(f"Error finding user data: {str(e)}")
+        logger.exception("Error finding user data")
         raise HTTPException(status_code=500, detail=f"Failed to find user data: {str(e)}")
 
 
-@app.post("/user_data/update_one")
+@router.post("/user_data/update_one")
 async def update_user_data(request: Request):
     """
     Update a single user document in MongoDB.
@@ -357,7 +709,12 @@ async def update_user_data(request: Request):
             del update_query["$set"]["_id"]
         
         # Update MongoDB
-        result = col.update_one(filter_query, update_query)
+        result = await acol.update_one(filter_query, update_query)
+        # Next scoring of this customer must see the update, without waiting for the change stream
+        if isinstance(filter_query.get("Customer_ID"), int):
+            feature_cache.evict_customer(filter_query["Customer_ID"])
+            if MATERIALIZE_SCORES:
+                await score_store.delete(filter_query["Customer_ID"])
         
         return JSONResponse(content={
             "matched_count": result.matched_count,
@@ -365,5 +722,37 @@ async def update_user_data(request: Request):
             "acknowledged": result.acknowledged
         })
     except Exception as e:
-        print(f"Error updating user data: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to update user data: {str(e)}")
\ No newline at end of file
+        logger.exception("Error updating user data")
+        raise HTTPException(status_code=500, detail=f"Failed to update user data: {str(e)}")
+
+
+def create_app():
+    """
+    Build the FastAPI app. Heavy dependencies (the LLM and vector search
+    clients, XGBoost, pandas) are not imported by this module: the model is
+    loaded by the lifespan and the LLM stack is warmed up once serving.
+    """
+    app = FastAPI(
+        title="Credit Score API",
+        description="Credit Score API for credit score prediction and product suggestions",
+        version="0.1.0",
+        redirect_slashes=False,
+        lifespan=lifespan
+    )
+
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],  # Allow all HTTP methods (GET, POST, PUT, DELETE, OPTIONS, etc.)
+        allow_headers=["*"],  # Allow all headers
+        expose_headers=["*"],  # Expose all headers to the client
+        max_age=3600,  # Cache preflight requests for 1 hour
+    )
+    app.middleware("http")(track_requests)
+    app.include_router(router)
+    return app
+
+
+app = create_app()
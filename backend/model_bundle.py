@@ -0,0 +1,202 @@
+"""
+Versioned model bundles: the scoring model without pickles.
+
+A bundle is a directory of MODEL_BUNDLE_DIR named after its version, holding
+the booster as XGBoost UBJSON, the feature plan of fast_scorer.FastScorer
+(encoders and dummy columns) as JSON, and a manifest with the checksum of
+both. Loading one needs neither scikit-learn nor the pickled classes, and
+the ACTIVE file of MODEL_BUNDLE_DIR names the version the workers serve.
+
+    model-bundle export --activate
+    model-bundle activate <version>
+    model-bundle list
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+from fast_scorer import FastScorer
+
+MODEL_BUNDLE_DIR = os.environ.get("MODEL_BUNDLE_DIR", "./model/bundles")
+
+BUNDLE_FORMAT = 1
+BOOSTER_FILE = "booster.ubj"
+PLAN_FILE = "plan.json"
+MANIFEST_FILE = "manifest.json"
+ACTIVE_FILE = "ACTIVE"
+
+
+def _check_version(version):
+    if not isinstance(version, str) or not version or version.startswith(".") or os.sep in version or "/" in version:
+        raise ValueError(f"Invalid model bundle version: {version!r}")
+    return version
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def export_bundle(fast_scorer, version, bundle_dir=MODEL_BUNDLE_DIR):
+    """
+    Write a scorer as a new bundle version.
+
+    Args:
+        fast_scorer (FastScorer): Scorer to export, e.g. ModelRegistry.fast_scorer.
+        version (str): Version of the bundle, also its directory name.
+        bundle_dir (str): Directory of the bundles.
+
+    Returns:
+        str: Path of the bundle.
+
+    Raises:
+        ValueError: The version already exists.
+    """
+    import xgboost as xgb
+
+    path = os.path.join(bundle_dir, _check_version(version))
+    if os.path.exists(path):
+        raise ValueError(f"Model bundle {version} already exists in {bundle_dir}")
+    booster = bytes(fast_scorer.booster.save_raw(raw_format="ubj"))
+    plan = json.dumps(fast_scorer.to_plan(), indent=2).encode()
+    # Probabilities of a sample record, checked when the bundle is loaded
+    record = fast_scorer.sample_record()
+    _, probas = fast_scorer.predict_one(record)
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": version,
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "xgboostVersion": xgb.__version__,
+        "files": {BOOSTER_FILE: hashlib.sha256(booster).hexdigest(),
+                  PLAN_FILE: hashlib.sha256(plan).hexdigest()},
+        "reference": {"record": record, "probabilities": probas.tolist()},
+    }
+
+    # Written aside, then renamed into place: a bundle directory is always complete
+    tmp_path = os.path.join(bundle_dir, f".{version}.tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, data in ((BOOSTER_FILE, booster), (PLAN_FILE, plan),
+                       (MANIFEST_FILE, json.dumps(manifest, indent=2).encode())):
+        with open(os.path.join(tmp_path, name), "wb") as f:
+            f.write(data)
+    os.rename(tmp_path, path)
+    return path
+
+
+def load_bundle(version, bundle_dir=MODEL_BUNDLE_DIR):
+    """
+    Load and verify a bundle.
+
+    Args:
+        version (str): Version of the bundle.
+        bundle_dir (str): Directory of the bundles.
+
+    Returns:
+        tuple: (FastScorer, manifest dict)
+
+    Raises:
+        ValueError: Unknown format, checksum mismatch, or predictions differing
+        from the reference ones.
+    """
+    import xgboost as xgb
+
+    path = os.path.join(bundle_dir, _check_version(version))
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported model bundle format {manifest.get('format')} in {path}")
+    data = {}
+    for name, checksum in manifest["files"].items():
+        with open(os.path.join(path, name), "rb") as f:
+            data[name] = f.read()
+        if hashlib.sha256(data[name]).hexdigest() != checksum:
+            raise ValueError(f"Checksum mismatch for {name} of model bundle {version}")
+    booster = xgb.Booster()
+    booster.load_model(bytearray(data[BOOSTER_FILE]))
+    scorer = FastScorer(booster, json.loads(data[PLAN_FILE]))
+    reference = manifest["reference"]
+    _, probas = scorer.predict_one(reference["record"])
+    if not np.allclose(probas, reference["probabilities"], atol=1e-6):
+        raise ValueError(f"Model bundle {version} does not reproduce its reference prediction")
+    return scorer, manifest
+
+
+def list_versions(bundle_dir=MODEL_BUNDLE_DIR):
+    """
+    Returns:
+        list[str]: Versions of the bundles, oldest first.
+    """
+    if not os.path.isdir(bundle_dir):
+        return []
+    versions = [name for name in os.listdir(bundle_dir)
+                if os.path.isfile(os.path.join(bundle_dir, name, MANIFEST_FILE))]
+    return sorted(versions, key=lambda v: os.path.getmtime(os.path.join(bundle_dir, v, MANIFEST_FILE)))
+
+
+def active_version(bundle_dir=MODEL_BUNDLE_DIR):
+    """
+    Returns:
+        str: The version named by the ACTIVE file, or None to serve the pickled artifacts.
+    """
+    try:
+        with open(os.path.join(bundle_dir, ACTIVE_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_active_version(version, bundle_dir=MODEL_BUNDLE_DIR):
+    """Name the version served by every worker (None for the pickled artifacts), see ModelRegistry.refresh."""
+    path = os.path.join(bundle_dir, ACTIVE_FILE)
+    if version is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    if not os.path.isfile(os.path.join(bundle_dir, _check_version(version), MANIFEST_FILE)):
+        raise ValueError(f"Unknown model bundle version: {version}")
+    _write_atomic(path, version.encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and activate model bundles.")
+    parser.add_argument("--bundle-dir", default=MODEL_BUNDLE_DIR, help="Directory of the bundles")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Export the pickled artifacts of MODEL_DIR as a bundle")
+    export.add_argument("--version", help="Version of the bundle (default: version of the pickled artifacts)")
+    export.add_argument("--activate", action="store_true", help="Serve the bundle once exported")
+    activate = commands.add_parser("activate", help="Serve a bundle, workers pick it up without restarting")
+    activate.add_argument("version")
+    commands.add_parser("list", help="List the bundles")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        from model_registry import ModelRegistry
+        model = ModelRegistry().load_pickles()
+        version = args.version or model.version
+        print(f"Exported {export_bundle(model.fast_scorer, version, args.bundle_dir)}")
+        if args.activate:
+            set_active_version(version, args.bundle_dir)
+            print(f"Activated {version}")
+    elif args.command == "activate":
+        load_bundle(args.version, args.bundle_dir)
+        set_active_version(args.version, args.bundle_dir)
+        print(f"Activated {args.version}")
+    else:
+        active = active_version(args.bundle_dir)
+        for version in list_versions(args.bundle_dir):
+            print(f"{version}{' (active)' if version == active else ''}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
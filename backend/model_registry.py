@@ -0,0 +1,392 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from fast_scorer import FastScorer
+from model_bundle import MODEL_BUNDLE_DIR, active_version, load_bundle, set_active_version
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.environ.get("MODEL_DIR", "./model")
+# Memory-map the numpy arrays of the artifacts so uvicorn workers share the pages
+MODEL_MMAP_MODE = os.environ.get("MODEL_MMAP_MODE", "r") or None
+# Seconds between two checks of the active model bundle, 0 to only check at startup
+MODEL_BUNDLE_POLL_SECONDS = float(os.environ.get("MODEL_BUNDLE_POLL_SECONDS", 10))
+# Bundle versions scored in the background next to the served model, comma-separated (see shadow_scoring)
+SHADOW_MODELS = [v.strip() for v in os.environ.get("SHADOW_MODELS", "").split(",") if v.strip()]
+# Bundle version serving AB_TRAFFIC_SHARE of the customers, picked by a hash of their Customer_ID
+AB_MODEL = os.environ.get("AB_MODEL") or None
+AB_TRAFFIC_SHARE = float(os.environ.get("AB_TRAFFIC_SHARE", 0))
+
+ARTIFACTS = {
+    "dummy": "credit_score_mul_lable_coldummy.jlb",
+    "ordinal_encoder": "credit_score_mul_lable_ordenc.jlb",
+    "model": "credit_score_mul_lable_model.jlb",
+    "label_encoder": "credit_score_mul_lable_le.jlb",
+}
+
+# Columns of user_data that are not model inputs
+NON_FEATURE_COLUMNS = ["ID", "Customer_ID", "Name", "SSN", "Credit_Score"]
+
+
+def ab_bucket(user_id, salt=""):
+    """
+    Stable position of a customer in [0, 1) for traffic splits: the same
+    Customer_ID always lands in the same bucket, on every worker and restart.
+
+    Args:
+        user_id (int): Customer_ID.
+        salt (str): Experiment name, e.g. the A/B model version, so that
+            successive experiments do not expose the same customers.
+    """
+    digest = hashlib.sha256(f"{salt}:{int(user_id)}".encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+class LoadedModel:
+    """
+    The artifacts of one model version. The registry replaces it as a whole
+    on a hot swap, so that a prediction never mixes two versions.
+
+    Loaded from the pickled artifacts it carries the scikit-learn objects of
+    the pandas path; loaded from a bundle (see model_bundle) only the
+    FastScorer, which then serves the batch predictions too.
+    """
+
+    def __init__(self, version, fast_scorer, dummy=None, ordinal_encoder=None, model=None,
+                 label_encoder=None, bundle=None):
+        """
+        Args:
+            version (str): Model version, stamped on the scores.
+            fast_scorer (FastScorer): Scorer of the version.
+            dummy, ordinal_encoder, model, label_encoder: Pickled artifacts, None for a bundle.
+            bundle (str): Bundle version the model was loaded from, None for the pickled artifacts.
+        """
+        self.version = version
+        self.fast_scorer = fast_scorer
+        self.dummy = dummy
+        self.ordinal_encoder = ordinal_encoder
+        self.model = model
+        self.label_encoder = label_encoder
+        self.bundle = bundle
+
+    def validate(self):
+        """
+        Check that the pickled artifacts fit together.
+        Raises ValueError if they do not.
+        """
+        if self.dummy is None:
+            # Bundles are checked against their reference prediction by load_bundle
+            return
+        dummy_columns = set(self.dummy.columns)
+        missing = set(self.ordinal_encoder.feature_names_in_) - dummy_columns
+        if missing:
+            raise ValueError(f"Ordinal encoder columns not produced by the dummy transformer: {sorted(missing)}")
+        missing = set(self.model.feature_names_in_) - dummy_columns
+        if missing:
+            raise ValueError(f"Model features not produced by the dummy transformer: {sorted(missing)}")
+        if len(self.label_encoder.classes_) != self.model.n_classes_:
+            raise ValueError(f"Label encoder has {len(self.label_encoder.classes_)} classes, "
+                             f"model has {self.model.n_classes_}")
+
+    def input_fields(self):
+        if self.dummy is None:
+            return sorted(set(self.fast_scorer.source_fields))
+        # Dummy columns are produced by the pipeline, not read from user_data
+        generated = {self.dummy.columns[idx] for token_idx in self.dummy._get_column_plan().values()
+                     for idx in token_idx.values()}
+        fields = set(self.dummy.dummy_cols) | set(self.ordinal_encoder.feature_names_in_) | \
+            set(self.model.feature_names_in_)
+        return sorted(str(f) for f in fields - generated)
+
+    def sample_record(self):
+        if self.dummy is None:
+            return self.fast_scorer.sample_record()
+        record = {name: 0 for name in self.dummy.columns}
+        for name, categories in zip(self.ordinal_encoder.feature_names_in_,
+                                    self.ordinal_encoder.categories_):
+            record[name] = categories[0]
+        for col, token_idx in self.dummy._get_column_plan().items():
+            record[col] = next(iter(token_idx), "")
+        return record
+
+    def warmup(self):
+        """Run one prediction through both scoring paths."""
+        import pandas as pd
+
+        record = self.sample_record()
+        _, probas = self.predict_batch(pd.DataFrame.from_records([record]))
+        _, fast_probas = self.fast_scorer.predict_one(record)
+        if not np.allclose(probas.sum(axis=1), 1, atol=1e-4) or not np.allclose(probas[0], fast_probas):
+            raise ValueError(f"Warmup prediction of model version {self.version} is not consistent")
+
+    def predict_batch(self, df):
+        df_copy = df.drop(columns=NON_FEATURE_COLUMNS, errors="ignore")
+        if self.dummy is None:
+            return self.fast_scorer.predict_many(df_copy.to_dict(orient="records"))
+        df_copy = self.dummy.transform(df_copy)
+        df_copy[self.ordinal_encoder.feature_names_in_] = self.ordinal_encoder.transform(
+            df_copy[self.ordinal_encoder.feature_names_in_])
+        probas = self.model.predict_proba(df_copy[self.model.feature_names_in_])
+        # The label is the argmax of the probabilities, no need for a second
+        # pass through the model with model.predict
+        preds = self.label_encoder.inverse_transform(np.argmax(probas, axis=1))
+        return preds, probas
+
+
+class ModelRegistry:
+    """
+    Holds the ML artifacts used for scoring. They are loaded, validated and
+    warmed up once (at application startup, see main.lifespan) instead of on
+    the first request that needs them.
+
+    The model comes from the bundle named by the ACTIVE file of the bundle
+    directory, or from the pickled artifacts of MODEL_DIR when there is none.
+    swap replaces it while serving, and every worker follows the ACTIVE file
+    (see start_bundle_watch).
+
+    Next to it, the registry can hold an A/B model serving a share of the
+    customers (see model_for) and shadow models that never serve but are
+    compared with the served one (see shadow_scoring). Both are bundles and
+    are not affected by swap.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, mmap_mode=MODEL_MMAP_MODE, bundle_dir=MODEL_BUNDLE_DIR,
+                 shadow_bundles=SHADOW_MODELS, ab_bundle=AB_MODEL, ab_share=AB_TRAFFIC_SHARE):
+        self.model_dir = model_dir
+        self.mmap_mode = mmap_mode
+        self.bundle_dir = bundle_dir
+        self.shadow_bundles = list(shadow_bundles)
+        self.ab_bundle = ab_bundle if ab_share > 0 else None
+        self.ab_share = ab_share
+        self.active = None
+        self.ab_model = None
+        self.shadows = []
+        self.ready = False
+        self._lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self.active.version if self.active is not None else None
+
+    @property
+    def fast_scorer(self):
+        return self.active.fast_scorer if self.active is not None else None
+
+    @property
+    def dummy(self):
+        return self.active.dummy if self.active is not None else None
+
+    def load_pickles(self):
+        """
+        Load the pickled artifacts of the model directory.
+
+        Returns:
+            LoadedModel: The model, versioned by the hash of the artifacts.
+        """
+        import joblib
+        from dummy import PrepareDummyCols
+
+        # The pickles reference PrepareDummyCols as __main__.PrepareDummyCols (the
+        # module it was defined in when they were written). Under uvicorn __main__
+        # is uvicorn's, so the class is registered there for joblib to find it.
+        import __main__
+        if not hasattr(__main__, "PrepareDummyCols"):
+            __main__.PrepareDummyCols = PrepareDummyCols
+
+        digest = hashlib.sha256()
+        artifacts = {}
+        for name, file_name in ARTIFACTS.items():
+            path = os.path.join(self.model_dir, file_name)
+            with open(path, "rb") as f:
+                digest.update(f.read())
+            artifacts[name] = joblib.load(path, mmap_mode=self.mmap_mode)
+        model = LoadedModel(digest.hexdigest()[:12], None, **artifacts)
+        model.validate()
+        model.fast_scorer = FastScorer.from_artifacts(model.dummy, model.ordinal_encoder,
+                                                      model.model, model.label_encoder)
+        return model
+
+    def load_bundle(self, version):
+        """
+        Returns:
+            LoadedModel: The model of a bundle version, see model_bundle.load_bundle.
+        """
+        fast_scorer, manifest = load_bundle(version, self.bundle_dir)
+        return LoadedModel(manifest["version"], fast_scorer, bundle=version)
+
+    def _load(self, bundle):
+        start_time = time.time()
+        model = self.load_bundle(bundle) if bundle else self.load_pickles()
+        model.warmup()
+        logger.info("Loaded model version %s from %s in %.4f seconds", model.version,
+                    f"bundle {bundle}" if bundle else "the pickled artifacts", time.time() - start_time)
+        return model
+
+    def load(self):
+        """Load and validate the active model, then run a warmup prediction."""
+        with self._lock:
+            if self.ready:
+                return self
+            self.active = self._load(active_version(self.bundle_dir))
+            self._load_variants()
+            self.ready = True
+        return self
+
+    def _load_variants(self):
+        # A variant that does not load is left out: the served model is unaffected
+        if self.ab_bundle:
+            try:
+                self.ab_model = self._load(self.ab_bundle)
+            except Exception:
+                logger.exception("Error loading the A/B model bundle %s, serving %s to every customer",
+                                 self.ab_bundle, self.version)
+        shadows = []
+        for bundle in self.shadow_bundles:
+            try:
+                shadows.append(self._load(bundle))
+            except Exception:
+                logger.exception("Error loading the shadow model bundle %s", bundle)
+        self.shadows = shadows
+
+    def model_for(self, user_id):
+        """
+        Model serving a customer: the A/B model for AB_TRAFFIC_SHARE of the
+        Customer_IDs, the active model for the others.
+
+        Returns:
+            LoadedModel: The model.
+        """
+        self.ensure_loaded()
+        ab_model = self.ab_model
+        if ab_model is not None and ab_bucket(user_id, ab_model.version) < self.ab_share:
+            return ab_model
+        return self.active
+
+    def compared_models(self, served):
+        """
+        Returns:
+            list[LoadedModel]: The loaded models other than ``served``, to be
+            scored in its shadow (shadow models, and the active or A/B one).
+        """
+        models = [self.active, self.ab_model] + self.shadows
+        seen = {served.version}
+        compared = []
+        for model in models:
+            if model is not None and model.version not in seen:
+                seen.add(model.version)
+                compared.append(model)
+        return compared
+
+    def ensure_loaded(self):
+        """Load the artifacts if this process has not done it yet (e.g. scripts)."""
+        if not self.ready:
+            self.load()
+        return self
+
+    def swap(self, bundle, persist=True):
+        """
+        Load, verify and warm up a bundle, then serve it in place of the current
+        model. Requests in flight finish with the model they started with.
+
+        Args:
+            bundle (str): Bundle version, None for the pickled artifacts.
+            persist (bool): Make it the active bundle of every worker.
+
+        Returns:
+            str: The version served before.
+
+        Raises:
+            ValueError: The bundle is invalid, see model_bundle.load_bundle.
+        """
+        with self._swap_lock:
+            model = self._load(bundle)
+            if persist:
+                set_active_version(bundle, self.bundle_dir)
+            previous = self.version
+            self.active = model
+            self.ready = True
+        logger.info("Swapped model version %s for %s", previous, model.version)
+        return previous
+
+    def refresh(self):
+        """Swap to the active bundle if another worker changed it."""
+        bundle = active_version(self.bundle_dir)
+        if self.active is not None and bundle != self.active.bundle:
+            self.swap(bundle, persist=False)
+
+    def start_bundle_watch(self, interval=MODEL_BUNDLE_POLL_SECONDS):
+        """
+        Follow the active bundle in the background.
+
+        Returns:
+            asyncio.Task: The task, to be cancelled on shutdown.
+        """
+        async def run():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await asyncio.to_thread(self.refresh)
+                except Exception as e:
+                    logger.warning("Error refreshing the active model bundle: %s", e)
+
+        return asyncio.create_task(run())
+
+    def input_fields(self):
+        """
+        user_data fields read by the ML pipeline, for query projections.
+
+        Returns:
+            list[str]: Field names.
+        """
+        return self.ensure_loaded().active.input_fields()
+
+    def predict_batch(self, df):
+        """
+        Run the ML pipeline once over every row of ``df``.
+
+        Args:
+            df (pandas.DataFrame): Raw user_data records, one row per user.
+
+        Returns:
+            tuple: (labels, probabilities) where ``labels`` is an array of credit
+            health labels and ``probabilities`` the (n_rows, n_classes) matrix
+            returned by ``predict_proba``.
+        """
+        return self.ensure_loaded().active.predict_batch(df)
+
+    def predict_batch_routed(self, df):
+        """
+        Same as predict_batch, with every row scored by the model serving its
+        Customer_ID (see model_for): one pass per model.
+
+        Returns:
+            tuple: (labels, probabilities, versions) with the model version of every row.
+        """
+        active = self.ensure_loaded().active
+        if self.ab_model is None or "Customer_ID" not in df:
+            preds, probas = active.predict_batch(df)
+            return preds, probas, np.full(len(df), active.version, dtype=object)
+        groups = {}
+        for row, user_id in enumerate(df["Customer_ID"]):
+            model = self.model_for(user_id)
+            groups.setdefault(model.version, (model, []))[1].append(row)
+        preds = np.empty(len(df), dtype=object)
+        probas = None
+        versions = np.empty(len(df), dtype=object)
+        for version, (model, rows) in groups.items():
+            group_preds, group_probas = model.predict_batch(df.iloc[rows])
+            if probas is None:
+                probas = np.empty((len(df), group_probas.shape[1]), dtype=group_probas.dtype)
+            preds[rows] = group_preds
+            probas[rows] = group_probas
+            versions[rows] = version
+        return preds, probas, versions
+
+registry = ModelRegistry()
@@ -0,0 +1,223 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from pymongo import monitoring
+
+try:
+    from opentelemetry import trace
+    tracer = trace.get_tracer("credit_score")
+except ImportError:
+    trace = tracer = None
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Share of DEBUG/INFO records written, warnings and errors are always written
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 1.0))
+
+# Fields never written to the logs, wherever they appear in a logged dict
+PII_FIELDS = {"Name", "SSN", "ID", "Age", "Annual_Income", "Monthly_Inhand_Salary", "userProfile", "userProfileInput"}
+SSN_PATTERN = re.compile(r"\b\d{3}-\d{2}-\d{4}\b")
+REDACTED = "[redacted]"
+
+# Latencies from 1ms to 30s, the LLM stages are the slow end
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+STAGE_SECONDS = Histogram("credit_score_stage_seconds", "Duration of each stage of a request",
+                          ["stage"], buckets=LATENCY_BUCKETS)
+REQUEST_SECONDS = Histogram("credit_score_request_seconds", "Duration of HTTP requests until the response starts",
+                            ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+REQUESTS_IN_FLIGHT = Gauge("credit_score_requests_in_flight", "HTTP requests being processed", ["method", "route"])
+MONGO_COMMAND_SECONDS = Histogram("credit_score_mongo_command_seconds", "Duration of MongoDB commands",
+                                  ["command", "outcome"], buckets=LATENCY_BUCKETS)
+LLM_CALLS = Counter("credit_score_llm_calls_total", "LLM calls", ["outcome"])
+LLM_TOKENS = Counter("credit_score_llm_tokens_total",
+                     "LLM tokens, estimated at 4 characters per token", ["direction"])
+
+
+def redact(value):
+    """Copy of a logged value without the PII_FIELDS and SSN-like strings."""
+    if isinstance(value, dict):
+        return {k: REDACTED if k in PII_FIELDS else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        return SSN_PATTERN.sub(REDACTED, value)
+    return value
+
+
+class RedactingFilter(logging.Filter):
+    def filter(self, record):
+        if record.args:
+            record.args = tuple(redact(a) for a in record.args) if isinstance(record.args, tuple) \
+                else redact(record.args)
+        record.msg = redact(record.msg)
+        if hasattr(record, "fields"):
+            record.fields = redact(record.fields)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the ``fields`` passed as extra={"fields": {...}}."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry |= getattr(record, "fields", {})
+        if record.exc_info:
+            entry["exc"] = SSN_PATTERN.sub(REDACTED, self.formatException(record.exc_info))
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Only merges the message arguments in the logging thread, formatting is left to the listener."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener = None
+
+
+def setup_logging(level=LOG_LEVEL, sample_rate=LOG_SAMPLE_RATE):
+    """
+    Route the logs through a queue: request handlers only enqueue records
+    (already redacted and sampled), a background thread formats and writes
+    them to stderr as JSON lines.
+
+    Args:
+        level (str): Level of the root logger.
+        sample_rate (float): Share of the DEBUG/INFO records written.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    queue_handler.addFilter(RedactingFilter())
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+
+@contextmanager
+def stage(name, **attributes):
+    """
+    Time a stage of a request: an OpenTelemetry span (when opentelemetry is
+    installed) and an observation of credit_score_stage_seconds.
+
+    Args:
+        name (str): Stage name, e.g. "predict".
+        **attributes: Span attributes.
+    """
+    start = time.perf_counter()
+    if tracer is None:
+        try:
+            yield None
+        finally:
+            STAGE_SECONDS.labels(name).observe(time.perf_counter() - start)
+        return
+    with tracer.start_as_current_span(name, attributes=attributes) as span:
+        try:
+            yield span
+        finally:
+            STAGE_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4) if text else 0
+
+
+def record_llm_call(prompt, response, outcome="success"):
+    LLM_CALLS.labels(outcome).inc()
+    LLM_TOKENS.labels("prompt").inc(estimate_tokens(prompt))
+    if response:
+        LLM_TOKENS.labels("completion").inc(estimate_tokens(response))
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Duration of every MongoDB command, as a metric and (with opentelemetry) a span."""
+
+    def __init__(self):
+        self._started = {}
+
+    def started(self, event):
+        self._started[(event.connection_id, event.request_id)] = time.time_ns()
+
+    def _finished(self, event, outcome):
+        start_ns = self._started.pop((event.connection_id, event.request_id), None)
+        MONGO_COMMAND_SECONDS.labels(event.command_name, outcome).observe(event.duration_micros / 1e6)
+        if tracer is not None and start_ns is not None:
+            span = tracer.start_span(f"mongodb.{event.command_name}", start_time=start_ns,
+                                     attributes={"db.system": "mongodb", "db.name": event.database_name,
+                                                 "db.operation": event.command_name})
+            span.end(end_time=start_ns + event.duration_micros * 1000)
+
+    def succeeded(self, event):
+        self._finished(event, "success")
+
+    def failed(self, event):
+        self._finished(event, "failure")
+
+
+# Applies to every client created after this module is imported
+monitoring.register(MongoCommandListener())
+
+
+class StatsCollector:
+    """Exposes the stats() of application components as ``name{<label>, stat}`` gauges."""
+
+    def __init__(self, name, documentation, label):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.sources = {}
+
+    def add(self, name, stats_fn):
+        self.sources[name] = stats_fn
+
+    def collect(self):
+        family = GaugeMetricFamily(self.name, self.documentation, labels=[self.label, "stat"])
+        for name, stats_fn in self.sources.items():
+            for stat, value in stats_fn().items():
+                if isinstance(value, (int, float)):
+                    family.add_metric([name, stat], float(value))
+        yield family
+
+
+cache_stats_collector = StatsCollector("credit_score_cache", "Counters and ratios of the application caches", "cache")
+runtime_stats_collector = StatsCollector("credit_score_runtime", "Counters of the request coalescing and the LLM gateway",
+                                         "component")
+REGISTRY.register(cache_stats_collector)
+REGISTRY.register(runtime_stats_collector)
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import math
+import os
+from dataclasses import replace
+
+import numpy as np
+
+from change_streams import start_watch
+from scorecard import DEFAULT_CONFIG, FeatureDistribution
+
+try:
+    from datasketches import kll_doubles_sketch
+except ImportError:
+    kll_doubles_sketch = None
+
+logger = logging.getLogger(__name__)
+
+# "population" (default) fits the scorecard distributions on user_data,
+# "fixed" keeps the offline-fitted parameters of scorecard.DEFAULT_CONFIG
+SCORECARD_STATS = os.environ.get("SCORECARD_STATS", "population").lower()
+# Use empirical percentiles from KLL sketches when datasketches is installed
+SCORECARD_SKETCHES = os.environ.get("SCORECARD_SKETCHES", "true").lower() in ("1", "true", "yes")
+KLL_K = int(os.environ.get("KLL_K", 200))
+
+# user_data field -> ScorecardConfig attribute
+SCORECARD_FEATURES = {
+    "Credit_History_Age": "credit_history_age",
+    "Outstanding_Debt": "outstanding_debt",
+    "Num_Credit_Inquiries": "num_credit_inquiries",
+}
+
+
+def _finite(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+class RunningMoments:
+    """Count, mean and sum of squared deviations updated with Welford's algorithm."""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def from_values(cls, values):
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return cls()
+        mean = float(values.mean())
+        return cls(len(values), mean, float(((values - mean) ** 2).sum()))
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def remove(self, x):
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        self.count -= 1
+        delta = x - self.mean
+        self.mean -= delta / self.count
+        self.m2 = max(self.m2 - delta * (x - self.mean), 0.0)
+
+    def merge(self, other):
+        """Combine with the moments of another set of values (Chan et al.)."""
+        count = self.count + other.count
+        if not count:
+            return self
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        return self
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+
+class SketchDistribution:
+    """Empirical distribution of a feature, queried through a KLL sketch."""
+
+    def __init__(self, sketch):
+        self.sketch = sketch
+
+    def percentile(self, values):
+        """Share of the population below each value, between 0 and 1."""
+        values = np.asarray(values, dtype=float)
+        result = np.full(values.shape, np.nan)
+        finite = np.isfinite(values)
+        # One sketch query for all the distinct values
+        split_points, inverse = np.unique(values[finite], return_inverse=True)
+        if len(split_points):
+            ranks = np.asarray(self.sketch.get_cdf(split_points.tolist()))[:-1]
+            result[finite] = ranks[inverse]
+        return result
+
+
+class PopulationStats:
+    """
+    Distribution of the scorecard input features over the user_data
+    collection, computed in one pass at startup and then kept current from
+    the collection change stream, without rescanning it.
+
+    Moments follow inserts, deletes and updates (deletes and updates need
+    the collection pre-images, see changeStreamPreAndPostImages). KLL
+    sketches cannot forget values, so they only follow inserts and new
+    values of updated documents.
+    """
+
+    def __init__(self, fields=SCORECARD_FEATURES, use_sketches=SCORECARD_SKETCHES, k=KLL_K):
+        """
+        Args:
+            fields (dict): user_data field -> ScorecardConfig attribute.
+            use_sketches (bool): Also build KLL sketches, if datasketches is installed.
+            k (int): KLL accuracy parameter.
+        """
+        self.fields = fields
+        self.use_sketches = use_sketches and kll_doubles_sketch is not None
+        self.k = k
+        self.moments = {}
+        self.sketches = {}
+        self.ready = False
+        # Changes the stats could not follow, e.g. deletes without pre-image
+        self.unapplied_changes = 0
+        self._config = DEFAULT_CONFIG
+
+    async def load(self, collection, batch_size=10000):
+        """
+        Compute the stats in one pass over the collection: a $group
+        aggregation for the moments, or a projected scan feeding both the
+        moments and the sketches.
+        """
+        if self.use_sketches:
+            moments = {f: RunningMoments() for f in self.fields}
+            sketches = {f: kll_doubles_sketch(self.k) for f in self.fields}
+            projection = {f: 1 for f in self.fields} | {"_id": 0}
+            batch = []
+            async for doc in collection.find({}, projection, batch_size=batch_size):
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    self._add_batch(batch, moments, sketches)
+                    batch = []
+            self._add_batch(batch, moments, sketches)
+        else:
+            group = {"_id": None}
+            for i, f in enumerate(self.fields):
+                group |= {f"count{i}": {"$sum": {"$cond": [{"$isNumber": f"${f}"}, 1, 0]}},
+                          f"mean{i}": {"$avg": f"${f}"},
+                          f"std{i}": {"$stdDevPop": f"${f}"}}
+            docs = await (await collection.aggregate([{"$group": group}])).to_list(length=None)
+            doc = docs[0] if docs else {}
+            moments = {}
+            for i, f in enumerate(self.fields):
+                count, mean, std = doc.get(f"count{i}", 0), doc.get(f"mean{i}"), doc.get(f"std{i}")
+                moments[f] = RunningMoments(count, mean or 0.0, (std or 0.0) ** 2 * count)
+            sketches = {}
+        self.moments, self.sketches = moments, sketches
+        self.ready = True
+        self._refresh_config()
+        logger.info("Population stats loaded: %s", self.summary())
+        return self
+
+    def load_frame(self, df):
+        """Compute the moments (no sketches) from a DataFrame of user_data records, e.g. for offline runs."""
+        self.moments = {f: RunningMoments.from_values(df[f]) for f in self.fields if f in df.columns}
+        self.sketches = {}
+        self.ready = True
+        self._refresh_config()
+        return self
+
+    def _add_batch(self, docs, moments, sketches):
+        for f in self.fields:
+            values = np.asarray([d[f] for d in docs if _finite(d.get(f))], dtype=float)
+            if len(values):
+                moments[f].merge(RunningMoments.from_values(values))
+                sketches[f].update(values)
+
+    async def on_change(self, change):
+        """Apply a user_data change event."""
+        op = change["operationType"]
+        before = change.get("fullDocumentBeforeChange")
+        changed = self.fields
+        if op == "insert":
+            old, new = {}, change["fullDocument"]
+        elif op == "replace":
+            old, new = before, change["fullDocument"]
+        elif op == "update":
+            updated = change["updateDescription"]["updatedFields"]
+            removed = change["updateDescription"].get("removedFields", [])
+            changed = [f for f in self.fields if f in updated or f in removed]
+            if not changed:
+                return
+            old, new = before, updated
+        elif op == "delete":
+            old, new = before, {}
+        else:
+            return
+        if old is None:
+            self.unapplied_changes += 1
+            return
+        for f in changed:
+            if _finite(old.get(f)):
+                self.moments[f].remove(float(old[f]))
+            if _finite(new.get(f)):
+                self.moments[f].add(float(new[f]))
+                if f in self.sketches:
+                    self.sketches[f].update(float(new[f]))
+        self._refresh_config()
+
+    def _refresh_config(self):
+        distributions = {}
+        for f, attr in self.fields.items():
+            if f in self.sketches and not self.sketches[f].is_empty():
+                distributions[attr] = SketchDistribution(self.sketches[f])
+            elif f in self.moments and self.moments[f].count > 1 and self.moments[f].std > 0:
+                distributions[attr] = FeatureDistribution(self.moments[f].mean, self.moments[f].std)
+        self._config = replace(DEFAULT_CONFIG, **distributions)
+
+    def scorecard_config(self):
+        """
+        Returns:
+            ScorecardConfig: DEFAULT_CONFIG with the distributions of the
+            current population, or DEFAULT_CONFIG until the stats are loaded.
+        """
+        return self._config
+
+    def summary(self):
+        return {
+            f: {
+                "count": m.count,
+                "mean": m.mean,
+                "std": m.std,
+                "sketch": f in self.sketches,
+            }
+            for f, m in self.moments.items()
+        } | {"unappliedChanges": self.unapplied_changes}
+
+    def start(self, collection):
+        """
+        Load the stats and follow the collection change stream, in the background.
+        Changes made while the initial pass runs are not applied.
+
+        Returns:
+            asyncio.Task: The task, to be cancelled on shutdown.
+        """
+        async def run():
+            try:
+                await self.load(collection)
+            except Exception as e:
+                logger.warning("Error loading population stats, using the fixed scorecard parameters: %s", e)
+                return
+            pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+            watch_task = start_watch(collection, self.on_change, pipeline,
+                                     full_document_before_change="whenAvailable")
+            try:
+                await watch_task
+            finally:
+                watch_task.cancel()
+
+        return asyncio.create_task(run(), name="population-stats")
+
+
+population_stats = PopulationStats()
+
+
+def scorecard_config():
+    """Scorecard parameters to use, according to SCORECARD_STATS."""
+    if SCORECARD_STATS == "fixed":
+        return DEFAULT_CONFIG
+    return population_stats.scorecard_config()
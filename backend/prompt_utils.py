@@ -6,6 +6,9 @@ from pydantic import BaseModel, Field, model_validator
 import os
 from dotenv import load_dotenv
 
+# Bump whenever get_credit_score_expl_prompt changes, cached explanations are keyed on it
+PROMPT_TEMPLATE_VERSION = "2"
+
 get_credit_score_expl_prompt = PromptTemplate.from_template(
     """    
     ##Instruction: 
@@ -48,7 +51,7 @@ get_credit_score_expl_prompt = PromptTemplate.from_template(
     Payment_Behaviour: Represents the payment behavior of the customer
     Monthly_Balance: Represents the monthly balance amount of the customer (in USD)
 
-    ##Feature importace of the model used:
+    ##Contribution of each feature to the predicted Credit Health of this profile (positive values push towards it, negative values away from it):
     {feature_importance}
 
     ##Values for given profile to be use to predict the Result(Credit Score Profile) with a reason:
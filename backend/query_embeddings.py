@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+
+QUERY_EMBEDDINGS_PATH = os.environ.get("QUERY_EMBEDDINGS_PATH", "./model/query_embeddings.json")
+
+
+class QueryEmbeddingStore:
+    """
+    Embeddings of the fixed per-tier search terms, computed once and
+    persisted next to the model artifacts so that card suggestions need no
+    embedding call in steady state. An entry is only reused while both the
+    query text and the embedding model are unchanged.
+    """
+
+    def __init__(self, path=QUERY_EMBEDDINGS_PATH, model_name="voyage-3-large"):
+        """
+        Args:
+            path (str): JSON file holding the embeddings.
+            model_name (str): Embedding model the vectors come from.
+        """
+        self.path = path
+        self.model_name = model_name
+        self._queries = {}
+        self._ranked = {}
+        self._lock = asyncio.Lock()
+
+    def load(self):
+        """Read the persisted embeddings, ignoring those of another embedding model."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return self
+        if data.get("model") == self.model_name:
+            self._queries = {tier: {"text": q["text"], "embedding": np.asarray(q["embedding"], dtype=np.float32)}
+                             for tier, q in data.get("queries", {}).items()}
+        return self
+
+    def save(self):
+        data = {
+            "model": self.model_name,
+            "queries": {tier: {"text": q["text"], "embedding": q["embedding"].tolist()}
+                        for tier, q in self._queries.items()}
+        }
+        # Write then rename so that concurrent workers never read a partial file
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def cached(self, tier, text):
+        query = self._queries.get(tier)
+        if query is not None and query["text"] == text:
+            return query["embedding"]
+        return None
+
+    async def get(self, tier, text, embedding_model):
+        """
+        Embedding of the search term of a tier, embedded and persisted on first use.
+
+        Args:
+            tier (str): Credit health tier ('Good', 'Poor' or 'Standard').
+            text (str): Search term of the tier.
+            embedding_model: Embeddings with an async aembed_query.
+        """
+        vector = self.cached(tier, text)
+        if vector is not None:
+            return vector
+        async with self._lock:
+            vector = self.cached(tier, text)
+            if vector is None:
+                vector = np.asarray(await embedding_model.aembed_query(text), dtype=np.float32)
+                self._queries[tier] = {"text": text, "embedding": vector}
+                self.save()
+        return vector
+
+    async def build(self, terms, embedding_model):
+        """
+        Embed every term that is not stored yet.
+
+        Args:
+            terms (dict): Tier -> search term.
+            embedding_model: Embeddings with an async aembed_query.
+        """
+        for tier, text in terms.items():
+            await self.get(tier, text, embedding_model)
+
+    async def ranked_cards(self, tier, text, embedding_model, index):
+        """
+        Every card of a LocalVectorIndex ranked for the tier, best first.
+        Computed once per version of the index, the search term embedding is
+        only looked up then.
+
+        Args:
+            tier (str): Credit health tier ('Good', 'Poor' or 'Standard').
+            text (str): Search term of the tier.
+            embedding_model: Embeddings with an async aembed_query, see get.
+            index (LocalVectorIndex): Index of the card catalog.
+        """
+        ranked = self._ranked.get(tier)
+        if ranked is None or ranked[0] != index.version:
+            vector = await self.get(tier, text, embedding_model)
+            ranked = (index.version, index.search(vector, len(index.docs)))
+            self._ranked[tier] = ranked
+        return ranked[1]
+
+
+if __name__ == "__main__":
+    # Build step: python query_embeddings.py
+    from llm_utils import search_term_suggestions, get_embedding_model, query_store
+    asyncio.run(query_store.build(search_term_suggestions, get_embedding_model()))
+    print(f"Stored {len(search_term_suggestions)} query embeddings in {query_store.path}")
@@ -0,0 +1,265 @@
+"""
+Re-score the whole user_data population offline, e.g. after a model refresh.
+
+Streams user_data (or a Parquet file) in batches, scores the batches in a
+process pool with the model artifacts loaded once per worker, and writes
+the results to the credit_scores collection (or a Parquet file). Progress
+is checkpointed after every written batch so that an interrupted run can
+be resumed with --resume.
+
+    score-all --workers 8
+    score-all --input users.parquet --output scores.parquet
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from bson import json_util
+from dotenv import load_dotenv
+from pymongo import AsyncMongoClient, MongoClient, ReplaceOne
+
+from feature_store import PROFILE_PROJECTION
+from population_stats import PopulationStats, SCORECARD_STATS, SCORECARD_FEATURES
+from scorecard import DEFAULT_CONFIG
+
+DEFAULT_CHECKPOINT_PATH = "./score_all.checkpoint.json"
+
+# Scorecard parameters of the worker process, set by _init_worker
+_worker_config = None
+
+
+def _init_worker(config):
+    global _worker_config
+    from model_registry import registry
+    registry.ensure_loaded()
+    _worker_config = config
+
+
+def _score_chunk(records):
+    from scoring import score_records
+    return score_records(records, _worker_config)
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json_util.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(json_util.dumps(checkpoint))
+    os.replace(tmp_path, path)
+
+
+def mongo_chunks(collection, batch_size, last_id=None):
+    """
+    Stream user_data in _id order.
+
+    Yields:
+        tuple: (records, last_id) of each batch.
+    """
+    query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+    cursor = collection.find(query, PROFILE_PROJECTION).sort("_id", 1).batch_size(batch_size)
+    chunk = []
+    for record in cursor:
+        chunk.append(record)
+        if len(chunk) >= batch_size:
+            yield chunk, chunk[-1]["_id"]
+            chunk = []
+    if chunk:
+        yield chunk, chunk[-1]["_id"]
+
+
+def mongo_seen(collection, last_id):
+    """
+    Customer_IDs of the records up to last_id, already scored by the interrupted run.
+    Streamed with a cursor: distinct returns one document, capped at 16 MB.
+    """
+    cursor = collection.find({"_id": {"$lte": last_id}}, {"_id": 0, "Customer_ID": 1}).batch_size(10000)
+    return {record["Customer_ID"] for record in cursor if record.get("Customer_ID") is not None}
+
+
+def parquet_seen(path, rows):
+    import pyarrow.parquet as pq
+    return set(pq.read_table(path, columns=["Customer_ID"]).column("Customer_ID").to_pylist()[:rows])
+
+
+def parquet_chunks(path, batch_size, skip_rows=0):
+    """
+    Stream a Parquet file of user_data records.
+
+    Yields:
+        tuple: (records, rows read so far) of each batch.
+    """
+    import pyarrow.parquet as pq
+    rows = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        rows += batch.num_rows
+        if rows <= skip_rows:
+            continue
+        records = batch.to_pylist()
+        if rows - batch.num_rows < skip_rows:
+            records = records[skip_rows - (rows - batch.num_rows):]
+        for record in records:
+            for name in ("ID", "SSN", "Credit_Score"):
+                record.pop(name, None)
+        yield records, rows
+
+
+class ParquetScoreWriter:
+    """Flat Parquet output: one row per customer, one column per scorecard factor."""
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.append = append
+        self.writer = None
+
+    def write(self, docs):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if not docs:
+            return
+        table = pa.Table.from_pylist([
+            {
+                "Customer_ID": doc["_id"],
+                "userCreditProfile": doc["userCreditProfile"],
+                "allowedCreditLimit": doc["allowedCreditLimit"],
+                "scoreCardCreditScore": doc["scoreCardCreditScore"],
+                **doc["scorecardScoreFeatures"],
+                "modelVersion": doc["modelVersion"],
+                "scoredAt": doc["scoredAt"],
+            }
+            for doc in docs
+        ])
+        if self.writer is None:
+            path = self.path
+            if self.append and os.path.exists(self.path):
+                # Parquet files cannot be appended to, resumed runs write a new part
+                path = f"{os.path.splitext(self.path)[0]}.{int(time.time())}.parquet"
+            self.writer = pq.ParquetWriter(path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class MongoScoreWriter:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def write(self, docs):
+        if docs:
+            self.collection.bulk_write(
+                [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False)
+
+    def close(self):
+        pass
+
+
+def scorecard_config_for(args, db):
+    """Scorecard parameters of the run: population moments of the input, or the fixed ones."""
+    if args.scorecard_stats == "fixed":
+        return DEFAULT_CONFIG
+    stats = PopulationStats(use_sketches=False)
+    if args.input:
+        import pandas as pd
+        stats.load_frame(pd.read_parquet(args.input, columns=list(SCORECARD_FEATURES)))
+    else:
+        async def load():
+            client = AsyncMongoClient(os.environ.get("MONGO_CONNECTION_STRING"))
+            try:
+                await stats.load(client[db.name]["user_data"])
+            finally:
+                await client.close()
+        asyncio.run(load())
+    return stats.scorecard_config()
+
+
+def run(args):
+    load_dotenv()
+    db = None
+    if not (args.input and args.output):
+        db = MongoClient(os.environ.get("MONGO_CONNECTION_STRING"))[os.environ.get("MONGODB_DB")]
+
+    checkpoint = load_checkpoint(args.checkpoint) if args.resume else None
+    source = args.input or "user_data"
+    if checkpoint is not None and checkpoint.get("source") != source:
+        sys.exit(f"Checkpoint {args.checkpoint} is for {checkpoint.get('source')}, not {source}")
+    position = checkpoint["position"] if checkpoint else None
+    seen = set()
+    if position is not None:
+        seen = parquet_seen(args.input, position) if args.input else mongo_seen(db["user_data"], position)
+        print(f"Resuming after {position} ({len(seen)} customers already scored)")
+
+    chunks = parquet_chunks(args.input, args.batch_size, position or 0) if args.input \
+        else mongo_chunks(db["user_data"], args.batch_size, position)
+    writer = ParquetScoreWriter(args.output, append=checkpoint is not None) if args.output \
+        else MongoScoreWriter(db["credit_scores"])
+
+    config = scorecard_config_for(args, db)
+    start = time.perf_counter()
+    rows = scored = 0
+    # Chunks are written in submission order so that the checkpoint never skips a chunk
+    in_flight = deque()
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=mp_context,
+                             initializer=_init_worker, initargs=(config,)) as pool:
+
+        def drain(max_in_flight):
+            nonlocal rows, scored
+            while len(in_flight) > max_in_flight:
+                future, chunk_rows, chunk_position = in_flight.popleft()
+                docs = future.result()
+                writer.write(docs)
+                rows += chunk_rows
+                scored += len(docs)
+                save_checkpoint(args.checkpoint, {"source": source, "position": chunk_position})
+                elapsed = time.perf_counter() - start
+                print(f"{rows} rows, {scored} scored, {rows / elapsed:,.0f} rows/s")
+
+        for records, chunk_position in chunks:
+            # Keep the first record per customer, same as the API
+            first = []
+            for record in records:
+                customer_id = record.get("Customer_ID")
+                if customer_id is not None and customer_id not in seen:
+                    seen.add(customer_id)
+                    first.append(record)
+            in_flight.append((pool.submit(_score_chunk, first), len(records), chunk_position))
+            drain(args.workers * 2)
+        drain(0)
+    writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {rows} rows, {scored} customers scored in {elapsed:.1f}s "
+          f"({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score the whole user_data population.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Scoring processes (default: number of CPUs)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Records per batch")
+    parser.add_argument("--input", help="Parquet file of user_data records, instead of MongoDB")
+    parser.add_argument("--output", help="Parquet file to write, instead of the credit_scores collection")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH, help="Checkpoint file")
+    parser.add_argument("--resume", action="store_true", help="Continue after the checkpoint")
+    parser.add_argument("--scorecard-stats", choices=["population", "fixed"], default=SCORECARD_STATS,
+                        help="Scorecard parameters, see SCORECARD_STATS")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import DeleteMany, DeleteOne, ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+from change_streams import start_watch
+
+logger = logging.getLogger(__name__)
+
+# Precompute scores into the credit_scores collection from the user_data change stream
+MATERIALIZE_SCORES = os.environ.get("MATERIALIZE_SCORES", "false").lower() in ("1", "true", "yes")
+# Changed customers are re-scored together once this many are pending, or after the interval
+MATERIALIZE_BATCH_SIZE = int(os.environ.get("MATERIALIZE_BATCH_SIZE", 500))
+MATERIALIZE_INTERVAL_SECONDS = float(os.environ.get("MATERIALIZE_INTERVAL_SECONDS", 0.5))
+# One process of the deployment materializes: the holder of a lease renewed every third of this
+# lifetime. Another process takes over, after the last flushed change, once it lapses
+MATERIALIZE_LEASE_SECONDS = float(os.environ.get("MATERIALIZE_LEASE_SECONDS", 30))
+
+
+class LeaderLease:
+    """
+    Lease stored in a MongoDB document, held by one process at a time: the
+    one that took or renewed it last, until it expires.
+    """
+
+    def __init__(self, collection, name, ttl_seconds=MATERIALIZE_LEASE_SECONDS):
+        """
+        Args:
+            collection: Async pymongo collection of the leases.
+            name (str): Name of the lease, the _id of its document.
+            ttl_seconds (float): Lifetime of the lease without renewal.
+        """
+        self.collection = collection
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def acquire(self, fields=None):
+        """
+        Take the lease if it is free or expired, or renew it if this process holds it.
+
+        Args:
+            fields (dict): Extra fields stored with the lease, e.g. a resume token.
+
+        Returns:
+            dict: The lease document as it was before, None if it did not
+            exist, or False if another process holds it.
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            return await self.collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expiresAt": {"$lte": now}}]},
+                {"$set": {"owner": self.owner, "expiresAt": now + timedelta(seconds=self.ttl_seconds),
+                          **(fields or {})}},
+                upsert=True)
+        except DuplicateKeyError:
+            # The document exists and another process holds it
+            return False
+
+    async def release(self, fields=None):
+        """Let another process take the lease now, keeping its extra fields (see acquire)."""
+        await self.collection.update_one({"_id": self.name, "owner": self.owner},
+                                         {"$set": {"expiresAt": datetime.now(timezone.utc), **(fields or {})}})
+
+
+class ScoreStore:
+    """Precomputed scores of the credit_scores collection, keyed by Customer_ID."""
+
+    def __init__(self, collection):
+        """
+        Args:
+            collection: Async pymongo credit_scores collection.
+        """
+        self.collection = collection
+        self.hits = 0
+        self.misses = 0
+
+    async def ensure_indexes(self):
+        # Deletes in user_data only carry the _id of the deleted document
+        await self.collection.create_index("sourceId")
+
+    async def get(self, user_id, model_version):
+        """
+        Returns:
+            dict: The precomputed score of the current model version, or None.
+        """
+        doc = await self.collection.find_one({"_id": int(user_id), "modelVersion": model_version})
+        if doc is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return doc
+
+    async def put(self, doc):
+        await self.collection.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+
+    async def delete(self, user_id):
+        await self.collection.delete_one({"_id": int(user_id)})
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class ScoreMaterializer:
+    """
+    Keeps credit_scores current: follows the user_data change stream and
+    re-scores only the changed customers, in micro-batches.
+
+    With a LeaderLease, only the process holding it does so. The resume
+    token of the last flushed change is kept with the lease, so that the
+    next holder starts after it and no change is missed on a takeover.
+    """
+
+    def __init__(self, source, store, score_fn, executor=None,
+                 batch_size=MATERIALIZE_BATCH_SIZE, interval=MATERIALIZE_INTERVAL_SECONDS):
+        """
+        Args:
+            source: Async pymongo user_data collection.
+            store (ScoreStore): Where the scores are written.
+            score_fn (callable): Blocking function taking a list of Customer_IDs and
+                returning (docs, not_found), like scoring.materialize_scores.
+            executor: Executor running score_fn, the default one if None.
+            batch_size (int): Customer_IDs scored together at most.
+            interval (float): Seconds to wait for more changes before scoring.
+        """
+        self.source = source
+        self.store = store
+        self.score_fn = score_fn
+        self.executor = executor
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pending = set()
+        self.deleted_sources = set()
+        # _id of the last change received, and of the last one whose customers are written
+        self.resume_token = None
+        self.flushed_token = None
+        self._wakeup = asyncio.Event()
+        self.scored = 0
+        self.batches = 0
+        self.errors = 0
+        self.leading = False
+
+    async def on_change(self, change):
+        self.resume_token = change["_id"]
+        if change["operationType"] == "delete":
+            self.deleted_sources.add(change["documentKey"]["_id"])
+        else:
+            doc = change.get("fullDocument")
+            if doc is None or doc.get("Customer_ID") is None:
+                return
+            self.pending.add(int(doc["Customer_ID"]))
+        self._wakeup.set()
+
+    async def flush(self):
+        """
+        Score the pending customers and write the results. A failed batch is
+        pending again, and the resume token only moves past written changes.
+        """
+        # Every change up to resume_token is flushed once this batch is written
+        resume_token = self.resume_token
+        complete = len(self.pending) <= self.batch_size
+        user_ids = list(self.pending)[:self.batch_size]
+        self.pending.difference_update(user_ids)
+        deleted_sources, self.deleted_sources = list(self.deleted_sources), set()
+
+        try:
+            requests = []
+            if deleted_sources:
+                requests.append(DeleteMany({"sourceId": {"$in": deleted_sources}}))
+            docs = []
+            if user_ids:
+                loop = asyncio.get_running_loop()
+                docs, not_found = await loop.run_in_executor(self.executor, self.score_fn, user_ids)
+                requests += [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs]
+                requests += [DeleteOne({"_id": user_id}) for user_id in not_found]
+            if requests:
+                await self.store.collection.bulk_write(requests, ordered=False)
+                self.batches += 1
+        except BaseException:
+            # Scored again by the next flush, and flushed_token stays before them
+            self.pending.update(user_ids)
+            self.deleted_sources.update(deleted_sources)
+            raise
+        self.scored += len(docs)
+        if complete:
+            self.flushed_token = resume_token
+
+    async def run(self):
+        """Flush the changes forever, at most once per interval."""
+        while True:
+            await self._wakeup.wait()
+            if len(self.pending) < self.batch_size:
+                await asyncio.sleep(self.interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += 1
+                logger.exception("Error materializing scores")
+            if self.pending:
+                self._wakeup.set()
+
+    def _start_tasks(self, resume_after=None):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        return [
+            start_watch(self.source, self.on_change, pipeline, resume_after, full_document="updateLookup"),
+            asyncio.create_task(self.run(), name="score-materializer"),
+        ]
+
+    def _lease_fields(self):
+        return {"resumeToken": self.flushed_token} if self.flushed_token else None
+
+    async def lead(self, lease):
+        """Materialize while this process holds the lease, and try to take it otherwise, forever."""
+        tasks = []
+        try:
+            while True:
+                try:
+                    previous = await lease.acquire(self._lease_fields() if tasks else None)
+                except Exception:
+                    logger.warning("Error renewing the score materializer lease", exc_info=True)
+                    # Not renewed: another process may take over
+                    previous = False
+                if previous is not False and not tasks:
+                    resume_after = (previous or {}).get("resumeToken")
+                    logger.info("Materializing scores from this process")
+                    self.pending.clear()
+                    self.deleted_sources.clear()
+                    self.flushed_token = resume_after
+                    tasks = self._start_tasks(resume_after)
+                    self.leading = True
+                elif previous is False and tasks:
+                    logger.warning("Lost the score materializer lease")
+                    for task in tasks:
+                        task.cancel()
+                    tasks = []
+                    self.leading = False
+                await asyncio.sleep(lease.ttl_seconds / 3)
+        finally:
+            self.leading = False
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                try:
+                    await lease.release(self._lease_fields())
+                except Exception:
+                    logger.warning("Error releasing the score materializer lease", exc_info=True)
+
+    def start(self, lease=None):
+        """
+        Start following user_data and flushing, in the background.
+
+        Args:
+            lease (LeaderLease): Only materialize while this process holds it,
+                None to always materialize from this process.
+
+        Returns:
+            list[asyncio.Task]: The tasks, to be cancelled on shutdown.
+        """
+        if lease is None:
+            self.leading = True
+            return self._start_tasks()
+        return [asyncio.create_task(self.lead(lease), name="score-materializer-lease")]
+
+    def stats(self):
+        return {
+            "scored": self.scored,
+            "batches": self.batches,
+            "errors": self.errors,
+            "pending": len(self.pending),
+            "leader": self.leading,
+        }
@@ -0,0 +1,122 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+from scipy.special import ndtr
+
+# user_data fields read by the scorecard
+INPUT_FIELDS = ("Credit_History_Age", "Num_of_Delayed_Payment", "Credit_Utilization_Ratio",
+                "Outstanding_Debt", "Num_Credit_Inquiries")
+
+# Order in which the factors are weighted and summed, kept for reproducible scores
+FACTORS = ("Repayment History", "Credit Utilization", "Credit History", "Num Credit Inquiries", "Outstanding")
+
+
+@dataclass(frozen=True)
+class FeatureDistribution:
+    """Normal approximation of a feature in the reference population."""
+    mean: float
+    std: float
+
+    def percentile(self, values):
+        """Share of the population below each value, between 0 and 1."""
+        return ndtr((np.asarray(values, dtype=float) - self.mean) / self.std)
+
+
+@dataclass(frozen=True)
+class ScorecardConfig:
+    """
+    Parameters of the scorecard credit score: population statistics of the
+    input features, factor weights and the output score scale.
+    """
+    credit_history_age: FeatureDistribution = FeatureDistribution(221.220, 99.681)
+    outstanding_debt: FeatureDistribution = FeatureDistribution(1426.220, 1155.129)
+    num_credit_inquiries: FeatureDistribution = FeatureDistribution(5.798, 3.868)
+    weights: dict = field(default_factory=lambda: {
+        "Repayment History": 0.05,
+        "Credit Utilization": 0.5,
+        "Credit History": 0.025,
+        "Num Credit Inquiries": 0.4,
+        "Outstanding": 0.025,
+    })
+    # Utilization ratios above the cap score 0
+    utilization_cap: float = 0.4
+    # Inquiry counts above this population percentile score 0
+    inquiries_percentile_cutoff: float = 0.8
+    score_min: int = 300
+    score_range: int = 550
+
+
+DEFAULT_CONFIG = ScorecardConfig()
+
+
+def scorecard_factors(profiles, config=DEFAULT_CONFIG):
+    """
+    Scorecard factors of many profiles at once, each between 0 and 1.
+
+    Args:
+        profiles: pandas.DataFrame or dict of arrays (or scalars) with the columns
+            Credit_History_Age, Num_of_Delayed_Payment, Credit_Utilization_Ratio,
+            Outstanding_Debt and Num_Credit_Inquiries.
+        config (ScorecardConfig): Scorecard parameters.
+
+    Returns:
+        dict: Factor name -> float array.
+    """
+    history_age = np.asarray(profiles["Credit_History_Age"], dtype=float)
+    delayed_payments = np.asarray(profiles["Num_of_Delayed_Payment"], dtype=float)
+    utilization = np.asarray(profiles["Credit_Utilization_Ratio"], dtype=float) / 100
+    inquiries_pct = config.num_credit_inquiries.percentile(profiles["Num_Credit_Inquiries"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        repayment_history = (history_age - delayed_payments) / history_age
+    return {
+        "Repayment History": repayment_history,
+        "Credit Utilization": 1 - np.where(utilization > config.utilization_cap, 1, utilization),
+        "Credit History": config.credit_history_age.percentile(history_age),
+        "Outstanding": 1 - config.outstanding_debt.percentile(profiles["Outstanding_Debt"]),
+        "Num Credit Inquiries": np.where(inquiries_pct > config.inquiries_percentile_cutoff, 0, 1 - inquiries_pct),
+    }
+
+
+def credit_scores(factors, config=DEFAULT_CONFIG):
+    """
+    Weighted sum of the factors scaled to the score range.
+
+    Args:
+        factors (dict): Factor name -> float array, as returned by scorecard_factors.
+        config (ScorecardConfig): Scorecard parameters.
+
+    Returns:
+        numpy.ndarray: Float scores truncated to integers, NaN where a factor
+        is not finite (e.g. a zero credit history age). Test np.isfinite, not
+        the sign: extreme profiles can score below 0.
+    """
+    overall = sum(np.asarray(factors[name], dtype=float) * config.weights[name] for name in FACTORS)
+    scaled = overall * config.score_range + config.score_min
+    return np.where(np.isfinite(scaled), np.trunc(scaled), np.nan)
+
+
+def score_profiles(profiles, config=DEFAULT_CONFIG):
+    """
+    Returns:
+        tuple: (factors, scores) for many profiles, see scorecard_factors and credit_scores.
+    """
+    factors = scorecard_factors(profiles, config)
+    return factors, credit_scores(factors, config)
+
+
+def score_profile(profile, config=DEFAULT_CONFIG):
+    """
+    Scorecard of a single profile.
+
+    Args:
+        profile (dict): User record with the scorecard input columns.
+        config (ScorecardConfig): Scorecard parameters.
+
+    Returns:
+        tuple: (factors, score) with ``factors`` mapping each factor to a float.
+    """
+    factors, scores = score_profiles(profile, config)
+    factors = {name: float(value) for name, value in factors.items()}
+    if not np.isfinite(scores):
+        raise ValueError(f"Invalid scorecard factors: {factors}")
+    return factors, int(scores)
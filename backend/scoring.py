@@ -0,0 +1,172 @@
+from datetime import datetime, timezone
+
+import numpy as np
+
+from feature_store import PROFILE_PROJECTION, scoring_projection
+from model_registry import registry
+from population_stats import scorecard_config
+from scorecard import score_profiles, INPUT_FIELDS as SCORECARD_INPUT_FIELDS
+
+# Fields of a user_data document that are not part of the user profile sent to the LLM
+NON_PROFILE_FIELDS = ("_id", "ID", "Customer_ID", "SSN", "Credit_Score")
+
+
+def calculate_allowed_credit_limit(monthly_income, v):
+    """
+    Credit limit granted for the given monthly income and class probabilities.
+    Works on scalars (one user) as well as on arrays (many users).
+    """
+    v = np.asarray(v)
+    return np.ceil(np.asarray(monthly_income) * 6 *
+                   (1 * v[..., 0] + 0.5 * v[..., 1] + 0.25 * v[..., 2])).astype(int)
+
+
+def profile_input(record):
+    """User profile of a user_data document, as used by the explanation prompt."""
+    return {k: v for k, v in record.items() if k not in NON_PROFILE_FIELDS}
+
+
+def fetch_first_records(collection, user_ids, projection):
+    """
+    First user_data document of each customer, in one query.
+
+    Args:
+        collection: Sync pymongo user_data collection.
+        user_ids (list[int]): Customer_IDs, without duplicates.
+        projection (dict): Projection of the documents.
+
+    Returns:
+        tuple: (records, not_found) with one document per found customer and
+        the Customer_IDs missing from the collection.
+    """
+    records = {}
+    for record in collection.find({"Customer_ID": {"$in": user_ids}}, projection):
+        # Keep the first record per customer, same as the single user path
+        records.setdefault(int(record["Customer_ID"]), record)
+    not_found = [u for u in user_ids if u not in records]
+    return list(records.values()), not_found
+
+
+def score_frame(users_df, config=None):
+    """
+    Score many users at once: one pass through the ML pipeline and the scorecard.
+
+    Args:
+        users_df (pandas.DataFrame): One user_data record per row.
+        config (ScorecardConfig): Scorecard parameters, population_stats.scorecard_config() if None.
+
+    Returns:
+        tuple: (preds, limits, factors, scores, versions) with the predicted
+        credit health, allowed credit limit, scorecard factors (dict of
+        arrays), scorecard score and model version of every row. Each row is
+        scored by the model serving its customer, see ModelRegistry.model_for.
+    """
+    preds, probas, versions = registry.predict_batch_routed(users_df)
+    limits = calculate_allowed_credit_limit(
+        users_df["Monthly_Inhand_Salary"].to_numpy(dtype=float), probas)
+    factors, scores = score_profiles(users_df, config or scorecard_config())
+    return preds, limits, factors, scores, versions
+
+
+def score_users(collection, user_ids):
+    """
+    Score many users at once: one MongoDB query, one pass through the ML
+    pipeline and the scorecard for the whole batch.
+
+    Args:
+        collection: Sync pymongo user_data collection.
+        user_ids (list[int]): Customer_IDs to score.
+
+    Returns:
+        tuple: (results, not_found) where ``results`` is a list of dicts with
+        the prediction, credit limit and scorecard score (None when it cannot
+        be computed) per user and
+        ``not_found`` lists the requested Customer_IDs missing from the database.
+    """
+    import pandas as pd
+
+    user_ids = list(dict.fromkeys(int(u) for u in user_ids))
+    projection = scoring_projection(registry.ensure_loaded().input_fields() +
+                                    ["Monthly_Inhand_Salary", *SCORECARD_INPUT_FIELDS])
+    user_records, not_found = fetch_first_records(collection, user_ids, projection)
+    if not user_records:
+        return [], not_found
+
+    users_df = pd.DataFrame.from_records(user_records)
+    preds, limits, _, scorecard_scores, versions = score_frame(users_df)
+    results = [
+        {
+            "userId": int(customer_id),
+            "userCreditProfile": str(pred),
+            "allowedCreditLimit": int(limit),
+            "scoreCardCreditScore": int(score) if np.isfinite(score) else None,
+            "modelVersion": version
+        }
+        for customer_id, pred, limit, score, version in zip(
+            users_df["Customer_ID"], preds, limits, scorecard_scores, versions)
+    ]
+    return results, not_found
+
+
+def score_document(user_id, pred, allowed_credit_limit, user_profile_ip, scorecard_features,
+                   scorecard_credit_score, source_id=None, model_version=None):
+    """
+    Document of the credit_scores collection holding the precomputed score of a user,
+    by ``model_version`` (the active model version by default).
+
+    Returns:
+        dict: The document, keyed by Customer_ID and stamped with the model version.
+    """
+    return {
+        "_id": int(user_id),
+        "sourceId": source_id,
+        "userCreditProfile": str(pred),
+        "allowedCreditLimit": int(allowed_credit_limit),
+        "userProfileInput": user_profile_ip,
+        "scoreCardCreditScore": int(scorecard_credit_score),
+        "scorecardScoreFeatures": scorecard_features,
+        "modelVersion": model_version or registry.version,
+        "scoredAt": datetime.now(timezone.utc),
+    }
+
+
+def score_records(user_records, config=None):
+    """
+    Score user_data documents for the credit_scores collection.
+
+    Args:
+        user_records (list[dict]): One document (with its _id) per customer.
+        config (ScorecardConfig): Scorecard parameters, population_stats.scorecard_config() if None.
+
+    Returns:
+        list[dict]: One score_document per record. Records whose scorecard
+        cannot be computed get no document, so that they are scored on demand.
+    """
+    import pandas as pd
+
+    if not user_records:
+        return []
+    preds, limits, factors, scores, versions = score_frame(pd.DataFrame.from_records(user_records), config)
+    return [
+        score_document(record["Customer_ID"], preds[i], limits[i], profile_input(record),
+                       {name: float(values[i]) for name, values in factors.items()},
+                       scores[i], record.get("_id"), versions[i])
+        for i, record in enumerate(user_records)
+        if np.isfinite(scores[i])
+    ]
+
+
+def materialize_scores(collection, user_ids):
+    """
+    Score users for the credit_scores collection.
+
+    Args:
+        collection: Sync pymongo user_data collection.
+        user_ids (list[int]): Customer_IDs to score, without duplicates.
+
+    Returns:
+        tuple: (docs, not_found) with the score_records of the found customers
+        and the Customer_IDs missing from user_data.
+    """
+    user_records, not_found = fetch_first_records(collection, user_ids, PROFILE_PROJECTION)
+    return score_records(user_records), not_found
@@ -0,0 +1,150 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from collections import OrderedDict
+
+# Key signing the scoring context IDs. Random per process by default, set the same value on
+# every worker so that a context issued by one is trusted by the others
+SCORING_CONTEXT_SECRET = os.environ.get("SCORING_CONTEXT_SECRET") or secrets.token_hex(32)
+SCORING_CONTEXT_TTL_SECONDS = int(os.environ.get("SCORING_CONTEXT_TTL_SECONDS", 1800))
+SCORING_CONTEXT_MAX_ENTRIES = int(os.environ.get("SCORING_CONTEXT_MAX_ENTRIES", 10000))
+
+# Profile fields used by the card suggestions
+SUGGESTION_PROFILE_FIELDS = [
+    "Occupation", "Annual_Income", "Monthly_Inhand_Salary",
+    "Type_of_Loan", "Credit_Mix", "Payment_of_Min_Amount",
+    "Total_EMI_per_month", "Amount_invested_monthly", "Payment_Behaviour"
+]
+
+
+def suggestion_profile(user_profile_ip):
+    """The fields of a profile used by the card suggestions."""
+    return {k: user_profile_ip[k] for k in SUGGESTION_PROFILE_FIELDS if k in user_profile_ip}
+
+
+class ScoringSessions:
+    """
+    Scoring results kept for the requests following a score, e.g.
+    /product_suggestions, so that they neither query MongoDB nor run the model
+    again, nor trust a prediction echoed back by the client.
+
+    Contexts are stored in a bounded in-memory LRU under an ID of the form
+    ``<user_id>.<expiry>.<nonce>.<signature>``. The HMAC signature makes the
+    user and expiry of an ID trustworthy even when its context is no longer
+    (or was never) held by this worker.
+    """
+
+    def __init__(self, secret=SCORING_CONTEXT_SECRET, ttl_seconds=SCORING_CONTEXT_TTL_SECONDS,
+                 max_entries=SCORING_CONTEXT_MAX_ENTRIES):
+        """
+        Args:
+            secret (str): HMAC key of the context IDs.
+            ttl_seconds (int): Lifetime of a context.
+            max_entries (int): Contexts kept at most, the least recently used are evicted.
+        """
+        self._key = secret.encode()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._contexts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def _sign(self, payload):
+        digest = hmac.new(self._key, payload.encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:18]).decode()
+
+    def create(self, user_id, pred, allowed_credit_limit, user_profile_ip, model_version=None):
+        """
+        Store the scoring result of a user.
+
+        Args:
+            user_id (int): Customer_ID of the user.
+            pred (str): Predicted credit health.
+            allowed_credit_limit (int): Allowed credit limit.
+            user_profile_ip (dict): Profile of the user, only the suggestion fields are kept.
+            model_version (str): Version of the model that scored the user.
+
+        Returns:
+            str: The signed context ID.
+        """
+        expires = int(time.time()) + self.ttl_seconds
+        payload = f"{int(user_id)}.{expires}.{secrets.token_urlsafe(9)}"
+        context_id = f"{payload}.{self._sign(payload)}"
+        self._contexts[context_id] = {
+            "userId": int(user_id),
+            "userCreditProfile": pred,
+            "allowedCreditLimit": allowed_credit_limit,
+            "profile": suggestion_profile(user_profile_ip),
+            "modelVersion": model_version,
+            "expires": expires,
+        }
+        while len(self._contexts) > self.max_entries:
+            self._contexts.popitem(last=False)
+        return context_id
+
+    def verify(self, context_id, allow_expired=False):
+        """
+        Check the signature and expiry of a context ID.
+
+        Args:
+            context_id (str): ID returned by create.
+            allow_expired (bool): Accept an expired ID whose signature is valid.
+
+        Returns:
+            int: The user ID the context was issued for.
+
+        Raises:
+            ValueError: The ID is malformed, forged or (unless allow_expired) expired.
+        """
+        try:
+            user_id, expires, nonce, signature = str(context_id).split(".")
+            user_id, expires = int(user_id), int(expires)
+        except ValueError:
+            self.rejected += 1
+            raise ValueError("Malformed scoring context ID")
+        if not hmac.compare_digest(signature, self._sign(f"{user_id}.{expires}.{nonce}")):
+            self.rejected += 1
+            raise ValueError("Invalid scoring context ID")
+        if expires <= time.time():
+            self._contexts.pop(context_id, None)
+            if not allow_expired:
+                self.rejected += 1
+                raise ValueError("Expired scoring context ID")
+        return user_id
+
+    def get(self, context_id):
+        """
+        Returns:
+            tuple: (user_id, context) where context is the dict stored by
+            create, or None when it expired or this worker no longer holds it.
+            The signed user ID is returned either way, so that the user can
+            be scored again.
+
+        Raises:
+            ValueError: The ID is malformed or forged, see verify.
+        """
+        user_id = self.verify(context_id, allow_expired=True)
+        context = self._contexts.get(context_id)
+        if context is None:
+            self.misses += 1
+            return user_id, None
+        self._contexts.move_to_end(context_id)
+        self.hits += 1
+        return user_id, context
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+            "hitRatio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._contexts),
+        }
+
+
+scoring_sessions = ScoringSessions()
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from model_registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Collection of the comparisons between the served model and the shadow ones
+MODEL_COMPARISON_COLLECTION = os.environ.get("MODEL_COMPARISON_COLLECTION", "model_comparisons")
+# Lifetime of a comparison, 0 keeps them
+MODEL_COMPARISON_TTL_SECONDS = int(os.environ.get("MODEL_COMPARISON_TTL_SECONDS", 30 * 86400))
+# Scorings waiting for their comparison at most, the next ones are dropped (and counted)
+SHADOW_QUEUE_SIZE = int(os.environ.get("SHADOW_QUEUE_SIZE", 10000))
+# Scorings compared in one pass and written in one insert_many at most
+SHADOW_BATCH_SIZE = int(os.environ.get("SHADOW_BATCH_SIZE", 500))
+# Seconds to wait for more scorings before comparing
+SHADOW_FLUSH_SECONDS = float(os.environ.get("SHADOW_FLUSH_SECONDS", 1.0))
+
+
+def compare_batch(items, compared_models):
+    """
+    Score the profiles of a batch with the model that served them and with the
+    models compared with it.
+
+    The feature matrix of the served model is computed once per served model
+    and scored by every compared model with the same feature plan; a compared
+    model trained on other features maps the profiles with its own plan.
+
+    Args:
+        items (list[tuple]): (user_id, user_profile_ip, served LoadedModel, scored at) per scoring.
+        compared_models (callable): Returns the models compared with a served
+            model, like ModelRegistry.compared_models.
+
+    Returns:
+        list[dict]: One comparison document per scoring and compared model.
+    """
+    groups = {}
+    for item in items:
+        groups.setdefault(id(item[2]), []).append(item)
+    docs = []
+    for group in groups.values():
+        served = group[0][2]
+        others = compared_models(served)
+        if not others:
+            continue
+        records = [item[1] for item in group]
+        X = served.fast_scorer.transform(records)
+        served_probas = served.fast_scorer.predict_proba(X)
+        served_classes = served.fast_scorer.classes
+        served_preds = served_classes[np.argmax(served_probas, axis=1)]
+        for other in others:
+            scorer = other.fast_scorer
+            X_other = X if scorer.feature_names == served.fast_scorer.feature_names else scorer.transform(records)
+            probas = scorer.predict_proba(X_other)
+            preds = scorer.classes[np.argmax(probas, axis=1)]
+            # Probability deltas on the classes known to both models
+            common = [(i, j, c) for i, c in enumerate(served_classes)
+                      for j in np.flatnonzero(scorer.classes == c)]
+            for row, (user_id, _, _, scored_at) in enumerate(group):
+                deltas = {str(c): float(probas[row, j] - served_probas[row, i]) for i, j, c in common}
+                docs.append({
+                    "customerId": int(user_id),
+                    "servedVersion": served.version,
+                    "shadowVersion": other.version,
+                    "servedCreditProfile": str(served_preds[row]),
+                    "shadowCreditProfile": str(preds[row]),
+                    "agree": bool(served_preds[row] == preds[row]),
+                    "servedProbabilities": dict(zip(map(str, served_classes), served_probas[row].tolist())),
+                    "shadowProbabilities": dict(zip(map(str, scorer.classes), probas[row].tolist())),
+                    "probabilityDeltas": deltas,
+                    "maxAbsDelta": max((abs(d) for d in deltas.values()), default=None),
+                    "scoredAt": scored_at,
+                })
+    return docs
+
+
+class ShadowScorer:
+    """
+    Compares the served model with the shadow (and A/B) models of the
+    registry on live traffic, off the request path.
+
+    submit only queues the profile of a scored user. A background task scores
+    the queued profiles in batches with the compared models, in its own
+    thread so that it never takes a slot of the inference pool, and
+    bulk-writes the comparisons to MODEL_COMPARISON_COLLECTION.
+    """
+
+    def __init__(self, collection, model_registry=registry, queue_size=SHADOW_QUEUE_SIZE,
+                 batch_size=SHADOW_BATCH_SIZE, interval=SHADOW_FLUSH_SECONDS,
+                 ttl_seconds=MODEL_COMPARISON_TTL_SECONDS):
+        """
+        Args:
+            collection: Async pymongo collection of the comparisons.
+            model_registry (ModelRegistry): Registry of the served and compared models.
+            queue_size (int): Scorings waiting for their comparison at most.
+            batch_size (int): Scorings compared and written together at most.
+            interval (float): Seconds to wait for more scorings before comparing.
+            ttl_seconds (int): Lifetime of a comparison, 0 keeps them.
+        """
+        self.collection = collection
+        self.registry = model_registry
+        self.batch_size = batch_size
+        self.interval = interval
+        self.ttl_seconds = ttl_seconds
+        self.pending = deque()
+        self.queue_size = queue_size
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._wakeup = None
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return bool(self.registry.shadows) or self.registry.ab_model is not None
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("shadowVersion", 1), ("scoredAt", -1)])
+        if self.ttl_seconds > 0:
+            await self.collection.create_index("scoredAt", expireAfterSeconds=self.ttl_seconds)
+
+    def submit(self, user_id, user_profile_ip):
+        """
+        Queue the comparison of a scored user. Returns at once, nothing is
+        scored or written by the caller.
+
+        Args:
+            user_id (int): Customer_ID.
+            user_profile_ip (dict): Profile the user was scored on, see scoring.profile_input.
+        """
+        if not self.enabled or self._wakeup is None:
+            return
+        if len(self.pending) >= self.queue_size:
+            self.dropped += 1
+            return
+        self.pending.append((user_id, user_profile_ip, self.registry.model_for(user_id),
+                             datetime.now(timezone.utc)))
+        self.submitted += 1
+        self._wakeup.set()
+
+    async def flush(self):
+        """Compare a batch of the queued scorings and write the comparisons."""
+        items = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+        if not items:
+            return
+        loop = asyncio.get_running_loop()
+        docs = await loop.run_in_executor(self.executor, compare_batch, items, self.registry.compared_models)
+        if docs:
+            await self.collection.insert_many(docs, ordered=False)
+            self.written += len(docs)
+
+    async def run(self):
+        """Flush the queued scorings forever, at most once per interval."""
+        while True:
+            await self._wakeup.wait()
+            if len(self.pending) < self.batch_size:
+                await asyncio.sleep(self.interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.errors += 1
+                logger.exception("Error writing model comparisons")
+            if self.pending:
+                self._wakeup.set()
+
+    def start(self):
+        """
+        Start comparing in the background, once the models are loaded.
+
+        Returns:
+            asyncio.Task: The task, to be cancelled on shutdown, or None when
+            there is no model to compare with.
+        """
+        if not self.enabled:
+            return None
+        self._wakeup = asyncio.Event()
+        return asyncio.create_task(self.run(), name="shadow-scorer")
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "written": self.written,
+            "errors": self.errors,
+            "pending": len(self.pending),
+        }
@@ -0,0 +1,151 @@
+import itertools
+import os
+from numbers import Real
+
+import numpy as np
+
+from scorecard import INPUT_FIELDS as SCORECARD_INPUT_FIELDS, score_profiles
+from scoring import calculate_allowed_credit_limit
+
+# Scenarios of one simulation at most, the grid expanded
+SIMULATION_MAX_SCENARIOS = int(os.environ.get("SIMULATION_MAX_SCENARIOS", 1000))
+
+# Changes relative to the current value of a numeric field
+RELATIVE_CHANGES = ("delta", "scale")
+
+
+def _is_number(value):
+    return isinstance(value, Real) and not isinstance(value, bool)
+
+
+def resolve_change(field, spec, base_profile, kinds):
+    """
+    Value of a field in a scenario.
+
+    Args:
+        field (str): user_data field.
+        spec: The new value, or {"delta": x} / {"scale": x} relative to the
+            current value of a numeric field.
+        base_profile (dict): Current profile of the user.
+        kinds (dict): Field -> "numeric" or "categorical", the fields that can change.
+
+    Returns:
+        The new value of the field.
+
+    Raises:
+        ValueError: Unknown field, or a value that does not fit the field.
+    """
+    kind = kinds.get(field)
+    if kind is None:
+        raise ValueError(f"Field {field!r} cannot be simulated, expected one of: {', '.join(sorted(kinds))}")
+    if isinstance(spec, dict):
+        if kind != "numeric" or len(spec) != 1 or next(iter(spec)) not in RELATIVE_CHANGES:
+            raise ValueError(f"Invalid change of {field}: {spec!r}, expected a value or "
+                             f"{{\"delta\": x}} / {{\"scale\": x}} for numeric fields")
+        (op, amount), = spec.items()
+        current = base_profile.get(field)
+        if not _is_number(amount) or not _is_number(current):
+            raise ValueError(f"Invalid change of {field}: {spec!r} (current value {current!r})")
+        return float(current + amount if op == "delta" else current * amount)
+    if kind == "numeric" and not _is_number(spec):
+        raise ValueError(f"Invalid value of {field}: {spec!r}, expected a number")
+    if kind == "categorical" and not isinstance(spec, str):
+        raise ValueError(f"Invalid value of {field}: {spec!r}, expected a string")
+    return spec
+
+
+def expand_scenarios(request, base_profile, fast_scorer):
+    """
+    Scenarios of a simulation request: every combination of the "grid" values,
+    then the listed "scenarios".
+
+    Args:
+        request (dict): {"grid": {field: [value, {"delta": x}, ...] or {"delta": [x, ...]}
+            or {"scale": [x, ...]}}, "scenarios": [{field: value or {"delta": x}, ...}, ...]}
+        base_profile (dict): Current profile of the user.
+        fast_scorer (FastScorer): Scorer of the model serving the user.
+
+    Returns:
+        list[dict]: The fields changed by each scenario, with their new values.
+
+    Raises:
+        ValueError: Invalid request, or more than SIMULATION_MAX_SCENARIOS scenarios.
+    """
+    grid = request.get("grid") or {}
+    listed = request.get("scenarios") or []
+    if not isinstance(grid, dict) or not isinstance(listed, list):
+        raise ValueError("Expected \"grid\" to be an object and \"scenarios\" a list")
+    if not grid and not listed:
+        raise ValueError("Missing required fields in the request: grid or scenarios")
+
+    # Model inputs, plus the fields of the credit limit and the scorecard
+    kinds = {field: fast_scorer.field_kind(field) for field in set(fast_scorer.source_fields)}
+    for field in ("Monthly_Inhand_Salary", *SCORECARD_INPUT_FIELDS):
+        kinds.setdefault(field, "numeric")
+
+    # Checked axis by axis, before anything is expanded
+    axes = []
+    n_grid = 1 if grid else 0
+    for field, values in grid.items():
+        if isinstance(values, dict) and len(values) == 1 and next(iter(values)) in RELATIVE_CHANGES:
+            (op, amounts), = values.items()
+            values = [{op: amount} for amount in amounts] if isinstance(amounts, list) else None
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"Invalid grid values of {field}: expected a non-empty list")
+        n_grid *= len(values)
+        if n_grid + len(listed) > SIMULATION_MAX_SCENARIOS:
+            raise ValueError(f"More than {SIMULATION_MAX_SCENARIOS} scenarios requested")
+        axes.append([(field, resolve_change(field, value, base_profile, kinds)) for value in values])
+    if len(listed) > SIMULATION_MAX_SCENARIOS:
+        raise ValueError(f"More than {SIMULATION_MAX_SCENARIOS} scenarios requested")
+
+    scenarios = [dict(combination) for combination in itertools.product(*axes)] if axes else []
+    for changes in listed:
+        if not isinstance(changes, dict) or not changes:
+            raise ValueError(f"Invalid scenario: {changes!r}, expected an object of field changes")
+        scenarios.append({field: resolve_change(field, spec, base_profile, kinds) for field, spec in changes.items()})
+    return scenarios
+
+
+def simulate(base_profile, scenarios, fast_scorer, config):
+    """
+    Score the current profile of a user and every scenario in one pass: one
+    feature matrix, one predict_proba and one scorecard over all the rows.
+    Nothing is written.
+
+    Args:
+        base_profile (dict): Current profile of the user, see scoring.profile_input.
+        scenarios (list[dict]): Fields changed by each scenario, see expand_scenarios.
+        fast_scorer (FastScorer): Scorer of the model serving the user.
+        config (ScorecardConfig): Scorecard parameters.
+
+    Returns:
+        dict: {"baseline": result, "scenarios": [result, ...]} where each result
+        has the credit health, its class probabilities, the allowed credit limit
+        and the scorecard score (None when the scorecard cannot be computed),
+        and each scenario its "changes".
+    """
+    # The current profile is the first row
+    variants = [{}] + scenarios
+    probas = fast_scorer.predict_proba(fast_scorer.transform_variants(base_profile, variants))
+    preds = fast_scorer.classes[np.argmax(probas, axis=1)]
+
+    def column(field):
+        return np.asarray([changes.get(field, base_profile.get(field)) for changes in variants], dtype=float)
+
+    limits = calculate_allowed_credit_limit(column("Monthly_Inhand_Salary"), probas)
+    _, scores = score_profiles({field: column(field) for field in SCORECARD_INPUT_FIELDS}, config)
+    classes = [str(c) for c in fast_scorer.classes]
+    results = [
+        {
+            "userCreditProfile": str(preds[i]),
+            "probabilities": dict(zip(classes, probas[i].tolist())),
+            "allowedCreditLimit": int(limits[i]),
+            "scoreCardCreditScore": int(scores[i]) if np.isfinite(scores[i]) else None,
+        }
+        for i in range(len(variants))
+    ]
+    return {
+        "baseline": results[0],
+        "scenarios": [{"changes": changes} | result for changes, result in zip(scenarios, results[1:])],
+    }
@@ -0,0 +1,54 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts the
+    computation and later callers await the same result (or exception)
+    instead of repeating it. Nothing is kept once the computation is done,
+    caching is left to the caches.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, fn, *args):
+        """
+        Await ``fn(*args)``, or the in-flight call for ``key``.
+
+        The computation runs in its own task, so that a cancelled caller (e.g.
+        a closed browser tab) does not fail the others awaiting it.
+
+        Args:
+            key: Hashable identity of the computation.
+            fn (callable): Coroutine function.
+            *args: Arguments of fn.
+
+        Returns:
+            The result of the shared call. It is the same object for every
+            caller and must not be mutated.
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn(*args))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        self._in_flight.pop(key, None)
+        # Retrieved here too in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "inFlight": len(self._in_flight),
+        }
@@ -0,0 +1,80 @@
+import logging
+import os
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Safety net on top of the explicit invalidation on catalog changes
+SUGGESTION_CACHE_TTL_SECONDS = int(os.environ.get("SUGGESTION_CACHE_TTL_SECONDS", 24 * 3600))
+
+
+class TierSuggestionCache:
+    """
+    Retrieved cards per credit health tier, kept in memory and in a MongoDB
+    collection shared by all workers. Must be invalidated whenever the card
+    catalog changes.
+    """
+
+    def __init__(self, collection, ttl_seconds=SUGGESTION_CACHE_TTL_SECONDS):
+        """
+        Args:
+            collection: Async pymongo collection shared by the workers.
+            ttl_seconds (int): Lifetime of the shared entries.
+        """
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self._memory = {}
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("createdAt", expireAfterSeconds=self.ttl_seconds)
+
+    async def get(self, tier):
+        """
+        Returns:
+            list[dict]: The cached cards of the tier, or None.
+        """
+        if tier in self._memory:
+            self.memory_hits += 1
+            return self._memory[tier]
+        try:
+            doc = await self.collection.find_one({"_id": tier}, {"cards": 1})
+        except Exception as e:
+            logger.warning("Error reading suggestion cache: %s", e)
+            doc = None
+        if doc is None:
+            self.misses += 1
+            return None
+        self.db_hits += 1
+        self._memory[tier] = doc["cards"]
+        return doc["cards"]
+
+    async def set(self, tier, cards):
+        self._memory[tier] = cards
+        try:
+            await self.collection.update_one(
+                {"_id": tier},
+                {"$set": {"cards": cards, "createdAt": datetime.now(timezone.utc)}},
+                upsert=True)
+        except Exception as e:
+            logger.warning("Error writing suggestion cache: %s", e)
+
+    async def invalidate(self):
+        """Drop every tier, in this worker and in the shared collection."""
+        self._memory.clear()
+        try:
+            await self.collection.delete_many({})
+        except Exception as e:
+            logger.warning("Error invalidating suggestion cache: %s", e)
+
+    def stats(self):
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memoryHits": self.memory_hits,
+            "dbHits": self.db_hits,
+            "misses": self.misses,
+            "hitRatio": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            "tiers": sorted(self._memory),
+        }
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _safe_norm(x, **kwargs):
+    """L2 norm, 1 where it is 0: zero vectors stay zero instead of NaN once normalized."""
+    norm = np.linalg.norm(x, **kwargs)
+    return np.where(norm == 0, 1, norm)
+
+
+class LocalVectorIndex:
+    """
+    In-process exact vector index: all embeddings of a small collection in
+    one contiguous float32 matrix, queried with a single matrix-vector
+    product. Scores follow the Atlas Vector Search normalization of the
+    configured similarity, so results are interchangeable with $vectorSearch.
+    """
+
+    def __init__(self, similarity="euclidean", embedding_key="embedding", max_docs=10000):
+        """
+        Args:
+            similarity (str): "euclidean", "cosine" or "dotProduct", as in the Atlas index.
+            embedding_key (str): Field holding the embeddings.
+            max_docs (int): Above this many documents the index stays disabled.
+        """
+        if similarity not in ("euclidean", "cosine", "dotProduct"):
+            raise ValueError(f"Unsupported similarity: {similarity}")
+        self.similarity = similarity
+        self.embedding_key = embedding_key
+        self.max_docs = max_docs
+        self.matrix = None
+        self.sq_norms = None
+        self.docs = []
+        self.version = 0
+        self._refresh_lock = asyncio.Lock()
+
+    @property
+    def ready(self):
+        return self.matrix is not None
+
+    def build(self, docs):
+        """
+        Replace the indexed documents.
+
+        Args:
+            docs (list[dict]): Documents with an embedding field, other fields are returned by search.
+        """
+        docs = [d for d in docs if d.get(self.embedding_key) is not None]
+        matrix = np.ascontiguousarray([d[self.embedding_key] for d in docs], dtype=np.float32)
+        if not docs:
+            # An empty catalog matches nothing
+            matrix = matrix.reshape(0, self.matrix.shape[1] if self.matrix is not None else 0)
+        if self.similarity == "cosine":
+            matrix /= _safe_norm(matrix, axis=1, keepdims=True)
+        metadata = [{k: v for k, v in d.items() if k != self.embedding_key} for d in docs]
+        # Swap everything at once so concurrent searches see either index
+        self.matrix, self.sq_norms, self.docs = matrix, np.einsum("ij,ij->i", matrix, matrix), metadata
+        self.version += 1
+
+    async def load(self, collection):
+        """
+        Load the whole collection into the index, unless it is larger than max_docs.
+
+        Returns:
+            bool: Whether the index is usable.
+        """
+        async with self._refresh_lock:
+            count = await collection.count_documents({})
+            if count > self.max_docs:
+                logger.warning("%s has %s documents, above the local index limit of %s", collection.name, count, self.max_docs)
+                self.matrix, self.sq_norms, self.docs = None, None, []
+                return False
+            docs = await collection.find({}).to_list(length=None)
+            self.build(docs)
+            logger.info("Local vector index loaded %s documents from %s", len(self.docs), collection.name)
+            return True
+
+    def scores(self, query_vector):
+        """Atlas-normalized score of every indexed document for the query."""
+        q = np.asarray(query_vector, dtype=np.float32)
+        if not len(self.docs):
+            return np.empty(0, dtype=np.float32)
+        if self.similarity == "cosine":
+            q = q / _safe_norm(q)
+        dots = self.matrix @ q
+        if self.similarity == "euclidean":
+            sq_distances = np.maximum(self.sq_norms - 2 * dots + q @ q, 0)
+            return 1 / (1 + sq_distances)
+        return (1 + dots) / 2
+
+    def search(self, query_vector, k=5):
+        """
+        Returns:
+            list[dict]: The k best documents, best first, each with its "score".
+        """
+        scores = self.scores(query_vector)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k else np.empty(0, dtype=int)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [{**self.docs[i], "score": float(scores[i])} for i in top]
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import Layout from '../components/Layout';
 import Header from '../components/Header';
 import Sidebar from '../components/Sidebar';
@@ -36,11 +36,14 @@ const HomePage = () => {
   const [scoreCardCreditScore, setScoreCardCreditScore] = useState(0);
   const labels = ["Repayment History", "Credit Utilization", "Credit History", "Outstanding", "Num Credit Inquiries", "Credit Score"];
   const router = useRouter();
+  // Client shown, so that a late explanation of another client is dropped
+  const currentClientId = useRef(null);
 
   useEffect(() => {
     if (router.isReady) {
       // Always use default user ID 8625 for demo
       const clientId = 8625;
+      currentClientId.current = clientId;
       fetchProfileData(clientId);
       fetchExpl(clientId);
     }
@@ -50,7 +53,9 @@ const HomePage = () => {
     if (explSets.userProfile) {
       fetchRec();
     }
-  }, [explSets]);
+    // Suggestions depend on the client and its credit health, not on the
+    // explanation text: the late LLM explanation must not fetch them again
+  }, [explSets.userId, explSets.userCreditProfile]);
 
   const fetchProfileData = async (clientId) => {
     try {
@@ -85,6 +90,16 @@ const HomePage = () => {
       setScorecardScoreFeatures(text.scorecardScoreFeatures);
       setScoreCardCreditScore(text.scoreCardCreditScore);
 
+      // The LLM was too slow: the explanation was generated from the model
+      // contributions, replace it with the LLM one once it is ready
+      if (text.explanationSource === 'local') {
+        const llmExpl = await CreditScoreAPIClient.getExplanation(clientId);
+        if (String(llmExpl.userId) !== String(currentClientId.current)) {
+          return;
+        }
+        setExplSets(prev => (String(prev.userId) === String(llmExpl.userId) ? { ...prev, ...llmExpl } : prev));
+      }
+
     } catch (error) {
       setLoading2(false);
       console.error('Error fetching API response:', error);
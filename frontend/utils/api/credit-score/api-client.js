@@ -33,6 +33,35 @@ class CreditScoreAPIClient {
       throw error;
     }
   }
+
+  /**
+   * Get the LLM explanation of a user's credit score, waiting for it if needed.
+   * Used to replace an explanation generated locally (explanationSource "local").
+   * @param {number} userId - The user ID to get the explanation for
+   * @returns {Promise<Object>} Explanation data including userProfile and explanationSource
+   */
+  static async getExplanation(userId) {
+    try {
+      // Browser calls: /api/credit-score/{userId}/explanation
+      // Next.js proxies to: ${INTERNAL_API_URL}/credit_score/{userId}/explanation
+      const response = await fetch(`${API_BASE_URL}/credit-score/${userId}/explanation`, {
+        method: 'GET',
+        headers: {
+          'Accept': 'application/json',
+          'Content-Type': 'application/json',
+        },
+      });
+
+      if (!response.ok) {
+        throw new Error(`Failed to fetch credit score explanation: ${response.status}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Error fetching credit score explanation:', error);
+      throw error;
+    }
+  }
 }
 
 export default CreditScoreAPIClient;
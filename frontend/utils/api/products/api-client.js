@@ -6,11 +6,11 @@ const API_BASE_URL = '/api';
 
 class ProductsAPIClient {
   /**
-   * Get product suggestions based on user profile
-   * @param {Object} userProfileData - User profile data including userProfile, userId, userCreditProfile, allowedCreditLimit
+   * Get product suggestions for a scored user
+   * @param {Object} creditScore - Credit score response including scoringContextId and userId
    * @returns {Promise<Object>} Product recommendations with card_suggestions
    */
-  static async getProductSuggestions(userProfileData) {
+  static async getProductSuggestions(creditScore) {
     try {
       // Call Next.js proxy route
       // Browser calls: /api/product-suggestions
@@ -20,7 +20,13 @@ class ProductsAPIClient {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify(userProfileData),
+        // The backend reuses the prediction and profile stored under scoringContextId, and
+        // re-scores the user it was issued for once it has expired. userId is only used
+        // when there is no scoringContextId
+        body: JSON.stringify({
+          scoringContextId: creditScore.scoringContextId,
+          userId: creditScore.userId,
+        }),
       });
 
       if (!response.ok) {